@@ -0,0 +1,285 @@
+from bisect import bisect_left, bisect_right, insort
+from enum import Enum
+
+from operations import Operations
+from ssa import Instruction
+
+
+class BranchVisibility(Enum):
+    """
+    Whether an access of an array is on the paths to a later access: always, not at all because it is in the other
+    branch of an if (SIBLING), or only on some paths because it is in a branch of an if that was joined (JOINED).
+    """
+    VISIBLE = 1
+    SIBLING = 2
+    JOINED = 3
+
+
+def contains_sorted(values: list, value) -> bool:
+    i = bisect_left(values, value)
+    return i < len(values) and values[i] == value
+
+
+def remove_sorted(values: list, value):
+    del values[bisect_left(values, value)]
+
+
+class ArrayAccesses:
+    """
+    The loads, stores and kills of one array in program order, together with an index of them so that finding a
+    load or store to reuse for a new load does not scan the whole list.
+
+    Every entry gets a sequence number that grows with its position in the list (kills inserted in the middle get
+    one halfway between their neighbours). The index holds the sequence numbers of the loads by their (x, y)
+    operands, of the stores by their address, of all stores and of the stores whose address originates from a read.
+    Entries are indexed again when their operands change (see update_instruction).
+
+    The if statements are tracked by the sequence numbers at which their then and else branches start and at which
+    they are joined, so an access is not reused for an access in the other branch or after the join. A while body is
+    tracked like a then branch without an else branch. After a while body that stores to the array, no access before
+    its end is reused, since the body computes its addresses from the phis of the vars and an address of the body can
+    be equal to a different address instruction after it.
+    """
+
+    def __init__(self):
+        self.entries: list[Instruction] = []
+        self.seqs: list[float] = []
+        self.max_ids: list[int] = []  # the highest instruction id up to every entry
+        self.next_seq = 0
+        self.last_kill = -1
+        self.entry_at: dict[float, Instruction] = {}
+        self.key_at = {}
+        self.seqs_of: dict[Instruction, list[float]] = {}
+        self.loads: dict[tuple, list[float]] = {}
+        self.stores: dict[Instruction, list[float]] = {}
+        self.store_seqs: list[float] = []
+        self.tainted_store_seqs: list[float] = []
+        # The if statements in the order of their then branches, with the if they are nested in (or -1)
+        self.then_starts: list[int] = []
+        self.else_starts: list[float] = []
+        self.join_ends: list[float] = []
+        self.if_parents: list[int] = []
+        self.open_ifs: list[int] = []
+        # The ends of the while bodies that store to the array
+        self.loop_barrier_seqs: list[float] = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index: int) -> Instruction:
+        return self.entries[index]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __reversed__(self):
+        return reversed(self.entries)
+
+    def append(self, instruction: Instruction):
+        seq = self.next_seq
+        self.next_seq += 1
+        self.entries.append(instruction)
+        self.seqs.append(seq)
+        max_id = self.max_ids[-1] if self.max_ids else -1
+        if instruction is not None and instruction.get_id() is not None:
+            max_id = max(max_id, instruction.get_id())
+        self.max_ids.append(max_id)
+        if instruction is not None and instruction.op in (Operations.LOAD, Operations.STORE):
+            self.seqs_of.setdefault(instruction, []).append(seq)
+            self.entry_at[seq] = instruction
+            self.add_to_index(seq, instruction)
+
+    def insert_kill(self, index: int):
+        """
+        Inserts a kill in front of the entry at the index.
+        """
+        seq = self.seqs[index] - 0.5
+        self.entries.insert(index, Instruction(op=Operations.KILL))
+        self.seqs.insert(index, seq)
+        self.max_ids.insert(index, self.max_ids[index - 1] if index > 0 else -1)
+        self.last_kill = max(self.last_kill, seq)
+
+    def enter_branches(self):
+        """
+        Starts the then branch of an if.
+        """
+        self.if_parents.append(self.open_ifs[-1] if self.open_ifs else -1)
+        self.open_ifs.append(len(self.then_starts))
+        self.then_starts.append(self.next_seq)
+        self.else_starts.append(float('inf'))
+        self.join_ends.append(float('inf'))
+
+    def enter_else(self):
+        self.else_starts[self.open_ifs[-1]] = self.next_seq
+
+    def join_branches(self):
+        self.join_ends[self.open_ifs.pop()] = self.next_seq
+
+    def enter_loop(self):
+        """
+        Starts the body of a while.
+        """
+        self.enter_branches()
+
+    def exit_loop(self):
+        start = self.then_starts[self.open_ifs[-1]]
+        self.join_branches()
+        if self.store_seqs and self.store_seqs[-1] >= start:
+            self.loop_barrier_seqs.append(self.next_seq - 0.5)
+
+    def branch_visibility(self, seq: float, query_seq: float) -> BranchVisibility:
+        """
+        Returns whether the entry at seq is on the paths to a later access at query_seq. The outermost if whose
+        branch of the entry does not contain the access decides.
+        """
+        visibility = BranchVisibility.VISIBLE
+        # The ifs that contain the entry are the last if that starts before it and the ifs around that one
+        i = bisect_right(self.then_starts, seq) - 1
+        while i >= 0:
+            if seq < self.join_ends[i]:
+                if query_seq >= self.join_ends[i]:
+                    visibility = BranchVisibility.JOINED
+                elif seq < self.else_starts[i] <= query_seq:
+                    visibility = BranchVisibility.SIBLING
+            i = self.if_parents[i]
+        return visibility
+
+    def first_index_after(self, instr_id: int) -> int:
+        """
+        Returns the index of the first entry with an instruction id higher than instr_id, or None.
+        """
+        index = bisect_right(self.max_ids, instr_id)
+        return index if index < len(self.entries) else None
+
+    def add_to_index(self, seq: float, instruction: Instruction):
+        if instruction.op == Operations.LOAD:
+            key = (instruction.x, instruction.y)
+            insort(self.loads.setdefault(key, []), seq)
+        else:
+            key = instruction.y
+            insort(self.stores.setdefault(key, []), seq)
+            insort(self.store_seqs, seq)
+            if instruction.y.originates_from_read:
+                insort(self.tainted_store_seqs, seq)
+        self.key_at[seq] = key
+
+    def remove_from_index(self, seq: float, instruction: Instruction):
+        key = self.key_at.pop(seq)
+        if instruction.op == Operations.LOAD:
+            remove_sorted(self.loads[key], seq)
+        else:
+            remove_sorted(self.stores[key], seq)
+            remove_sorted(self.store_seqs, seq)
+            if contains_sorted(self.tainted_store_seqs, seq):
+                remove_sorted(self.tainted_store_seqs, seq)
+
+    def update_instruction(self, instruction: Instruction):
+        """
+        Indexes the entries of the instruction again after its operands or its read taint changed. Stores with the
+        instruction as address are checked again for whether their address originates from a read.
+        """
+        for seq in self.seqs_of.get(instruction, ()):
+            self.remove_from_index(seq, instruction)
+            self.add_to_index(seq, instruction)
+
+        for seq in self.stores.get(instruction, ()):
+            tainted = contains_sorted(self.tainted_store_seqs, seq)
+            if self.entry_at[seq].y.originates_from_read and not tainted:
+                insort(self.tainted_store_seqs, seq)
+            elif not self.entry_at[seq].y.originates_from_read and tainted:
+                remove_sorted(self.tainted_store_seqs, seq)
+
+    @staticmethod
+    def is_tainted(x: Instruction, y: Instruction) -> bool:
+        return bool((x and x.originates_from_read) or (y and y.originates_from_read))
+
+    def find_available(self, x: Instruction, y: Instruction) -> Instruction:
+        """
+        Finds the latest load of the same address or store to it that is not behind a store which cannot be
+        reasoned about: a store to an address that originates from a read, or any store if the load's own address
+        originates from a read. Kills are not considered here, they are only used by the while pass.
+
+        The accesses in the other branch of an if are skipped. After a join, the loads of its branches are skipped
+        and a store of its branches hides the accesses before it, since it only happened on some paths.
+        :return: the found load or store, or None
+        """
+        barrier_seqs = self.store_seqs if self.is_tainted(x, y) else self.tainted_store_seqs
+        barrier = barrier_seqs[-1] if barrier_seqs else -1
+        if self.loop_barrier_seqs:
+            barrier = max(barrier, self.loop_barrier_seqs[-1])
+        load_seqs = self.loads.get((x, y), ())
+        store_seqs = self.stores.get(x, ())
+        load_index, store_index = len(load_seqs) - 1, len(store_seqs) - 1
+        while True:
+            load = load_seqs[load_index] if load_index >= 0 else -1
+            store = store_seqs[store_index] if store_index >= 0 else -1
+            seq = max(load, store)
+            if seq <= barrier:
+                return None
+            visibility = self.branch_visibility(seq, self.next_seq)
+            if visibility == BranchVisibility.VISIBLE:
+                return self.entry_at[seq]
+            if seq == load:
+                load_index -= 1
+            elif visibility == BranchVisibility.JOINED:
+                return None
+            else:
+                store_index -= 1
+
+    def store_holds(self, store: Instruction) -> bool:
+        """
+        Returns whether the value of the store is still at its address, i.e. whether every store after it stores the
+        same value to the same address. The stores after it can also be on the paths that go back to the start of a
+        while, so none of them is skipped.
+        """
+        seqs = self.seqs_of.get(store)
+        if not seqs:
+            return False
+        for seq in self.store_seqs[bisect_right(self.store_seqs, seqs[0]):]:
+            later_store = self.entry_at[seq]
+            if later_store.x is not store.x or later_store.y is not store.y:
+                return False
+        return True
+
+    def find_while_cse(self, instruction: Instruction) -> list[Instruction]:
+        """
+        Finds all loads of the same address and stores to it that come before the instruction (by id) and after the
+        last kill, the last store that cannot be reasoned about and the last while body that stores to the array (see
+        find_available).
+        :return: the found loads and stores, latest first
+        """
+        instr_id = instruction.get_id()
+        limit = self.last_kill
+        instruction_seqs = self.seqs_of.get(instruction)
+        if instruction_seqs:
+            index = bisect_left(self.loop_barrier_seqs, instruction_seqs[0])
+            if index > 0:
+                limit = max(limit, self.loop_barrier_seqs[index - 1])
+        barrier_seqs = self.store_seqs if self.is_tainted(instruction.x, instruction.y) else self.tainted_store_seqs
+        for seq in reversed(barrier_seqs):
+            if seq <= limit:
+                break
+            if self.entry_at[seq].get_id() < instr_id:
+                limit = seq
+                break
+
+        candidates = []
+        for seqs in (self.loads.get((instruction.x, instruction.y), ()), self.stores.get(instruction.x, ())):
+            for seq in reversed(seqs):
+                if seq <= limit:
+                    break
+                if self.entry_at[seq].get_id() < instr_id:
+                    candidates.append(seq)
+        candidates.sort(reverse=True)
+
+        # The branches of the ifs are handled like in find_available
+        found = []
+        for seq in candidates:
+            visibility = BranchVisibility.VISIBLE
+            if instruction_seqs and seq < instruction_seqs[0]:
+                visibility = self.branch_visibility(seq, instruction_seqs[0])
+            if visibility == BranchVisibility.VISIBLE:
+                found.append(self.entry_at[seq])
+            elif visibility == BranchVisibility.JOINED and self.entry_at[seq].op == Operations.STORE:
+                break
+        return found
@@ -0,0 +1,114 @@
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache import CompileCache
+from compiler import Compiler, CompileResult
+
+# One compiler per worker process, created by the pool initializer and reused for every file of the process
+worker_compiler: Compiler = None
+
+
+def find_sources(paths: list[str]) -> list[str]:
+    """
+    Expands directories (all .txt files below them) and glob patterns into a sorted list of smpl files.
+    """
+    file_names = set()
+    for path in paths:
+        if os.path.isdir(path):
+            file_names.update(glob.glob(os.path.join(path, '**', '*.txt'), recursive=True))
+        elif glob.has_magic(path):
+            file_names.update(glob.glob(path, recursive=True))
+        else:
+            file_names.add(path)
+    return sorted(file_names)
+
+
+def get_output_names(file_names: list[str]) -> dict[str, str]:
+    """
+    Gives every file the path of its .dot file relative to the output directory. The paths mirror the input paths
+    below the deepest directory all inputs share, so inputs with the same name in different directories do not
+    overwrite each other.
+    """
+    if not file_names:
+        return {}
+    base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(file_name)) for file_name in file_names])
+    return {file_name: os.path.splitext(os.path.relpath(os.path.abspath(file_name), base_dir))[0] + '.dot'
+            for file_name in file_names}
+
+
+def init_worker(options: dict, cache_dir: str = None):
+    global worker_compiler
+    cache = CompileCache(directory=cache_dir) if cache_dir else None
+    worker_compiler = Compiler(cache=cache, **options)
+
+
+def compile_one(compiler: Compiler, file_name: str) -> CompileResult:
+    try:
+        return compiler.compile_file(file_name)
+    except Exception as e:
+        # A crash on one file should not stop the batch. Start from a fresh parser for the next file.
+        compiler.parser = None
+        return CompileResult(None, {}, [{'line': None, 'col': None, 'message': f"InternalError: {e!r}"}], file_name)
+
+
+def compile_chunk(file_names: list[str]) -> list[CompileResult]:
+    return [compile_one(worker_compiler, file_name) for file_name in file_names]
+
+
+def compile_batch(file_names: list[str], workers: int = None, chunk_size: int = 8, cache_dir: str = None,
+                  **options):
+    """
+    Compiles the files on a pool of worker processes (one per core by default) and yields a CompileResult for every
+    file as soon as the chunk it was sent in has been compiled, so the results do not come back in input order.
+    :param file_names: the smpl files to compile
+    :param workers: number of worker processes
+    :param chunk_size: number of files sent to a worker at once
+    :param cache_dir: directory of a CompileCache shared by the workers
+    :param options: options for the Compiler of every worker
+    """
+    chunks = [file_names[i:i + chunk_size] for i in range(0, len(file_names), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(options, cache_dir)) as executor:
+        futures = [executor.submit(compile_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Compiles many smpl files in parallel.')
+    arg_parser.add_argument('paths', nargs='+', help='smpl files, directories or glob patterns')
+    arg_parser.add_argument('--workers', type=int, default=None, help='number of processes (default: all cores)')
+    arg_parser.add_argument('--chunk-size', type=int, default=8, help='number of files sent to a process at once')
+    arg_parser.add_argument('--output-dir', default=None, help='directory to write the .dot file of every input to')
+    arg_parser.add_argument('--bulk-tokenize', action='store_true', help='use the bulk tokenizer')
+    arg_parser.add_argument('--cache-dir', default=None, help='directory for caching compile results between runs')
+    args = arg_parser.parse_args()
+
+    file_names = find_sources(args.paths)
+    dot_names = get_output_names(file_names)
+
+    failed = 0
+    for result in compile_batch(file_names, args.workers, args.chunk_size, args.cache_dir,
+                                bulk_tokenize=args.bulk_tokenize):
+        stats = ' '.join(f"{key}={value}" for key, value in result.stats.items())
+        print(f"{result.name}: {stats} errors={len(result.diagnostics)}")
+        for diagnostic in result.diagnostics:
+            print(f"  {diagnostic['line']}:{diagnostic['col']}: {diagnostic['message']}")
+
+        if result.diagnostics:
+            failed += 1
+        if args.output_dir and result.dot is not None:
+            dot_file_name = os.path.join(args.output_dir, dot_names[result.name])
+            os.makedirs(os.path.dirname(dot_file_name), exist_ok=True)
+            with open(dot_file_name, 'w') as file:
+                file.write(result.dot)
+
+    print(f"Compiled {len(file_names)} files, {failed} with errors")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
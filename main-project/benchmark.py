@@ -0,0 +1,324 @@
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from compiler import Compiler
+from filereader import FileReader, BufferedFileReader, StringReader
+from licm import LoopInvariantCodeMotion
+from operations import Operations
+from parser import Parser
+from ssa import Instruction
+from tokenizer import Tokenizer, BulkTokenizer
+from tokens import Tokens
+
+
+def generate_source(statements: int) -> str:
+    """
+    Generates a valid smpl program with the given number of assignment statements inside the main block.
+    """
+    lines = ['main', 'var a, b, c, total;', 'array[10] values;', '{',
+             '    let a <- call InputNum();', '    let b <- a + 1;', '    let c <- b * 2;', '    let total <- 0']
+    for i in range(statements):
+        lines.append(f'    ;let total <- total + a * {i % 97} - (b + c) / {i % 13 + 1}')
+    lines.append('}.')
+    return '\n'.join(lines) + '\n'
+
+
+def generate_nested_ifs(depth: int) -> str:
+    """
+    Generates a smpl program with depth nested if statements that each compute a new and a common expression.
+    """
+    lines = ['main', 'var a, b, c;', '{', '    let a <- call InputNum();', '    let b <- a * 2']
+    for i in range(depth):
+        lines.append(f'    ;let c <- a + {i}; let b <- a * 2; if c > b then')
+    lines.append('    let c <- b')
+    lines.extend(['    fi'] * depth)
+    lines.append('    ;call OutputNum(c)')
+    lines.append('}.')
+    return '\n'.join(lines) + '\n'
+
+
+def generate_loop_with_ifs(count: int) -> str:
+    """
+    Generates a smpl program with one while loop that contains count if statements, so the loop has about 3 * count
+    blocks.
+    """
+    lines = ['main', 'var i, a, b;', '{', '    let i <- 0;', '    let a <- call InputNum();', '    let b <- 0;',
+             '    while i < 100 do', '        let i <- i + 1']
+    for j in range(count):
+        lines.append(f'        ;if a > {j} then let b <- b + a * {j} else let b <- b - a fi')
+    lines.extend(['    od;', '    call OutputNum(b)', '}.'])
+    return '\n'.join(lines) + '\n'
+
+
+def generate_array_accesses(count: int) -> str:
+    """
+    Generates a smpl program with count array loads and stores before and inside a while loop.
+    """
+    lines = ['main', 'var i, a, b;', 'array[100] x, y;', '{', '    let i <- 0;', '    let a <- 0;', '    let b <- 1']
+    for j in range(count):
+        lines.append(f'    ;let a <- a + x[{j % 100}] * y[b]; let y[{j % 50}] <- a')
+    lines.append('    ;while i < 100 do let a <- 0')
+    for j in range(count):
+        lines.append(f'        ;let a <- a + x[i] + x[{j % 100}]; let y[i] <- a + y[b]')
+    lines.extend(['    ;let i <- i + 1 od;', '    call OutputNum(a)', '}.'])
+    return '\n'.join(lines) + '\n'
+
+
+def write_source(source: str) -> str:
+    file = tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False)
+    with file:
+        file.write(source)
+    return file.name
+
+
+def time_it(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def drain_reader(reader_class, file_name):
+    reader = reader_class(file_name)
+    while reader.get_next():
+        pass
+
+
+def drain_tokenizer(file_name, tokenizer_class=Tokenizer, **kwargs):
+    tokenizer = tokenizer_class(file_name, **kwargs)
+    while tokenizer.get_next_token() != Tokens.EOF_TOKEN:
+        pass
+
+
+def drain_parser_tokens(file_name, **kwargs):
+    parser = Parser(file_name, print_errors=False, **kwargs)
+    while parser.token != Tokens.EOF_TOKEN:
+        parser.next_token()
+
+
+def report(name: str, seconds: float, size: int):
+    print(f"{name:<40} {seconds * 1000:10.2f} ms {size / seconds / 1e6:10.2f} MB/s")
+
+
+def bench_readers(statements: int, repeat: int):
+    file_name = write_source(generate_source(statements))
+    try:
+        size = os.path.getsize(file_name)
+        print(f"Source size: {size / 1e6:.2f} MB")
+        report('FileReader.get_next', time_it(lambda: drain_reader(FileReader, file_name), repeat), size)
+        report('BufferedFileReader.get_next', time_it(lambda: drain_reader(BufferedFileReader, file_name), repeat),
+               size)
+        report('Tokenizer (FileReader)', time_it(lambda: drain_tokenizer(file_name, buffered=False), repeat), size)
+        report('Tokenizer (BufferedFileReader)', time_it(lambda: drain_tokenizer(file_name), repeat), size)
+    finally:
+        os.remove(file_name)
+
+
+def bench_tokenizers(statements: int, repeat: int):
+    file_name = write_source(generate_source(statements))
+    try:
+        size = os.path.getsize(file_name)
+        print(f"Source size: {size / 1e6:.2f} MB")
+        report('Tokenizer', time_it(lambda: drain_tokenizer(file_name), repeat), size)
+        report('BulkTokenizer', time_it(lambda: drain_tokenizer(file_name, BulkTokenizer), repeat), size)
+        report('Parser.next_token (Tokenizer)', time_it(lambda: drain_parser_tokens(file_name), repeat), size)
+        report('Parser.next_token (BulkTokenizer)',
+               time_it(lambda: drain_parser_tokens(file_name, bulk_tokenize=True), repeat), size)
+    finally:
+        os.remove(file_name)
+
+
+def bench_tokenizer_setup(statements: int, repeat: int):
+    file_name = write_source('main {}.')
+    try:
+        count = max(statements // 10, 1)
+        seconds = time_it(lambda: [Tokenizer(file_name) for _ in range(count)], repeat)
+        print(f"{'Tokenizer construction':<40} {seconds / count * 1e6:10.2f} us")
+    finally:
+        os.remove(file_name)
+
+
+SNIPPET = 'main var x, y; { let x <- call InputNum(); let y <- x * 2 + 1; call OutputNum(y) }.'
+
+
+def compile_fresh(source: str):
+    parser = Parser.from_string(source, print_errors=False)
+    parser.computation()
+
+
+def bench_compiler_reuse(statements: int, repeat: int):
+    count = max(statements // 10, 1)
+    compiler = Compiler(show_vars=False)
+    fresh = time_it(lambda: [compile_fresh(SNIPPET) for _ in range(count)], repeat)
+    reused = time_it(lambda: [compiler.get_parser(reader=StringReader(SNIPPET)).computation() for _ in range(count)],
+                     repeat)
+    print(f"{'Fresh Parser per snippet':<40} {fresh / count * 1e6:10.2f} us")
+    print(f"{'Reused Parser (Compiler)':<40} {reused / count * 1e6:10.2f} us")
+
+
+class DictInstruction(Instruction):
+    """
+    Instruction with a per-instance __dict__ like before it had __slots__, for comparison.
+    """
+
+
+def measure_allocation(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def make_instructions(instruction_class, count: int) -> list:
+    instructions = [instruction_class(0, constant=0)]
+    for i in range(1, count):
+        instructions.append(instruction_class(i, Operations.ADD, instructions[i - 1], instructions[0], i, i))
+    return instructions
+
+
+def bench_instruction_memory(statements: int, repeat: int):
+    count = max(statements * 5, 1)
+    for instruction_class in (DictInstruction, Instruction):
+        instructions = []
+        size = measure_allocation(lambda: instructions.append(make_instructions(instruction_class, count)))
+        # The list holding the instructions is not part of the instruction size
+        per_instruction = (size - sys.getsizeof(instructions[0])) / count
+        print(f"{instruction_class.__name__:<40} {per_instruction:10.1f} bytes per instruction")
+
+    parser = Parser.from_string(generate_source(statements), print_errors=False)
+    size = measure_allocation(parser.computation)
+    instruction_count = len(parser.blocks.instructions)
+    print(f"{'Parsing (all IR structures)':<40} {size / instruction_count:10.1f} bytes per instruction "
+          f"({instruction_count} instructions)")
+
+
+def bench_nested_ifs(statements: int, repeat: int):
+    depth = 1000
+    source = generate_nested_ifs(depth)
+    # The parser recurses a few levels for every nested if
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, depth * 20))
+    try:
+        seconds = time_it(lambda: compile_fresh(source), repeat)
+        parser = Parser.from_string(source, print_errors=False)
+        size = measure_allocation(parser.computation)
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+    print(f"{f'Parsing {depth} nested ifs':<40} {seconds * 1000:10.2f} ms {size / 1e6:10.2f} MB")
+
+
+def bench_while_blocks(statements: int, repeat: int):
+    count = max(statements // 20, 1)
+    source = generate_loop_with_ifs(count)
+    seconds = time_it(lambda: compile_fresh(source), repeat)
+    print(f"{f'Parsing a loop with {count} ifs':<40} {seconds * 1000:10.2f} ms")
+
+
+def bench_array_accesses(statements: int, repeat: int):
+    count = max(statements // 10, 1)
+    source = generate_array_accesses(count)
+    seconds = time_it(lambda: compile_fresh(source), repeat)
+    print(f"{f'Parsing {count * 8} array accesses':<40} {seconds * 1000:10.2f} ms")
+
+
+def count_block_instructions(parser: Parser) -> int:
+    return sum(len(block.get_instruction_order_list()) for block in parser.blocks.get_blocks_list())
+
+
+def get_loop_instructions(parser: Parser) -> list[Instruction]:
+    """
+    Returns the instructions that are executed in every iteration of a loop, once for every loop they are in.
+    """
+    loops = LoopInvariantCodeMotion(parser.blocks).loops
+    return [instruction for loop_blocks in loops.values() for block in loop_blocks
+            for instruction in block.get_instruction_order_list()]
+
+
+def count_loop_instructions(parser: Parser) -> int:
+    return len(get_loop_instructions(parser))
+
+
+def count_loop_multiplications(parser: Parser) -> int:
+    return sum(instruction.op == Operations.MUL for instruction in get_loop_instructions(parser))
+
+
+def compare_ir_size(option: str, count_instructions=count_block_instructions):
+    """
+    Prints the number of instructions (see count_instructions) for every class test compiled without and with the
+    option.
+    """
+    totals = [0, 0]
+    for file_name in sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'tests', 'class_tests', '*.txt'))):
+        counts = []
+        for enabled in (False, True):
+            compiler = Compiler(show_vars=False, **{option: enabled})
+            compiler.compile_file(file_name)
+            counts.append(count_instructions(compiler.parser))
+        totals = [total + count for total, count in zip(totals, counts)]
+        print(f"{os.path.basename(file_name):<40} {counts[0]:6} {counts[1]:6}")
+    print(f"{'Total':<40} {totals[0]:6} {totals[1]:6}")
+
+
+def bench_constant_folding(statements: int, repeat: int):
+    compare_ir_size('fold_constants')
+
+
+def bench_constant_propagation(statements: int, repeat: int):
+    compare_ir_size('propagate_constants')
+
+
+def bench_dead_code_elimination(statements: int, repeat: int):
+    compare_ir_size('eliminate_dead_code')
+
+
+def bench_loop_invariant_code_motion(statements: int, repeat: int):
+    compare_ir_size('hoist_loop_invariants', count_loop_instructions)
+
+
+def bench_strength_reduction(statements: int, repeat: int):
+    compare_ir_size('reduce_induction_variables', count_loop_multiplications)
+
+
+BENCHMARKS = {
+    'readers': bench_readers,
+    'tokenizers': bench_tokenizers,
+    'tokenizer_setup': bench_tokenizer_setup,
+    'compiler_reuse': bench_compiler_reuse,
+    'instruction_memory': bench_instruction_memory,
+    'nested_ifs': bench_nested_ifs,
+    'while_blocks': bench_while_blocks,
+    'array_accesses': bench_array_accesses,
+    'constant_folding': bench_constant_folding,
+    'constant_propagation': bench_constant_propagation,
+    'dead_code_elimination': bench_dead_code_elimination,
+    'loop_invariant_code_motion': bench_loop_invariant_code_motion,
+    'strength_reduction': bench_strength_reduction,
+}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Micro benchmarks for the smpl compiler.')
+    arg_parser.add_argument('benchmarks', nargs='*', help=f"any of {', '.join(BENCHMARKS)} (default: all)")
+    arg_parser.add_argument('--statements', type=int, default=20000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        arg_parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    for name in args.benchmarks or BENCHMARKS:
+        print(f"== {name} ==")
+        BENCHMARKS[name](args.statements, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
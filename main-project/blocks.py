@@ -1,6 +1,14 @@
+import heapq
+import itertools
 from enum import Enum
 
+from arrayaccesses import ArrayAccesses
+from defuse import DefUse
+from folding import FOLDABLE_OPERATIONS, fold
+from instructionmap import InstructionMap
 from operations import Operations
+from scopedtable import ScopedTable
+from taint import ReadTaint
 from ssa import Instruction
 
 
@@ -20,6 +28,8 @@ class Block:
     def __init__(self, idn: int = None):
         self.id = idn
         self.children = {}
+        # The Blocks the block was added to, which is told about changed edges (see Blocks.edges_changed)
+        self.owner: 'Blocks' = None
 
     def __str__(self):
         return f"BB{self.id}"
@@ -30,6 +40,10 @@ class Block:
     def update_id(self, idn: int):
         self.id = idn
 
+    def edges_changed(self):
+        if self.owner is not None:
+            self.owner.edges_changed()
+
 
 class ConstantBlock(Block):
     def __init__(self, idn: int):
@@ -52,13 +66,21 @@ class BasicBlock(Block):
         self.instructions = {}
         self.instruction_order_list = []
         self.vars: dict = {}
+        # The var and instruction of the vars that were assigned the value of another var (let y <- x)
+        self.var_copies: dict = {}
+        # The assignment every var got its value from (see get_var_stamp)
+        self.var_stamps: dict = {}
+        # The vars assigned to every instruction, built when it is first needed (see get_vars_using)
+        self.var_uses: dict = None
         self.updated_vars = set()
         self.parents: dict = {}
         self.children: {}
         self.phi_vars = set()
         self.existing_phis_instructions = {}
+        # The parent that the y operands of the phis come from, the x operands come from the other parents
+        self.phi_y_parent = None
         self.dom_parents = set()
-        self.dom_instructions = {}
+        self.dom_instructions = ScopedTable()
         self.array_instructions = {}
 
     def update_join(self, join: bool):
@@ -79,10 +101,7 @@ class BasicBlock(Block):
         :param y: second instruction parameter or None
         :return: instruction id or None
         """
-        if (op, x, y) in self.dom_instructions:
-            return self.dom_instructions[(op, x, y)]
-        else:
-            return None
+        return self.dom_instructions.get(self.cse_key(op, x, y))
 
     def add_new_instr_block(self, in_while, instr_id: int, op: Operations = None, x: Instruction = None,
                             y: Instruction = None, x_var: int = None, y_var: int = None) -> (Instruction, bool):
@@ -98,25 +117,19 @@ class BasicBlock(Block):
         :return: True if cse can be done together with the cse instruction. Otherwise, False and the new instruction.
         """
         if op == Operations.LOAD:
-            for instr in reversed(self.array_instructions[x_var]):
-                if instr.op == Operations.STORE and instr.y.originates_from_read:
-                    break
-                elif instr.op == Operations.STORE and (x and x.originates_from_read):
-                    break
-                elif instr.op == Operations.STORE and (y and y.originates_from_read):
-                    break
-                elif instr.op == Operations.STORE and instr.y == x:
-                    return instr.x, True
-                elif instr.op == Operations.LOAD:
-                    if instr.x == x and instr.y == y:
-                        return instr, True
+            available = self.array_instructions[x_var].find_available(x, y)
+            if available is not None:
+                # A store to the same address gives the stored value
+                if available.op == Operations.STORE:
+                    return available.x, True
+                return available, True
 
             inst = Instruction(instr_id, op, x, y, x_var, y_var)
             self.instructions[instr_id] = inst
             self.instruction_order_list.append(inst)
             return inst, False
 
-        elif (in_while or (op, x, y) not in self.dom_instructions) and op != Operations.LOAD:
+        elif in_while or self.get_dom_cse(op, x, y) is None:
             inst = Instruction(instr_id, op, x, y, x_var, y_var)
             self.instructions[instr_id] = inst
 
@@ -139,12 +152,22 @@ class BasicBlock(Block):
 
             # Add as a dominating instruction if applicable given the operation (and when not in a while since they
             # will be added later)
-            if op and op not in Operations.get_no_cse_instructions() and not in_while:
+            if op and op.is_cse_eligible() and not in_while:
                 self.add_dom_instruction(inst, op, x, y)
 
             return inst, False
         else:
-            return self.dom_instructions[(op, x, y)], True
+            return self.get_dom_cse(op, x, y), True
+
+    def get_dom_cse(self, op: Operations, x: Instruction, y: Instruction) -> Instruction:
+        """
+        Returns the dominating instruction that the instruction is a common subexpression of, or None. A store is only
+        one if no other store to the array came after it.
+        """
+        cse_instr = self.dom_instructions.get(self.cse_key(op, x, y))
+        if cse_instr is not None and op == Operations.STORE and not self.store_holds(cse_instr):
+            return None
+        return cse_instr
 
     def get_instructions(self) -> dict:
         return self.instructions
@@ -155,32 +178,106 @@ class BasicBlock(Block):
     def get_vars(self) -> dict:
         return self.vars
 
-    def add_var_assignment(self, var: int, instruction, update_var: bool = True, skip_return_check=False):
+    def add_var_assignment(self, var: int, instruction, update_var: bool = True, skip_return_check=False,
+                           copied_var: int = None, stamp: int = None):
+        """
+        :param copied_var: the var whose value is assigned, if the assigned expression is only a var
+        :param stamp: the number of the assignment (see Blocks.add_var_assignment), None for the value the var has
+        from the start
+        """
         if not self.return_block or skip_return_check:
             if instruction and instruction.op == Operations.STORE:
-                self.vars[var] = instruction.x
+                instruction = instruction.x
+            if self.var_uses is not None:
+                self.remove_var_use(var, self.vars.get(var))
+                self.add_var_use(var, instruction)
+            # A copy keeps the assignment of the copied value, so that let i <- i still reads i
+            if copied_var is not None and self.vars.get(copied_var) is instruction:
+                self.var_stamps[var] = self.var_stamps.get(copied_var)
+            else:
+                self.var_stamps[var] = stamp
+            self.vars[var] = instruction
+            if copied_var is not None:
+                # Keep the first var of a chain of copies, e.g. x for z <- y after y <- x
+                self.var_copies[var] = (self.get_copied_var(copied_var) or copied_var, instruction)
             else:
-                self.vars[var] = instruction
+                self.var_copies.pop(var, None)
             if update_var:
                 self.updated_vars.add(var)
 
-    def copy_vars(self, new_vars: dict):
+    def get_var_copies(self) -> dict:
+        return self.var_copies
+
+    def get_copied_var(self, var: int):
+        """
+        :return: the var that the var got its current value from by a copy, or None
+        """
+        copy = self.var_copies.get(var)
+        if copy is not None and copy[1] is self.vars.get(var):
+            return copy[0]
+        return None
+
+    def get_var_stamps(self) -> dict:
+        return self.var_stamps
+
+    def get_var_stamp(self, var: int, instruction: Instruction):
+        """
+        Returns the number of the assignment that gave the var its current value if that value is the instruction, or
+        None. Two reads of the same instruction from a var only read the same assignment if they have the same stamp,
+        e.g. not if the var is assigned a constant inside a while that it already had before the while.
+        """
+        if var is None or instruction is None or self.vars.get(var) is not instruction:
+            return None
+        return self.var_stamps.get(var)
+
+    def copy_vars(self, new_vars: dict, var_copies: dict = None, var_stamps: dict = None):
         self.vars = new_vars.copy()
+        self.var_copies = var_copies.copy() if var_copies else {}
+        self.var_stamps = var_stamps.copy() if var_stamps else {}
+        self.var_uses = None
+
+    def add_var_use(self, var: int, instruction: Instruction):
+        if instruction is not None:
+            self.var_uses.setdefault(instruction, {})[var] = None
+
+    def remove_var_use(self, var: int, instruction: Instruction):
+        if instruction is not None:
+            del self.var_uses[instruction][var]
+
+    def get_vars_using(self, instruction: Instruction) -> list[int]:
+        """
+        Returns the vars that are assigned the instruction in this block, without scanning all vars.
+        """
+        if self.var_uses is None:
+            self.var_uses = InstructionMap()
+            for var, value in self.vars.items():
+                self.add_var_use(var, value)
+        return list(self.var_uses.get(instruction, ()))
+
+    def replace_var_uses(self, old_instruction: Instruction, new_instruction: Instruction):
+        for var in self.get_vars_using(old_instruction):
+            self.remove_var_use(var, old_instruction)
+            self.add_var_use(var, new_instruction)
+            self.vars[var] = new_instruction
 
     def add_parent(self, parent_block, parent_type: BlockRelation):
         self.parents[parent_block] = parent_type
+        self.edges_changed()
 
     def remove_parent(self, parent_block: 'BasicBlock'):
         self.parents.pop(parent_block)
+        self.edges_changed()
 
     def get_parents(self) -> dict:
         return self.parents
 
     def add_child(self, child_block: 'BasicBlock', child_type: BlockRelation):
         self.children[child_block] = child_type
+        self.edges_changed()
 
     def remove_child(self, child_block: 'BasicBlock'):
         self.children.pop(child_block)
+        self.edges_changed()
 
     def get_children(self) -> dict:
         return self.children
@@ -193,6 +290,10 @@ class BasicBlock(Block):
     def update_instruction(self, instr: Instruction, x: Instruction = None, y: Instruction = None):
         instr: Instruction = self.instructions[instr.get_id()]
         instr.update_parameters(x, y)
+        # A change of the read taint is re-indexed by Blocks.update_instruction once the taint is updated
+        if instr.op in (Operations.LOAD, Operations.STORE):
+            for array_accesses in self.array_instructions.values():
+                array_accesses.update_instruction(instr)
 
     def get_existing_phi_instruction(self, var: int) -> Instruction:
         """
@@ -216,6 +317,12 @@ class BasicBlock(Block):
     def get_phi_vars(self) -> set[int]:
         return self.phi_vars
 
+    def set_phi_y_parent(self, parent_block: 'BasicBlock'):
+        self.phi_y_parent = parent_block
+
+    def get_phi_y_parent(self) -> 'BasicBlock':
+        return self.phi_y_parent
+
     def get_dom_parents(self):
         return self.dom_parents
 
@@ -224,16 +331,30 @@ class BasicBlock(Block):
         if not in_while:
             self.copy_dom_instructions(dom_parent)
 
-        dom_parent_array_instructions = dom_parent.array_instructions
-        self.array_instructions = dom_parent_array_instructions.copy()
+        # The dict is shared with the dominating block, add_array replaces it instead of changing it
+        self.array_instructions = dom_parent.array_instructions
 
     def copy_dom_instructions(self, dom_parent):
-        dom_parent_instructions = dom_parent.dom_instructions
-        self.dom_instructions.update(dom_parent_instructions)
+        """
+        Makes the dominating instructions of the dom parent available in this block. The table is chained to the
+        parent's table, so nothing is copied.
+        """
+        self.dom_instructions.link(dom_parent.dom_instructions)
 
     def add_dom_instruction(self, instr: Instruction, op: Operations, x: Instruction, y: Instruction):
         if op != Operations.PHI:
-            self.dom_instructions[(op, x, y)] = instr
+            self.dom_instructions[self.cse_key(op, x, y)] = instr
+
+    @staticmethod
+    def cse_key(op: Operations, x: Instruction, y: Instruction) -> tuple:
+        """
+        The operands of a commutative operation are ordered by the identity of the objects, which unlike the ids is
+        set for every instruction and never changes. The key still compares the operands by their ids, which do not
+        change while the blocks are built.
+        """
+        if op is not None and op.is_commutative() and x is not None and y is not None and id(x) > id(y):
+            return op, y, x
+        return op, x, y
 
     def get_dom_instruction(self):
         return self.dom_instructions
@@ -242,6 +363,13 @@ class BasicBlock(Block):
         del self.instructions[instr.get_id()]
         del self.instruction_order_list[index]
 
+    def append_instruction(self, instr: Instruction):
+        self.insert_instruction(instr, len(self.instruction_order_list))
+
+    def insert_instruction(self, instr: Instruction, index: int):
+        self.instructions[instr.get_id()] = instr
+        self.instruction_order_list.insert(index, instr)
+
     def reset_instructions(self):
         self.instructions = {}
         self.instruction_order_list = []
@@ -256,7 +384,7 @@ class BasicBlock(Block):
         return self.return_block
 
     def add_array(self, var: int):
-        self.array_instructions[var] = []
+        self.array_instructions = {**self.array_instructions, var: ArrayAccesses()}
 
     def get_array_instructions(self):
         return self.array_instructions
@@ -264,15 +392,61 @@ class BasicBlock(Block):
     def add_array_instruction(self, var: int, instruction: Instruction):
         self.array_instructions[var].append(instruction)
 
+    def store_holds(self, store: Instruction) -> bool:
+        """
+        Returns whether the value of the store is still at its address (see ArrayAccesses.store_holds).
+        """
+        return any(array_accesses.store_holds(store) for array_accesses in self.array_instructions.values())
+
     def add_array_kill_instruction(self, var: int, index: int):
-        self.array_instructions[var].insert(index, Instruction(op=Operations.KILL))
+        self.array_instructions[var].insert_kill(index)
+
+
+class BlockWorklist:
+    """
+    Blocks waiting to be visited, always handing out the block with the lowest id next. Uses a heap and a set so
+    that adding, removing and membership checks do not depend on the number of waiting blocks.
+    """
+
+    def __init__(self, blocks: list[BasicBlock] = ()):
+        self.heap = []
+        self.members = set()
+        self.pushed = 0
+        for block in blocks:
+            self.push(block)
+
+    def push(self, block: BasicBlock):
+        if block not in self.members:
+            self.members.add(block)
+            # Blocks with the same id come out in the order they were added
+            self.pushed += 1
+            heapq.heappush(self.heap, (block.get_id(), self.pushed, block))
+
+    def pop(self) -> BasicBlock:
+        block = heapq.heappop(self.heap)[2]
+        self.members.remove(block)
+        return block
+
+    def __contains__(self, block: BasicBlock) -> bool:
+        return block in self.members
+
+    def __bool__(self):
+        return bool(self.heap)
 
 
 class Blocks:
-    def __init__(self, base_ssa, initial_block):
+    def __init__(self, base_ssa, initial_block, fold_constants: bool = False):
         self.baseSSA = base_ssa
+        # Fold arithmetic with known results when it is added instead of emitting it (see folding.fold)
+        self.fold_constants = fold_constants
         self.id_count = 0
         self.constant_block = ConstantBlock(0)
+        self.constant_block.owner = self
+        # Increased whenever an edge of one of the blocks changes so that cached analyses of the CFG know they are
+        # outdated
+        self.edge_version = 0
+        # Numbers the assignments to the vars, see BasicBlock.get_var_stamp
+        self.assignment_stamps = itertools.count()
         self.blocks_list: list[BasicBlock] = []
         self.current_block: BasicBlock = initial_block
         self.current_join_block = None
@@ -280,6 +454,46 @@ class Blocks:
         self.leaf_joins_while = []
         self.instructions = {}
         self.removed_instructions = []
+        # The assignments that the x and y operands of the instructions read their vars from (see
+        # BasicBlock.get_var_stamp)
+        self.operand_stamps = InstructionMap()
+        # Analyses of the CFG, see cfg.get_cfg and dominators.get_dominator_tree
+        self.cfg = None
+        self.dominator_tree = None
+        # Use lists of the instructions and the read taint analysis that follows them
+        self.def_use = DefUse()
+        self.read_taint = ReadTaint(self.def_use)
+
+    def reset(self):
+        """
+        Clears all blocks and instructions so that the object can be used for a new compilation.
+        """
+        self.id_count = 0
+        self.constant_block.constants.clear()
+        self.constant_block.children.clear()
+        self.blocks_list.clear()
+        self.current_block = None
+        self.current_join_block = None
+        self.leaf_joins.clear()
+        self.leaf_joins_while.clear()
+        self.instructions.clear()
+        self.removed_instructions.clear()
+        self.operand_stamps.clear()
+        self.cfg = None
+        self.dominator_tree = None
+        self.def_use = DefUse()
+        self.read_taint = ReadTaint(self.def_use)
+        self.assignment_stamps = itertools.count()
+        self.edges_changed()
+
+    def edges_changed(self):
+        self.edge_version += 1
+
+    def get_operand_stamps(self, instr: Instruction) -> tuple:
+        return self.operand_stamps.get(instr, (None, None))
+
+    def set_operand_stamps(self, instr: Instruction, x_stamp: int, y_stamp: int):
+        self.operand_stamps[instr] = (x_stamp, y_stamp)
 
     def add_removed_instruction(self, instr: Instruction):
         self.removed_instructions.append(instr)
@@ -302,15 +516,141 @@ class Blocks:
         :return: the instruction id of the new instruction or the common subexpression instruction
         """
         if not block.is_return_block() or op == Operations.RET:
+            if self.fold_constants and op in FOLDABLE_OPERATIONS:
+                folded = self.fold_instruction(in_while, instr_id, op, x, y, x_var, y_var)
+                if folded is not None:
+                    return folded
             instr, cse = block.add_new_instr_block(in_while, instr_id, op, x, y, x_var, y_var)
             if cse:
                 self.baseSSA.decrease_id_count()
             else:
                 self.instructions[instr_id] = instr
+                self.def_use.add_instruction(instr, block)
+                self.read_taint.add_instruction(instr)
+                stamps = (block.get_var_stamp(x_var, x), block.get_var_stamp(y_var, y))
+                if stamps != (None, None):
+                    self.operand_stamps[instr] = stamps
             return instr
         elif op != Operations.RET:
             self.baseSSA.decrease_id_count()
 
+    def fold_instruction(self, in_while, instr_id: int, op: Operations, x: Instruction, y: Instruction, x_var: int,
+                         y_var: int) -> Instruction:
+        """
+        Folds the new instruction if its result is known, which gives up its instruction id.
+        In a while an operand that is the value of a variable can still be changed to a phi when the while is done,
+        so only operands without a variable are folded there, and only to numbers.
+        :return: the constant or operand instruction that is the result, or None if it cannot be folded
+        """
+        if in_while and (x_var is not None or y_var is not None):
+            return None
+        folded = fold(op, x, y, allow_operands=not in_while)
+        if folded is None:
+            return None
+        if instr_id == self.baseSSA.id_count:
+            self.baseSSA.decrease_id_count()
+        else:
+            # A constant operand got a newer id, so leave the gap to the renumbering at the end
+            self.add_removed_instruction(Instruction(instr_id))
+        if isinstance(folded, Instruction):
+            return folded
+        return self.add_constant(folded)
+
+    def update_instruction(self, block: BasicBlock, instr: Instruction, x: Instruction = None,
+                           y: Instruction = None):
+        """
+        Updates the operands of an instruction in the given block. Instructions that become (or stop being) derived
+        from a read through the change are indexed again in the array accesses.
+        :param block: the block of the instruction
+        :param instr: the instruction to update
+        :param x: the new x instruction or None to keep it
+        :param y: the new y instruction or None to keep it
+        """
+        old_x, old_y = instr.x, instr.y
+        block.update_instruction(instr, x, y)
+        self.def_use.update_uses(instr, old_x, old_y)
+        changed = self.read_taint.update(instr)
+        # The array accesses are shared by all blocks the arrays are visible in
+        for array_accesses in block.get_array_instructions().values():
+            for changed_instr in changed:
+                array_accesses.update_instruction(changed_instr)
+
+    def remove_block_instruction(self, block: BasicBlock, instr: Instruction, index: int):
+        """
+        Removes the instruction at the index from the block. It is no longer a user of its operands.
+        """
+        block.remove_instruction(instr, index)
+        self.def_use.remove_uses(instr, instr.x, instr.y)
+
+    def remove_block_instructions(self, block: BasicBlock, removed: list[(Instruction, int)]):
+        """
+        Removes the instructions at the indices (in increasing order) from the block and records them for the
+        renumbering. A block that would become empty keeps its first instruction as an empty instruction, like the
+        empty blocks of the parser.
+        """
+        if removed and len(removed) == len(block.get_instruction_order_list()):
+            instr = removed.pop(0)[0]
+            self.def_use.remove_uses(instr, instr.x, instr.y)
+            instr.op = instr.x = instr.y = instr.x_var = instr.y_var = None
+        for instr, index in reversed(removed):
+            self.remove_block_instruction(block, instr, index)
+            self.add_removed_instruction(instr)
+
+    def insert_new_instr(self, block: BasicBlock, index: int, op: Operations, x: Instruction = None,
+                         y: Instruction = None) -> Instruction:
+        """
+        Inserts a new instruction at the index of a finished block, without looking for a common subexpression.
+        """
+        instr = Instruction(self.baseSSA.get_new_instr_id(), op, x, y)
+        block.insert_instruction(instr, index)
+        self.instructions[instr.get_id()] = instr
+        self.def_use.add_instruction(instr, block)
+        self.read_taint.add_instruction(instr)
+        return instr
+
+    def move_instruction(self, instr: Instruction, block: BasicBlock, to_block: BasicBlock):
+        """
+        Moves the instruction from the block to the end of to_block. The branches to it go to the instruction that
+        followed it instead, and a block that becomes empty gets an empty instruction like the empty blocks of the
+        parser.
+        """
+        instructions = block.get_instruction_order_list()
+        index = instructions.index(instr)
+        block.remove_instruction(instr, index)
+        to_block.append_instruction(instr)
+        self.def_use.set_block(instr, to_block)
+        if not instructions:
+            self.add_new_instr(True, block, self.baseSSA.get_new_instr_id())
+        self.retarget_branches(instr, instructions[min(index, len(instructions) - 1)])
+
+    def retarget_branches(self, old_target: Instruction, new_target: Instruction, branch_blocks=None):
+        """
+        Makes the branches to old_target go to new_target.
+        :param branch_blocks: only the branches in these blocks are changed if given
+        """
+        for user in self.def_use.get_users(old_target):
+            block = self.def_use.get_block(user)
+            if user.op is None or not user.op.is_branch() or branch_blocks is not None and block not in branch_blocks:
+                continue
+            if user.op == Operations.BRA and user.x is old_target:
+                self.update_instruction(block, user, x=new_target)
+            elif user.op.is_conditional_branch() and user.y is old_target:
+                self.update_instruction(block, user, y=new_target)
+
+    def replace_all_uses_with(self, old_instr: Instruction, new_instr: Instruction, var_blocks=()):
+        """
+        Makes every instruction (phis included) that uses old_instr use new_instr instead. Only the uses are visited,
+        not all instructions.
+        :param old_instr: the instruction to replace
+        :param new_instr: the replacement
+        :param var_blocks: blocks whose vars assigned old_instr are assigned new_instr as well
+        """
+        for user in self.def_use.get_users(old_instr):
+            self.update_instruction(self.def_use.get_block(user), user, x=new_instr if user.x == old_instr else None,
+                                    y=new_instr if user.y == old_instr else None)
+        for block in var_blocks:
+            block.replace_var_uses(old_instr, new_instr)
+
     def get_current_block(self) -> BasicBlock:
         return self.current_block
 
@@ -329,8 +669,43 @@ class Blocks:
 
     def add_block(self, block: BasicBlock):
         block.update_id(self.get_new_block_id())
+        block.owner = self
         self.blocks_list.append(block)
         self.current_block = block
+        # The edges the block got before it was added
+        self.edges_changed()
+
+    def insert_block(self, block: BasicBlock, index: int):
+        """
+        Inserts the block at the index of the blocks list, the blocks are numbered again in the order of the list.
+        """
+        block.owner = self
+        self.blocks_list.insert(index, block)
+        self.edges_changed()
+        for i, block in enumerate(self.blocks_list, 1):
+            block.update_id(i)
+        self.id_count = len(self.blocks_list)
+
+    def remove_blocks(self, removed_blocks: set[BasicBlock]):
+        """
+        Removes the blocks together with their edges. Their instructions are removed and no longer users of their
+        operands. The remaining blocks are numbered again without gaps.
+        """
+        for block in removed_blocks:
+            for parent_block in list(block.get_parents()):
+                parent_block.remove_child(block)
+                block.remove_parent(parent_block)
+            for child_block in list(block.get_children()):
+                block.remove_child(child_block)
+                child_block.remove_parent(block)
+            for instr in block.get_instruction_order_list():
+                self.def_use.remove_uses(instr, instr.x, instr.y)
+                self.add_removed_instruction(instr)
+
+        self.blocks_list[:] = [block for block in self.blocks_list if block not in removed_blocks]
+        for i, block in enumerate(self.blocks_list, 1):
+            block.update_id(i)
+        self.id_count = len(self.blocks_list)
 
     def remove_latest_block(self):
         latest_block = self.blocks_list.pop()
@@ -352,8 +727,20 @@ class Blocks:
     def get_constant_instr(self, constant: int) -> Instruction:
         return self.constant_block.get_constant_id(constant)
 
-    def add_var_to_current_block(self, var: int, instruction: Instruction):
-        self.current_block.add_var_assignment(var, instruction)
+    def add_var_assignment(self, block: BasicBlock, var: int, instruction: Instruction, implicit: bool = False,
+                           **kwargs):
+        """
+        Assigns the instruction to the var in the block as a new assignment with its own stamp (see
+        BasicBlock.get_var_stamp). The keyword arguments are passed on to BasicBlock.add_var_assignment.
+        :param implicit: whether the var is initialized to 0 because it is read before it is assigned. The 0 is the
+        value the var had from the start, so it is not a new assignment.
+        """
+        stamp = None if implicit else next(self.assignment_stamps)
+        block.add_var_assignment(var, instruction, stamp=stamp, **kwargs)
+
+    def add_var_to_current_block(self, var: int, instruction: Instruction, copied_var: int = None,
+                                 implicit: bool = False):
+        self.add_var_assignment(self.current_block, var, instruction, implicit=implicit, copied_var=copied_var)
 
     def find_var_given_id(self, var: int) -> Instruction:
         return self.current_block.get_vars()[var]
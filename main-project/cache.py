@@ -0,0 +1,153 @@
+import functools
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+# Part of every key together with the compiler fingerprint, increase it when the format of the cached results
+# changes. Changes to the compiler are already covered by the fingerprint.
+CACHE_VERSION = 1
+
+# The directory of the compiler modules
+COMPILER_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_fingerprint(directory: str = COMPILER_DIRECTORY) -> str:
+    """
+    Hashes the sources of the compiler modules in the directory (all .py files except the tests), so a changed
+    compiler never gets the results of an older one from a cache. Computed once per process.
+    """
+    digest = hashlib.sha256(f"{CACHE_VERSION}|".encode())
+    for file_name in sorted(glob.glob(os.path.join(directory, '*.py'))):
+        base_name = os.path.basename(file_name)
+        if base_name.startswith('test_'):
+            continue
+        with open(file_name, 'rb') as file:
+            digest.update(f"{base_name}|".encode())
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def make_key(source: str, options: dict, fingerprint: str = None) -> str:
+    """
+    Hashes the source text together with the compiler options that influence the result and the compiler
+    fingerprint (see compiler_fingerprint).
+    """
+    if fingerprint is None:
+        fingerprint = compiler_fingerprint()
+    digest = hashlib.sha256()
+    digest.update(f"{fingerprint}|{sorted(options.items())!r}|".encode())
+    digest.update(source.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+class CompileCache:
+    """
+    Content-addressed cache for compile results (the dicts of CompileResult.to_dict). Keeps an LRU of up to
+    max_entries results in memory and, when a directory is given, also stores every result there as a JSON file,
+    removing the least recently used files once they take more than max_disk_bytes. The directory can be shared by
+    several processes.
+    """
+
+    def __init__(self, max_entries: int = 1024, directory: str = None, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.disk_bytes = sum(size for _, size, _ in self.disk_files())
+
+    def get(self, key: str) -> dict:
+        """
+        Returns the cached result for the key or None.
+        """
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+        if self.directory:
+            result = self.read_file(key)
+            if result is not None:
+                self.remember(key, result)
+                self.hits += 1
+                self.disk_hits += 1
+                return result
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: dict):
+        self.remember(key, result)
+        if self.directory:
+            self.write_file(key, result)
+
+    def remember(self, key: str, result: dict):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'entries': len(self.entries), 'disk_bytes': self.disk_bytes}
+
+    def file_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def read_file(self, key: str) -> dict:
+        path = self.file_path(key)
+        try:
+            with open(path, 'r') as file:
+                result = json.load(file)
+            os.utime(path)  # mark as recently used for the eviction
+            return result
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write_file(self, key: str, result: dict):
+        # Write to a temporary file first so that other processes never read a partially written result
+        file = tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False)
+        with file:
+            json.dump(result, file)
+        os.replace(file.name, self.file_path(key))
+        self.disk_bytes += os.path.getsize(self.file_path(key))
+
+        if self.disk_bytes > self.max_disk_bytes:
+            self.evict_files()
+
+    def disk_files(self) -> list[(str, int, float)]:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # removed by another process
+                    continue
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def evict_files(self):
+        """
+        Removes the least recently used files until the directory is at most 3/4 of max_disk_bytes.
+        """
+        files = sorted(self.disk_files(), key=lambda file: file[2])
+        self.disk_bytes = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if self.disk_bytes <= self.max_disk_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.disk_bytes -= size
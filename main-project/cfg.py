@@ -0,0 +1,108 @@
+from array import array
+
+from blocks import BasicBlock, BlockRelation, Blocks
+
+
+class CompactCFG:
+    """
+    Integer indexed view of the CFG. Block i of the view is blocks[i], and its successors are
+    successors[successor_offsets[i]:successor_offsets[i + 1]] with the edge kinds (BlockRelation values) at the same
+    positions in successor_kinds. Predecessors are stored the same way. The view is built again when it is used after
+    edges changed, either through add_edge/remove_edge or directly on the blocks, or after blocks were added to the
+    list.
+    """
+
+    def __init__(self, blocks: list[BasicBlock], owner: Blocks):
+        self.blocks = blocks
+        self.owner = owner  # the Blocks whose edge_version tells when the CFG changed
+        self.index: dict[BasicBlock, int] = {}
+        self.successor_offsets = array('i')
+        self.successors = array('i')
+        self.successor_kinds = bytearray()
+        self.predecessor_offsets = array('i')
+        self.predecessors = array('i')
+        self.predecessor_kinds = bytearray()
+        self.version = None
+        self.block_count = None
+        self.refresh()
+
+    def is_outdated(self) -> bool:
+        return self.version != self.owner.edge_version or self.block_count != len(self.blocks)
+
+    def refresh(self):
+        """
+        Builds the arrays again if the CFG has changed since they were built.
+        """
+        if not self.is_outdated():
+            return
+
+        self.index = {block: i for i, block in enumerate(self.blocks)}
+        self.successor_offsets, self.successors, self.successor_kinds = self.build(BasicBlock.get_children)
+        self.predecessor_offsets, self.predecessors, self.predecessor_kinds = self.build(BasicBlock.get_parents)
+        self.version = self.owner.edge_version
+        self.block_count = len(self.blocks)
+
+    def build(self, get_edges) -> (array, array, bytearray):
+        offsets = array('i', [0])
+        targets = array('i')
+        kinds = bytearray()
+        index = self.index
+        for block in self.blocks:
+            for target, relation in get_edges(block).items():
+                # Edges to blocks that are not in the list (the constant block) are left out
+                if target in index:
+                    targets.append(index[target])
+                    kinds.append(relation.value)
+            offsets.append(len(targets))
+        return offsets, targets, kinds
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def get_index(self, block: BasicBlock) -> int:
+        self.refresh()
+        return self.index[block]
+
+    def get_successors(self, i: int) -> array:
+        self.refresh()
+        return self.successors[self.successor_offsets[i]:self.successor_offsets[i + 1]]
+
+    def get_predecessors(self, i: int) -> array:
+        self.refresh()
+        return self.predecessors[self.predecessor_offsets[i]:self.predecessor_offsets[i + 1]]
+
+    def get_successor_edges(self, i: int) -> list[(int, BlockRelation)]:
+        self.refresh()
+        start, end = self.successor_offsets[i], self.successor_offsets[i + 1]
+        return [(self.successors[j], BlockRelation(self.successor_kinds[j])) for j in range(start, end)]
+
+    def get_predecessor_edges(self, i: int) -> list[(int, BlockRelation)]:
+        self.refresh()
+        start, end = self.predecessor_offsets[i], self.predecessor_offsets[i + 1]
+        return [(self.predecessors[j], BlockRelation(self.predecessor_kinds[j])) for j in range(start, end)]
+
+    def add_edge(self, parent_block: BasicBlock, child_block: BasicBlock, relationship: BlockRelation):
+        parent_block.add_child(child_block, relationship)
+        child_block.add_parent(parent_block, relationship)
+
+    def remove_edge(self, parent_block: BasicBlock, child_block: BasicBlock):
+        parent_block.remove_child(child_block)
+        child_block.remove_parent(parent_block)
+
+    def retarget_edge(self, parent_block: BasicBlock, old_child_block: BasicBlock, new_child_block: BasicBlock):
+        """
+        Moves the edge from parent_block to old_child_block so that it goes to new_child_block, keeping its kind.
+        """
+        relationship = parent_block.get_children()[old_child_block]
+        self.remove_edge(parent_block, old_child_block)
+        self.add_edge(parent_block, new_child_block, relationship)
+
+
+def get_cfg(blocks: Blocks) -> CompactCFG:
+    """
+    Returns the compact CFG of the blocks, which is kept with the blocks and brought up to date when it is used.
+    """
+    if blocks.cfg is None:
+        blocks.cfg = CompactCFG(blocks.get_blocks_list(), blocks)
+    blocks.cfg.refresh()
+    return blocks.cfg
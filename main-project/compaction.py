@@ -0,0 +1,19 @@
+from bisect import bisect_left
+
+from ssa import Instruction
+
+
+def compact_instruction_ids(instructions: dict[int, Instruction], removed_instructions: list[Instruction]):
+    """
+    Renumbers the instructions so that the ids of removed instructions do not leave gaps. Every instruction moves
+    down by the number of removed instructions with a lower id (an instruction removed twice counts twice). Runs in
+    O(N log R) with a binary search over the sorted removed ids.
+    :param instructions: all instructions by their current id
+    :param removed_instructions: the instructions that were removed from the blocks
+    """
+    removed_ids = sorted(instruction.get_id() for instruction in removed_instructions)
+    if not removed_ids:
+        return
+
+    for old_id, instruction in instructions.items():
+        instruction.id = old_id - bisect_left(removed_ids, old_id)
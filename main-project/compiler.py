@@ -0,0 +1,96 @@
+from cache import CompileCache, make_key
+from filereader import StringReader
+from parser import Parser
+from visualizer import Visualizer
+
+
+class CompileResult:
+    """
+    The outcome of compiling one smpl program: the DOT graph, statistics about the IR and the diagnostics (as
+    dicts with line, col and message). Only holds plain data so it can be pickled and stored.
+    """
+
+    def __init__(self, dot: str, stats: dict, diagnostics: list[dict], name: str = None):
+        self.name = name
+        self.dot = dot
+        self.stats = stats
+        self.diagnostics = diagnostics
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'dot': self.dot, 'stats': self.stats, 'diagnostics': self.diagnostics}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'CompileResult':
+        return cls(data['dot'], dict(data['stats']), list(data['diagnostics']), data.get('name'))
+
+
+def ir_stats(parser: Parser) -> dict:
+    blocks_list = parser.blocks.get_blocks_list()
+    return {
+        'blocks': len(blocks_list),
+        'instructions': sum(len(block.get_instruction_order_list()) for block in blocks_list),
+        'constants': len(parser.blocks.get_constant_block().constants),
+    }
+
+
+class Compiler:
+    """
+    Compiles many programs with one reused Parser (see Parser.reset) so that the tokenizer, identifier table and
+    containers are only created once. The options are passed on to the Parser, except show_vars and
+    show_instr_vars which are used for the Visualizer.
+
+    With a CompileCache, sources that have been compiled before with the same options are answered from the cache
+    without parsing them.
+    """
+
+    # Parser options that do not change the compile result and are therefore not part of the cache key
+    UNCACHED_OPTIONS = {'print_errors', 'identifiers', 'threaded_lexing', 'lookahead'}
+
+    def __init__(self, show_vars: bool = True, show_instr_vars: bool = False, cache: CompileCache = None,
+                 **parser_options):
+        parser_options.setdefault('print_errors', False)
+        self.show_vars = show_vars
+        self.show_instr_vars = show_instr_vars
+        self.parser_options = parser_options
+        self.parser: Parser = None
+        self.cache = cache
+        self.cache_options = {key: value for key, value in parser_options.items() if key not in self.UNCACHED_OPTIONS}
+        self.cache_options.update(show_vars=show_vars, show_instr_vars=show_instr_vars)
+
+    def get_parser(self, file_name=None, reader: StringReader = None) -> Parser:
+        if self.parser is None:
+            self.parser = Parser(file_name, reader=reader, **self.parser_options)
+        else:
+            self.parser.reset(file_name, reader)
+        return self.parser
+
+    def compile_file(self, file_name) -> CompileResult:
+        if self.cache is not None:
+            with open(file_name, 'r') as file:
+                return self.compile_source(file.read(), name=str(file_name))
+        return self.compile_parser(self.get_parser(file_name=file_name), name=str(file_name))
+
+    def compile_source(self, source, name: str = None) -> CompileResult:
+        """
+        Compiles a source given as str, bytes or stream.
+        """
+        reader = StringReader.from_source(source)
+        if self.cache is None:
+            return self.compile_parser(self.get_parser(reader=reader), name=name)
+
+        key = make_key(reader.text, self.cache_options)
+        cached = self.cache.get(key)
+        if cached is not None:
+            result = CompileResult.from_dict(cached)
+            result.name = name
+            return result
+
+        result = self.compile_parser(self.get_parser(reader=reader), name=name)
+        self.cache.put(key, result.to_dict())
+        return result
+
+    def compile_parser(self, parser: Parser, name: str = None) -> CompileResult:
+        parser.computation()
+        visualizer = Visualizer(parser.blocks, parser.symbolTable, show_vars=self.show_vars,
+                                show_instr_vars=self.show_instr_vars)
+        return CompileResult(visualizer.make_graph(), ir_stats(parser), parser.diagnostics.to_list(), name)
@@ -0,0 +1,75 @@
+from blocks import Blocks
+from instructionmap import InstructionMap, InstructionSet
+from operations import Operations
+from ssa import Instruction
+
+
+def is_root(instruction: Instruction) -> bool:
+    """
+    Returns whether the instruction has to stay even if its value is never used: the writes, stores, reads, branches
+    and the end, and the empty instructions of the empty blocks.
+    """
+    return instruction.op is None or instruction.op.is_side_effecting()
+
+
+def get_value_operands(instruction: Instruction) -> tuple:
+    """
+    Returns the operands whose values the instruction uses. The targets of the branches are not values.
+    """
+    if instruction.op is None or instruction.op == Operations.BRA:
+        return ()
+    if instruction.op.is_conditional_branch():
+        return instruction.x,
+    return instruction.x, instruction.y
+
+
+def eliminate_dead_code(blocks: Blocks) -> int:
+    """
+    Removes the instructions of the finished blocks whose values are never used (mark and sweep). Starting from the
+    roots (see is_root), the operands are marked as live backwards, so unused phis, loads and arithmetic are removed
+    even if they use each other, e.g. a phi of a loop that is only used by the instruction it comes back from.
+    :return: the number of removed instructions
+    """
+    blocks_list = blocks.get_blocks_list()
+    live = InstructionSet()
+    worklist = []
+    for block in blocks_list:
+        for instr in block.get_instruction_order_list():
+            if is_root(instr):
+                live.add(instr)
+                worklist.append(instr)
+
+    while worklist:
+        for operand in get_value_operands(worklist.pop()):
+            if operand is not None and operand not in live:
+                live.add(operand)
+                worklist.append(operand)
+
+    # The blocks whose vars are assigned every instruction, so that the vars of a dead instruction are cleared without
+    # visiting every block
+    var_blocks = InstructionMap()
+    for block in blocks_list:
+        for value in block.get_vars().values():
+            if value is not None:
+                var_blocks.setdefault(value, {})[block] = None
+
+    removed_count = len(blocks.removed_instructions)
+    for block in blocks_list:
+        instructions = block.get_instruction_order_list()
+        dead = [(instr, i) for i, instr in enumerate(instructions) if instr not in live]
+        retargeted = []
+        for instr, i in dead:
+            # The vars assigned a dead instruction are not used anymore either
+            for var_block in var_blocks.get(instr, ()):
+                var_block.replace_var_uses(instr, None)
+            # A live instruction only uses a dead one as the target of a branch, which has to go to the next live
+            # instruction of the block instead
+            if any(user in live for user in blocks.def_use.get_users(instr)):
+                following = next((later for later in instructions[i + 1:] if later in live), None)
+                retargeted.append((instr, following))
+        blocks.remove_block_instructions(block, dead)
+
+        for instr, following in retargeted:
+            blocks.retarget_branches(instr, following or block.find_first_instr())
+
+    return len(blocks.removed_instructions) - removed_count
@@ -0,0 +1,51 @@
+from instructionmap import InstructionMap
+from ssa import Instruction
+
+
+class DefUse:
+    """
+    Use lists of the instructions: for every instruction the instructions that have it as an operand, with the number
+    of operands that use it. The block of every instruction is kept as well so that a use can be updated without
+    searching for it. Both are keyed by the instruction objects (see InstructionMap).
+    """
+
+    def __init__(self):
+        self.users: InstructionMap = InstructionMap()
+        self.blocks = InstructionMap()
+
+    def add_instruction(self, instruction: Instruction, block=None):
+        self.blocks[instruction] = block
+        self.add_uses(instruction)
+
+    def add_uses(self, instruction: Instruction):
+        for operand in (instruction.x, instruction.y):
+            if operand is not None:
+                uses = self.users.setdefault(operand, InstructionMap())
+                uses[instruction] = uses.get(instruction, 0) + 1
+
+    def remove_uses(self, instruction: Instruction, x: Instruction, y: Instruction):
+        for operand in (x, y):
+            uses = self.users.get(operand)
+            if uses and instruction in uses:
+                uses[instruction] -= 1
+                if not uses[instruction]:
+                    del uses[instruction]
+
+    def update_uses(self, instruction: Instruction, old_x: Instruction, old_y: Instruction):
+        """
+        Moves the uses of the instruction after its operands changed from old_x and old_y.
+        """
+        self.remove_uses(instruction, old_x, old_y)
+        self.add_uses(instruction)
+
+    def get_users(self, instruction: Instruction) -> list[Instruction]:
+        return list(self.users.get(instruction, ()))
+
+    def has_users(self, instruction: Instruction) -> bool:
+        return bool(self.users.get(instruction))
+
+    def get_block(self, instruction: Instruction):
+        return self.blocks.get(instruction)
+
+    def set_block(self, instruction: Instruction, block):
+        self.blocks[instruction] = block
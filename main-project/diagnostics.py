@@ -0,0 +1,62 @@
+class Diagnostic:
+    """
+    An error found while compiling. Only the offset in the source is stored, the line and column are looked up from
+    the reader's newline index when they are asked for.
+    """
+    __slots__ = ('message', 'offset', 'reader')
+
+    def __init__(self, message: str, offset: int, reader):
+        self.message = message
+        self.offset = offset
+        self.reader = reader
+
+    @property
+    def line(self) -> int:
+        return self.reader.position(self.offset)[0]
+
+    @property
+    def col(self) -> int:
+        return self.reader.position(self.offset)[1]
+
+    def to_dict(self) -> dict:
+        line, col = self.reader.position(self.offset)
+        return {'line': line, 'col': col, 'message': self.message}
+
+    def __str__(self):
+        line, col = self.reader.position(self.offset)
+        return f"{line}:{col}: {self.message}"
+
+    def __repr__(self):
+        return f"Diagnostic({str(self)!r})"
+
+
+class Diagnostics:
+    """
+    Collects the diagnostics of one compilation so that they can be inspected after parsing.
+    """
+
+    def __init__(self):
+        self.diagnostics: list[Diagnostic] = []
+
+    def add(self, message: str, offset: int, reader) -> Diagnostic:
+        diagnostic = Diagnostic(message, offset, reader)
+        self.diagnostics.append(diagnostic)
+        return diagnostic
+
+    def clear(self):
+        self.diagnostics.clear()
+
+    def has_errors(self) -> bool:
+        return len(self.diagnostics) > 0
+
+    def to_list(self) -> list[dict]:
+        return [diagnostic.to_dict() for diagnostic in self.diagnostics]
+
+    def __iter__(self):
+        return iter(self.diagnostics)
+
+    def __len__(self):
+        return len(self.diagnostics)
+
+    def __getitem__(self, index: int) -> Diagnostic:
+        return self.diagnostics[index]
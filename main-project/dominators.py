@@ -0,0 +1,176 @@
+from array import array
+
+from blocks import BasicBlock, Blocks
+from cfg import CompactCFG, get_cfg
+
+
+class DominatorTree:
+    """
+    Dominator analysis of a CompactCFG, with block 0 as the entry. The immediate dominators are computed with the
+    iterative algorithm of Cooper, Harvey and Kennedy over the blocks in reverse postorder. The dominator tree is
+    numbered with the enter and exit times of a depth first walk so that dominates is a constant time interval check.
+    Blocks that cannot be reached from the entry are not part of the tree.
+    """
+
+    def __init__(self, cfg: CompactCFG):
+        self.cfg = cfg
+        self.version = cfg.version
+        self.blocks = list(cfg.blocks)
+        self.index = dict(cfg.index)
+        self.entry = self.blocks[0]
+        count = len(self.blocks)
+
+        self.order = self.reverse_postorder()
+        self.order_index = array('i', [-1]) * count
+        for i, block_index in enumerate(self.order):
+            self.order_index[block_index] = i
+        self.idoms = self.compute_idoms()
+
+        self.tree_children: list[list[int]] = [[] for _ in range(count)]
+        for block_index in self.order[1:]:
+            self.tree_children[self.idoms[block_index]].append(block_index)
+
+        self.preorder: list[int] = []
+        self.enter = array('i', [-1]) * count
+        self.exit = array('i', [-1]) * count
+        self.number_tree()
+        self.frontiers = self.compute_frontiers()
+
+    def reverse_postorder(self) -> list[int]:
+        cfg = self.cfg
+        postorder = []
+        visited = bytearray(len(self.blocks))
+        visited[0] = 1
+        stack = [(0, iter(cfg.get_successors(0)))]
+        while stack:
+            block_index, successors = stack[-1]
+            for successor in successors:
+                if not visited[successor]:
+                    visited[successor] = 1
+                    stack.append((successor, iter(cfg.get_successors(successor))))
+                    break
+            else:
+                stack.pop()
+                postorder.append(block_index)
+        postorder.reverse()
+        return postorder
+
+    def compute_idoms(self) -> array:
+        cfg = self.cfg
+        idoms = array('i', [-1]) * len(self.blocks)
+        idoms[0] = 0
+        changed = True
+        while changed:
+            changed = False
+            for block_index in self.order[1:]:
+                new_idom = -1
+                for predecessor in cfg.get_predecessors(block_index):
+                    if idoms[predecessor] != -1:
+                        new_idom = predecessor if new_idom == -1 else self.intersect(idoms, predecessor, new_idom)
+                if idoms[block_index] != new_idom:
+                    idoms[block_index] = new_idom
+                    changed = True
+        idoms[0] = -1
+        return idoms
+
+    def intersect(self, idoms: array, block1: int, block2: int) -> int:
+        order_index = self.order_index
+        while block1 != block2:
+            while order_index[block1] > order_index[block2]:
+                block1 = idoms[block1]
+            while order_index[block2] > order_index[block1]:
+                block2 = idoms[block2]
+        return block1
+
+    def number_tree(self):
+        time = 0
+        self.enter[0] = time
+        self.preorder.append(0)
+        stack = [(0, iter(self.tree_children[0]))]
+        while stack:
+            block_index, children = stack[-1]
+            child = next(children, None)
+            time += 1
+            if child is None:
+                stack.pop()
+                self.exit[block_index] = time
+            else:
+                self.enter[child] = time
+                self.preorder.append(child)
+                stack.append((child, iter(self.tree_children[child])))
+
+    def compute_frontiers(self) -> list[set[int]]:
+        frontiers = [set() for _ in self.blocks]
+        for block_index in self.order:
+            predecessors = [predecessor for predecessor in self.cfg.get_predecessors(block_index)
+                            if self.enter[predecessor] != -1]
+            # The entry is also entered from outside of the CFG, e.g. a loop header at the start of the program
+            if len(predecessors) + (block_index == 0) < 2:
+                continue
+            for runner in predecessors:
+                while runner != self.idoms[block_index]:
+                    frontiers[runner].add(block_index)
+                    runner = self.idoms[runner]
+        return frontiers
+
+    def index_of(self, block: BasicBlock) -> int:
+        """
+        Returns the index of the block in the CFG if it can be reached from the entry, otherwise -1.
+        """
+        block_index = self.index.get(block)
+        if block_index is None or self.enter[block_index] == -1:
+            return -1
+        return block_index
+
+    def __contains__(self, block: BasicBlock) -> bool:
+        return self.index_of(block) != -1
+
+    def dominates_index(self, block1: int, block2: int) -> bool:
+        return self.enter[block1] <= self.enter[block2] and self.exit[block2] <= self.exit[block1]
+
+    def dominates(self, block1: BasicBlock, block2: BasicBlock) -> bool:
+        """
+        Returns True if every path from the entry to block2 goes through block1 (a block dominates itself).
+        """
+        index1, index2 = self.index_of(block1), self.index_of(block2)
+        if index1 == -1 or index2 == -1:
+            return False
+        return self.dominates_index(index1, index2)
+
+    def strictly_dominates(self, block1: BasicBlock, block2: BasicBlock) -> bool:
+        return block1 is not block2 and self.dominates(block1, block2)
+
+    def get_idom(self, block: BasicBlock) -> BasicBlock:
+        """
+        Returns the immediate dominator of the block, None for the entry and blocks that cannot be reached.
+        """
+        block_index = self.index_of(block)
+        if block_index == -1 or self.idoms[block_index] == -1:
+            return None
+        return self.blocks[self.idoms[block_index]]
+
+    def get_tree_children(self, block: BasicBlock) -> list[BasicBlock]:
+        block_index = self.index_of(block)
+        if block_index == -1:
+            return []
+        return [self.blocks[child] for child in self.tree_children[block_index]]
+
+    def get_frontier(self, block: BasicBlock) -> set[BasicBlock]:
+        block_index = self.index_of(block)
+        if block_index == -1:
+            return set()
+        return {self.blocks[frontier_block] for frontier_block in self.frontiers[block_index]}
+
+    def get_preorder(self) -> list[BasicBlock]:
+        return [self.blocks[block_index] for block_index in self.preorder]
+
+
+def get_dominator_tree(blocks: Blocks) -> DominatorTree:
+    """
+    Returns the dominator tree of the blocks, which is only computed again after the CFG has changed.
+    """
+    cfg = get_cfg(blocks)
+    if blocks.dominator_tree is None or blocks.dominator_tree.version != cfg.version \
+            or len(blocks.dominator_tree.blocks) != len(cfg):
+        blocks.dominator_tree = DominatorTree(cfg)
+    return blocks.dominator_tree
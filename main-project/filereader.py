@@ -1,3 +1,26 @@
+from bisect import bisect_right
+
+
+def find_position(line_starts: list[int], offset: int) -> (int, int):
+    """
+    Finds the line and column (both starting at 1) of a character offset given the offsets where each line starts.
+    """
+    line = bisect_right(line_starts, offset)
+    return line, offset - line_starts[line - 1] + 1
+
+
+def find_line_starts(text: str) -> list[int]:
+    """
+    Finds the offsets where each line of the text starts.
+    """
+    line_starts = [0]
+    newline = text.find('\n')
+    while newline != -1:
+        line_starts.append(newline + 1)
+        newline = text.find('\n', newline + 1)
+    return line_starts
+
+
 class FileReader:
     def __init__(self, file_name):
         try:
@@ -5,7 +28,10 @@ class FileReader:
         except FileNotFoundError:
             raise FileNotFoundError(f"The file '{file_name}' does not exist.")
 
+        self.file_name = file_name
         self.current_char = self.file.read(1)
+        self.pos = 0  # number of characters handed out
+        self.line_starts = None  # built on the first position lookup
 
     def get_next(self):
         if not self.current_char:
@@ -14,10 +40,106 @@ class FileReader:
 
         return_char = self.current_char
         self.current_char = self.file.read(1)
+        self.pos += 1
         return return_char
 
+    def read_run(self, pattern) -> str:
+        """
+        Reads the longest run of characters that each match the given compiled single character pattern.
+        The first character that does not match is left unread.
+        """
+        run = []
+        while self.current_char and pattern.fullmatch(self.current_char):
+            run.append(self.current_char)
+            self.current_char = self.file.read(1)
+            self.pos += 1
+        return ''.join(run)
+
+    def position(self, offset: int) -> (int, int):
+        """
+        Returns the line and column of an offset. The characters are not kept, so the line start index is built from
+        the file when a position is first needed.
+        """
+        if self.line_starts is None:
+            with open(self.file_name, 'r') as file:
+                self.line_starts = find_line_starts(file.read())
+        return find_position(self.line_starts, offset)
+
     def error(self, error_msg: str):
         print(f"Error: {error_msg}")
 
     def close(self):
         self.file.close()
+
+
+class StringReader:
+    """
+    Hands out the characters of an in-memory source by moving an index through the string.
+    Has the same interface as FileReader but avoids an IO call per character.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.length = len(self.text)
+        self.line_starts = None  # built on the first position lookup
+
+    def get_next(self):
+        pos = self.pos
+        if pos >= self.length:
+            return ''
+
+        self.pos = pos + 1
+        return self.text[pos]
+
+    def read_run(self, pattern) -> str:
+        """
+        Reads the longest run of characters that each match the given compiled single character pattern.
+        The run is matched directly against the buffer so the characters are not handed out one at a time.
+        """
+        match = pattern.match(self.text, self.pos)
+        if not match:
+            return ''
+        self.pos = match.end()
+        return match.group()
+
+    def position(self, offset: int) -> (int, int):
+        """
+        Returns the line and column of an offset. The line start index is only built the first time a position is
+        needed so reading the source does not pay for it.
+        """
+        if self.line_starts is None:
+            self.line_starts = find_line_starts(self.text)
+        return find_position(self.line_starts, offset)
+
+    def error(self, error_msg: str):
+        print(f"Error: {error_msg}")
+
+    def close(self):
+        self.pos = self.length
+
+    @classmethod
+    def from_source(cls, source) -> 'StringReader':
+        """
+        Makes a reader for a str, for bytes (decoded as UTF-8) or for any stream with a read method returning either.
+        """
+        if hasattr(source, 'read'):
+            source = source.read()
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = bytes(source).decode('utf-8')
+        return cls(source)
+
+
+class BufferedFileReader(StringReader):
+    """
+    Reads the whole source file into memory once and hands out its characters as a StringReader.
+    """
+
+    def __init__(self, file_name):
+        try:
+            with open(file_name, 'r') as file:
+                text = file.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"The file '{file_name}' does not exist.")
+
+        super().__init__(text)
@@ -0,0 +1,63 @@
+from operations import Operations
+from ssa import Instruction
+
+FOLDABLE_OPERATIONS = frozenset({Operations.ADD, Operations.SUB, Operations.MUL, Operations.DIV})
+
+
+def constant_value(instruction: Instruction) -> int:
+    """
+    Returns the value of a number constant, or None for any other instruction (including the address constants of
+    the arrays).
+    """
+    if instruction is not None and instruction.op is None and isinstance(instruction.constant, int):
+        return instruction.constant
+    return None
+
+
+def evaluate(op: Operations, x: int, y: int) -> int:
+    """
+    Computes op on two numbers. Division truncates towards zero, a division by zero is not evaluated. A comparison
+    gives -1, 0 or 1 for x < y, x = y and x > y.
+    :return: the result or None
+    """
+    if op == Operations.ADD:
+        return x + y
+    elif op == Operations.SUB:
+        return x - y
+    elif op == Operations.MUL:
+        return x * y
+    elif op == Operations.DIV and y != 0:
+        quotient = abs(x) // abs(y)
+        return quotient if (x < 0) == (y < 0) else -quotient
+    elif op == Operations.CMP:
+        return (x > y) - (x < y)
+    return None
+
+
+def fold(op: Operations, x: Instruction, y: Instruction, allow_operands: bool = True):
+    """
+    Folds an arithmetic instruction whose result is known without executing it: both operands are numbers, or an
+    identity applies (x + 0, x - 0, x * 1, x / 1, x * 0 and x - x).
+    :param op: the operation
+    :param x: the x instruction
+    :param y: the y instruction
+    :param allow_operands: whether an identity may give one of the operands as the result
+    :return: the resulting number, the operand that is the result, or None if it cannot be folded
+    """
+    if op not in FOLDABLE_OPERATIONS or x is None or y is None:
+        return None
+    x_value, y_value = constant_value(x), constant_value(y)
+    if x_value is not None and y_value is not None:
+        return evaluate(op, x_value, y_value)
+
+    if op == Operations.MUL and 0 in (x_value, y_value):
+        return 0
+    if op == Operations.SUB and x is y:
+        return 0
+    if allow_operands:
+        if op in (Operations.ADD, Operations.SUB) and y_value == 0 or op in (Operations.MUL, Operations.DIV) \
+                and y_value == 1:
+            return x
+        if op == Operations.ADD and x_value == 0 or op == Operations.MUL and x_value == 1:
+            return y
+    return None
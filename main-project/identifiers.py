@@ -0,0 +1,45 @@
+import sys
+
+
+class IdentifierTable:
+    """
+    Interning table for identifiers. Every identifier string is stored once and gets a dense integer id starting at
+    first_id (the first id after the reserved tokens). The table can be shared by several tokenizers and parsers so
+    that identifiers seen in one compilation keep their id in the next.
+    """
+
+    def __init__(self, first_id: int):
+        self.first_id = first_id
+        self.names: list[str] = []  # id - first_id -> identifier
+        self.ids: dict[str, int] = {}  # identifier -> id
+
+    def intern(self, name: str) -> int:
+        """
+        Returns the id for the identifier, adding it to the table if it has not been seen before.
+        :param name: the identifier
+        :return: the id of the identifier
+        """
+        idn = self.ids.get(name)
+        if idn is None:
+            name = sys.intern(name)
+            idn = self.first_id + len(self.names)
+            self.names.append(name)
+            self.ids[name] = idn
+        return idn
+
+    def get_id(self, name: str) -> int:
+        return self.ids.get(name)
+
+    def get_name(self, idn: int) -> str:
+        return self.names[idn - self.first_id]
+
+    def __contains__(self, idn: int) -> bool:
+        return 0 <= idn - self.first_id < len(self.names)
+
+    def __getitem__(self, idn: int) -> str:
+        if idn not in self:
+            raise KeyError(idn)
+        return self.names[idn - self.first_id]
+
+    def __len__(self) -> int:
+        return len(self.names)
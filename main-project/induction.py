@@ -0,0 +1,202 @@
+from blocks import BasicBlock, Blocks
+from folding import fold
+from instructionmap import InstructionMap
+from licm import LoopInvariantCodeMotion
+from operations import Operations
+from ssa import Instruction
+
+# Operations of an induction variable and a loop invariant that give an induction variable
+LINEAR_OPERATIONS = frozenset({Operations.ADD, Operations.SUB, Operations.MUL})
+
+
+class StrengthReduction:
+    """
+    Induction variable analysis and strength reduction of the while loops, after the loop invariant code motion. A
+    basic induction variable is a phi of the loop header that is increased by a loop invariant step in every
+    iteration, i = phi(i0, i + step). An addition, subtraction or multiplication of an induction variable and a loop
+    invariant is an induction variable as well, with its start value and step computed from the ones of its operand.
+
+    A multiplication that is an induction variable, e.g. the i * 4 and i * dimension of the array accesses, is
+    replaced by a new phi that starts at its start value and is increased by its step at the end of every iteration.
+    The start values and steps that are not numbers are computed in the preheader of the loop.
+    """
+
+    def __init__(self, licm: LoopInvariantCodeMotion):
+        self.licm = licm
+        self.blocks: Blocks = licm.blocks
+        self.block_of = licm.block_of
+        # The update of the basic induction variables, and the operation, induction variable operand and loop
+        # invariant operand of the others
+        self.basic = InstructionMap()
+        self.derived = InstructionMap()
+        self.starts = InstructionMap()
+        self.steps = InstructionMap()
+        self.header: BasicBlock = None
+        self.reduced_count = 0
+
+    def run(self) -> int:
+        """
+        :return: the number of replaced multiplications
+        """
+        for header in self.licm.get_innermost_loops():
+            loop_blocks = self.licm.loops[header]
+            latches = [parent_block for parent_block in header.get_parents() if parent_block in loop_blocks]
+            if len(latches) != 1 or header.get_phi_y_parent() is not latches[0] \
+                    or self.in_inner_loop(latches[0], header):
+                continue
+            self.header = header
+            self.basic.clear()
+            self.derived.clear()
+            self.starts.clear()
+            self.steps.clear()
+            self.find_basic_induction_variables(loop_blocks)
+            if not self.basic:
+                continue
+
+            for block in self.blocks.get_blocks_list():
+                if block not in loop_blocks:
+                    continue
+                for instr in list(block.get_instruction_order_list()):
+                    if self.add_derived_induction_variable(instr, loop_blocks) and instr.op == Operations.MUL:
+                        self.reduce(instr, latches[0])
+            if header in self.licm.preheaders:
+                self.licm.retarget_outside_branches(header)
+        return self.reduced_count
+
+    def in_inner_loop(self, block: BasicBlock, header: BasicBlock) -> bool:
+        """
+        Returns whether the block is in a loop inside the loop of the header, e.g. the header of an inner loop at the
+        end of the body. The updates of the induction variables would run in every iteration of the inner loop there.
+        """
+        loop_blocks = self.licm.loops[header]
+        return any(block in inner_blocks for inner_header, inner_blocks in self.licm.loops.items()
+                   if inner_header is not header and inner_header in loop_blocks)
+
+    def is_invariant(self, instr: Instruction, loop_blocks: set[BasicBlock]) -> bool:
+        return self.block_of.get(instr) not in loop_blocks
+
+    def find_basic_induction_variables(self, loop_blocks: set[BasicBlock]):
+        for phi in self.header.get_instruction_order_list():
+            if phi.op != Operations.PHI:
+                continue
+            update = phi.y
+            if update is None or update.op not in (Operations.ADD, Operations.SUB) \
+                    or self.is_invariant(update, loop_blocks):
+                continue
+            if update.x is phi and self.is_invariant(update.y, loop_blocks) or update.op == Operations.ADD \
+                    and update.y is phi and self.is_invariant(update.x, loop_blocks):
+                self.basic[phi] = update
+
+    def add_derived_induction_variable(self, instr: Instruction, loop_blocks: set[BasicBlock]) -> bool:
+        """
+        Records the instruction if it is an induction variable operation with a loop invariant.
+        :return: whether it is an induction variable
+        """
+        if instr.op not in LINEAR_OPERATIONS or instr.x is None or instr.y is None:
+            return False
+        if self.is_induction_variable(instr.x) and self.is_invariant(instr.y, loop_blocks):
+            self.derived[instr] = (instr.op, instr.x, instr.y)
+        elif self.is_induction_variable(instr.y) and self.is_invariant(instr.x, loop_blocks):
+            # The induction variable is subtracted from the invariant
+            self.derived[instr] = (instr.op, instr.y, instr.x)
+        else:
+            return False
+        return True
+
+    def is_induction_variable(self, instr: Instruction) -> bool:
+        return instr in self.basic or instr in self.derived
+
+    def get_start(self, instr: Instruction) -> Instruction:
+        """
+        :return: the value of the induction variable in the first iteration
+        """
+        if instr in self.basic:
+            return instr.x
+        if instr not in self.starts:
+            op, induction_variable, invariant = self.derived[instr]
+            start = self.get_start(induction_variable)
+            if op == Operations.SUB and instr.y is induction_variable:
+                self.starts[instr] = self.compute(op, invariant, start)
+            else:
+                self.starts[instr] = self.compute(op, start, invariant)
+        return self.starts[instr]
+
+    def get_step(self, instr: Instruction) -> Instruction:
+        """
+        :return: the value the induction variable changes by in every iteration
+        """
+        if instr in self.basic:
+            update = self.basic[instr]
+            if update.x is not instr:
+                return update.x
+            if update.op == Operations.SUB:
+                return self.compute(Operations.SUB, self.blocks.add_constant(0), update.y)
+            return update.y
+        if instr not in self.steps:
+            op, induction_variable, invariant = self.derived[instr]
+            step = self.get_step(induction_variable)
+            if op == Operations.MUL:
+                step = self.compute(op, step, invariant)
+            elif op == Operations.SUB and instr.y is induction_variable:
+                step = self.compute(op, self.blocks.add_constant(0), step)
+            self.steps[instr] = step
+        return self.steps[instr]
+
+    def compute(self, op: Operations, x: Instruction, y: Instruction) -> Instruction:
+        """
+        Computes a loop invariant value, in the preheader unless it can be folded.
+        """
+        result = fold(op, x, y)
+        if isinstance(result, int):
+            return self.blocks.add_constant(result)
+        if result is not None:
+            return result
+        preheader = self.licm.get_preheader(self.header)
+        instr = self.blocks.insert_new_instr(preheader, len(preheader.get_instruction_order_list()), op, x, y)
+        self.block_of[instr] = preheader
+        return instr
+
+    def reduce(self, instr: Instruction, latch: BasicBlock):
+        """
+        Replaces the multiplication by a new basic induction variable that is updated at the end of the latch, which
+        is not in an inner loop.
+        """
+        start, step = self.get_start(instr), self.get_step(instr)
+        header_instructions = self.header.get_instruction_order_list()
+        phi_count = next((i for i, header_instr in enumerate(header_instructions)
+                          if header_instr.op != Operations.PHI), len(header_instructions))
+        phi = self.blocks.insert_new_instr(self.header, phi_count, Operations.PHI, x=start)
+        latch_instructions = latch.get_instruction_order_list()
+        end = len(latch_instructions)
+        if latch_instructions and latch_instructions[-1].op is not None and latch_instructions[-1].op.is_branch():
+            end -= 1
+        update = self.blocks.insert_new_instr(latch, end, Operations.ADD, phi, step)
+        if end == 0 and len(latch_instructions) > 1:
+            # The branches into the latch went to its branch
+            self.blocks.retarget_branches(latch_instructions[1], update)
+        self.blocks.update_instruction(self.header, phi, y=update)
+        self.block_of[phi], self.block_of[update] = self.header, latch
+        self.basic[phi] = update
+
+        # The branches to the multiplication go to the next instruction before its uses are replaced, a branch
+        # target is a use as well
+        block = self.block_of[instr]
+        instructions = block.get_instruction_order_list()
+        if len(instructions) == 1:
+            # The block keeps an empty instruction for the branches to it
+            self.block_of[self.blocks.insert_new_instr(block, 0, None)] = block
+        index = instructions.index(instr)
+        self.blocks.retarget_branches(instr, instructions[index + 1] if index + 1 < len(instructions) else
+                                      instructions[0])
+        self.blocks.replace_all_uses_with(instr, phi, var_blocks=self.blocks.get_blocks_list())
+        self.blocks.remove_block_instructions(block, [(instr, index)])
+        self.reduced_count += 1
+
+
+def reduce_induction_variables(licm: LoopInvariantCodeMotion) -> int:
+    """
+    Replaces the multiplications of induction variables by additions in the loops of the loop invariant code motion,
+    after it ran (see StrengthReduction).
+    :return: the number of replaced multiplications
+    """
+    return StrengthReduction(licm).run()
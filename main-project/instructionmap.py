@@ -0,0 +1,79 @@
+from collections.abc import MutableMapping, MutableSet
+
+MISSING = object()
+
+
+class InstructionMap(MutableMapping):
+    """
+    A dict keyed by the instruction objects themselves. Instructions compare and hash by their id, which is None for
+    the instructions that are not numbered (e.g. kill and the array bases) and changes when the instructions are
+    numbered again, so a plain dict would mix up different instructions or lose the entries of renumbered ones.
+    """
+    __slots__ = ('entries',)
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key, default=None):
+        entry = self.entries.get(id(key), MISSING)
+        return default if entry is MISSING else entry[1]
+
+    def setdefault(self, key, default=None):
+        entry = self.entries.get(id(key), MISSING)
+        if entry is MISSING:
+            self.entries[id(key)] = (key, default)
+            return default
+        return entry[1]
+
+    def __setitem__(self, key, value):
+        self.entries[id(key)] = (key, value)
+
+    def __getitem__(self, key):
+        entry = self.entries.get(id(key), MISSING)
+        if entry is MISSING:
+            raise KeyError(key)
+        return entry[1]
+
+    def __delitem__(self, key):
+        if self.entries.pop(id(key), MISSING) is MISSING:
+            raise KeyError(key)
+
+    def __contains__(self, key) -> bool:
+        return id(key) in self.entries
+
+    def __iter__(self):
+        return (key for key, _ in self.entries.values())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class InstructionSet(MutableSet):
+    """
+    A set of instruction objects that compares them by identity instead of by their id (see InstructionMap).
+    """
+    __slots__ = ('entries',)
+
+    def __init__(self, instructions=()):
+        self.entries = {id(instruction): instruction for instruction in instructions}
+
+    def add(self, instruction):
+        self.entries[id(instruction)] = instruction
+
+    def discard(self, instruction):
+        self.entries.pop(id(instruction), None)
+
+    def __contains__(self, instruction) -> bool:
+        return id(instruction) in self.entries
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,192 @@
+from blocks import BasicBlock, BlockRelation, Blocks
+from dominators import get_dominator_tree
+from folding import FOLDABLE_OPERATIONS, constant_value
+from instructionmap import InstructionMap, InstructionSet
+from operations import Operations
+from ssa import Instruction
+
+# Operations that give the same result in every iteration if their operands do
+INVARIANT_OPERATIONS = FOLDABLE_OPERATIONS | {Operations.CMP, Operations.ADDA, Operations.LOAD}
+
+
+def get_array(address: Instruction):
+    """
+    :return: the address constant of the array that the adda instruction accesses, or None if it is not known
+    """
+    if address is None or address.op != Operations.ADDA or address.y is None or address.y.op != Operations.ADD:
+        return None
+    return address.y.y.constant if address.y.y is not None else None
+
+
+class LoopInvariantCodeMotion:
+    """
+    Moves the instructions of the while loops that give the same result in every iteration to a preheader, a new
+    block that is entered instead of the loop header from outside of the loop. An instruction is invariant if its
+    operands are defined outside of the loop or are invariant themselves. A division is only invariant if it divides
+    by a number other than 0.
+
+    A load is only invariant if the loop does not store to the same array and the load runs whenever the loop is
+    entered, i.e. its block dominates every block the loop is left from. The preheader runs whenever the loop is
+    entered, so a load that the program might not run, e.g. in the body of a loop that runs zero times or in a branch
+    of an if, would read an address that may be out of the bounds of its array. The loops are not guarded, so in
+    practice only the loads of the loop conditions are moved.
+
+    The loops are the natural loops of the back edges (an edge to a block that dominates its parent). They are
+    handled innermost first, so the instructions of an inner loop can be moved further out by the enclosing loops.
+    """
+
+    def __init__(self, blocks: Blocks):
+        self.blocks = blocks
+        self.tree = get_dominator_tree(blocks)
+        self.block_of = InstructionMap()
+        for block in blocks.get_blocks_list():
+            for instr in block.get_instruction_order_list():
+                self.block_of[instr] = block
+        self.loops = self.find_loops()
+        self.preheaders: dict[BasicBlock, BasicBlock] = {}
+        # The blocks that entered the header from outside of the loop before its preheader was inserted
+        self.outside_blocks: dict[BasicBlock, list[BasicBlock]] = {}
+        self.hoisted_count = 0
+
+    def find_loops(self) -> dict[BasicBlock, set[BasicBlock]]:
+        """
+        :return: the blocks of every loop by its header
+        """
+        tree = self.tree
+        loops = {}
+        for block in self.blocks.get_blocks_list():
+            if block not in tree:
+                continue
+            for header in block.get_children():
+                if not tree.dominates(header, block):
+                    continue
+                loop_blocks = loops.setdefault(header, {header})
+                stack = [block]
+                while stack:
+                    loop_block = stack.pop()
+                    if loop_block not in loop_blocks:
+                        loop_blocks.add(loop_block)
+                        stack.extend(parent_block for parent_block in loop_block.get_parents() if parent_block in tree)
+        return loops
+
+    def get_innermost_loops(self) -> list[BasicBlock]:
+        """
+        :return: the loop headers, the headers of inner loops before the headers of the loops around them
+        """
+        return sorted(self.loops, key=lambda header: len(self.loops[header]))
+
+    def run(self) -> int:
+        """
+        :return: the number of moved instructions
+        """
+        for header in self.get_innermost_loops():
+            invariants = self.find_invariants(self.loops[header])
+            if not invariants:
+                continue
+            preheader = self.get_preheader(header)
+            for instr in invariants:
+                self.blocks.move_instruction(instr, self.block_of[instr], preheader)
+                self.block_of[instr] = preheader
+            self.retarget_outside_branches(header)
+            self.hoisted_count += len(invariants)
+        return self.hoisted_count
+
+    def get_preheader(self, header: BasicBlock) -> BasicBlock:
+        """
+        Returns the preheader of the loop, it is inserted the first time. The branches from outside of the loop only
+        go to a new preheader after instructions were added to it (see retarget_outside_branches).
+        """
+        if header not in self.preheaders:
+            outside_blocks = [parent_block for parent_block in header.get_parents()
+                              if parent_block not in self.loops[header]]
+            preheader = self.insert_preheader(header, outside_blocks)
+            self.preheaders[header] = preheader
+            self.outside_blocks[header] = outside_blocks
+            # The preheader is part of the loops the header is in
+            for loop_header, loop_blocks in self.loops.items():
+                if loop_header is not header and header in loop_blocks:
+                    loop_blocks.add(preheader)
+        return self.preheaders[header]
+
+    def retarget_outside_branches(self, header: BasicBlock):
+        preheader = self.preheaders[header]
+        self.blocks.retarget_branches(header.find_first_instr(), preheader.find_first_instr(),
+                                      self.outside_blocks[header])
+
+    def find_invariants(self, loop_blocks: set[BasicBlock]) -> list[Instruction]:
+        """
+        :return: the invariant instructions of the loop, every instruction after the invariants it uses
+        """
+        stored_arrays = {get_array(instr.y) for block in loop_blocks for instr in block.get_instruction_order_list()
+                         if instr.op == Operations.STORE}
+        exit_blocks = [block for block in loop_blocks if block in self.tree and (
+            not block.get_children() or any(child_block not in loop_blocks for child_block in block.get_children()))]
+        invariants = []
+        invariant_set = InstructionSet()
+        changed = True
+        while changed:
+            changed = False
+            for block in self.blocks.get_blocks_list():
+                if block not in loop_blocks:
+                    continue
+                for instr in block.get_instruction_order_list():
+                    if instr not in invariant_set and \
+                            self.is_invariant(instr, loop_blocks, invariant_set, stored_arrays, exit_blocks):
+                        invariants.append(instr)
+                        invariant_set.add(instr)
+                        changed = True
+        return invariants
+
+    def is_invariant(self, instr: Instruction, loop_blocks: set[BasicBlock], invariant_set: InstructionSet,
+                     stored_arrays: set, exit_blocks: list[BasicBlock]) -> bool:
+        if instr.op not in INVARIANT_OPERATIONS:
+            return False
+        if instr.op == Operations.DIV and constant_value(instr.y) in (None, 0):
+            return False
+        if instr.op == Operations.LOAD:
+            array = get_array(instr.x)
+            if array is None or array in stored_arrays or None in stored_arrays \
+                    or not self.runs_when_entered(self.block_of[instr], exit_blocks):
+                return False
+        return all(operand is None or operand in invariant_set or self.block_of.get(operand) not in loop_blocks
+                   for operand in (instr.x, instr.y))
+
+    def runs_when_entered(self, block: BasicBlock, exit_blocks: list[BasicBlock]) -> bool:
+        """
+        Returns whether the block runs whenever its loop is entered. The preheaders of inner loops are not in the
+        dominator tree, they only run if the inner loop is reached.
+        """
+        return block in self.tree and all(self.tree.dominates(block, exit_block) for exit_block in exit_blocks)
+
+    def insert_preheader(self, header: BasicBlock, outside_blocks: list[BasicBlock]) -> BasicBlock:
+        """
+        Adds an empty block before the header that the edges from the blocks outside of the loop go to instead.
+        """
+        blocks_list = self.blocks.get_blocks_list()
+        preheader = BasicBlock()
+        self.blocks.insert_block(preheader, blocks_list.index(header))
+
+        for parent_block in outside_blocks:
+            relationship = header.get_parents()[parent_block]
+            header.remove_parent(parent_block)
+            preheader.add_parent(parent_block, relationship)
+            # The constant block above the first block only has the edge as a parent
+            if isinstance(parent_block, BasicBlock):
+                parent_block.remove_child(header)
+                parent_block.add_child(preheader, relationship)
+        preheader.add_child(header, BlockRelation.NORMAL)
+        header.add_parent(preheader, BlockRelation.NORMAL)
+
+        for dom_parent in header.get_dom_parents():
+            preheader.add_dom_parent(dom_parent, True)
+        header.get_dom_parents().clear()
+        header.add_dom_parent(preheader, True)
+        return preheader
+
+
+def hoist_loop_invariants(blocks: Blocks) -> int:
+    """
+    Moves the loop invariant instructions of the finished blocks out of their loops (see LoopInvariantCodeMotion).
+    :return: the number of moved instructions
+    """
+    return LoopInvariantCodeMotion(blocks).run()
@@ -1,9 +1,20 @@
+import argparse
+import sys
+
 from parser import Parser
 from visualizer import Visualizer
 
 
 def main():
-    parser = Parser("tests/0_test.txt")
+    arg_parser = argparse.ArgumentParser(description='Compiles a smpl program and prints its graph in DOT format.')
+    arg_parser.add_argument('file', nargs='?', default='tests/0_test.txt',
+                            help="the smpl file to compile, or - to read the program from stdin")
+    args = arg_parser.parse_args()
+
+    if args.file == '-':
+        parser = Parser.from_stream(sys.stdin)
+    else:
+        parser = Parser(args.file)
     parser.computation()
 
     visualizer = Visualizer(parser.blocks, parser.symbolTable, show_vars=True)
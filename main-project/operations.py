@@ -1,4 +1,5 @@
 from enum import Enum
+from types import MappingProxyType
 
 
 class Operations(Enum):
@@ -38,21 +39,95 @@ class Operations(Enum):
         return self.__str__()
 
     @classmethod
-    def get_no_cse_instructions(cls):
-        return {
-            Operations.BEQ,
-            Operations.BNE,
-            Operations.BGE,
-            Operations.BLE,
-            Operations.BGT,
-            Operations.BLT,
-            Operations.BRA,
-            Operations.PHI,
-            Operations.READ,
-            Operations.RET,
-            Operations.BASE,
-            Operations.KILL,
-            Operations.LOAD,
-            Operations.WRITE,
-            Operations.WRITE_NL
-        }
+    def get_no_cse_instructions(cls) -> frozenset['Operations']:
+        return NO_CSE_OPERATIONS
+
+    def is_branch(self) -> bool:
+        return self in BRANCH_OPERATIONS
+
+    def is_conditional_branch(self) -> bool:
+        return self in CONDITIONAL_BRANCH_OPERATIONS
+
+    def is_terminator(self) -> bool:
+        return self in TERMINATOR_OPERATIONS
+
+    def is_side_effecting(self) -> bool:
+        return self in SIDE_EFFECT_OPERATIONS
+
+    def is_cse_eligible(self) -> bool:
+        return self not in NO_CSE_OPERATIONS
+
+    def is_commutative(self) -> bool:
+        return self in COMMUTATIVE_OPERATIONS
+
+    def arity(self) -> int:
+        """
+        Returns the number of instruction operands (x and y) the operation uses.
+        """
+        return ARITY[self]
+
+
+# Property tables of the operations, built once and shared by all passes
+
+CONDITIONAL_BRANCH_OPERATIONS = frozenset({
+    Operations.BNE,
+    Operations.BEQ,
+    Operations.BLE,
+    Operations.BLT,
+    Operations.BGE,
+    Operations.BGT
+})
+
+BRANCH_OPERATIONS = CONDITIONAL_BRANCH_OPERATIONS | {Operations.BRA}
+
+TERMINATOR_OPERATIONS = BRANCH_OPERATIONS | {Operations.END, Operations.RET}
+
+# Operations that must stay even if their value is not used
+SIDE_EFFECT_OPERATIONS = TERMINATOR_OPERATIONS | {
+    Operations.STORE,
+    Operations.READ,
+    Operations.WRITE,
+    Operations.WRITE_NL,
+    Operations.JSR,
+    Operations.KILL
+}
+
+NO_CSE_OPERATIONS = BRANCH_OPERATIONS | {
+    Operations.PHI,
+    Operations.READ,
+    Operations.RET,
+    Operations.BASE,
+    Operations.KILL,
+    Operations.LOAD,
+    Operations.WRITE,
+    Operations.WRITE_NL
+}
+
+COMMUTATIVE_OPERATIONS = frozenset({Operations.ADD, Operations.MUL})
+
+ARITY = MappingProxyType({
+    Operations.ADD: 2,
+    Operations.SUB: 2,
+    Operations.MUL: 2,
+    Operations.DIV: 2,
+    Operations.CMP: 2,
+    Operations.ADDA: 2,
+    Operations.LOAD: 1,
+    Operations.STORE: 2,
+    Operations.PHI: 2,
+    Operations.END: 0,
+    Operations.BRA: 1,
+    Operations.BNE: 2,
+    Operations.BEQ: 2,
+    Operations.BLE: 2,
+    Operations.BLT: 2,
+    Operations.BGE: 2,
+    Operations.BGT: 2,
+    Operations.JSR: 1,
+    Operations.RET: 1,
+    Operations.READ: 0,
+    Operations.WRITE: 1,
+    Operations.WRITE_NL: 0,
+    Operations.KILL: 0,
+    Operations.BASE: 0
+})
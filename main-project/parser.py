@@ -1,26 +1,108 @@
 from blocks import Blocks, BasicBlock, BlockRelation
+from dce import eliminate_dead_code
+from filereader import StringReader
+from identifiers import IdentifierTable
+from induction import reduce_induction_variables
+from licm import LoopInvariantCodeMotion
+from sccp import propagate_constants
 from operations import Operations
 from ssa import BaseSSA, Instruction
-from tokenizer import Tokenizer
+from tokenizer import Tokenizer, BulkTokenizer
 from tokens import Tokens
+from tokenstream import TokenStream, TokenRecord
 from utils import Utils
 
 
 class Parser:
-    def __init__(self, file_name):
-        self.tokenizer = Tokenizer(file_name)
+    def __init__(self, file_name=None, bulk_tokenize: bool = False, identifiers: IdentifierTable = None,
+                 threaded_lexing: bool = False, lookahead: int = 2, print_errors: bool = True,
+                 reader: StringReader = None, fold_constants: bool = False, propagate_constants: bool = False,
+                 eliminate_dead_code: bool = False, hoist_loop_invariants: bool = False,
+                 reduce_induction_variables: bool = False):
+        if bulk_tokenize:
+            self.tokenizer = BulkTokenizer(file_name, identifiers=identifiers, print_errors=print_errors,
+                                           reader=reader)
+        else:
+            self.tokenizer = Tokenizer(file_name, identifiers=identifiers, print_errors=print_errors, reader=reader)
+        self.diagnostics = self.tokenizer.diagnostics  # errors found while compiling, can be checked afterwards
+        self.lookahead = lookahead
+        self.threaded_lexing = threaded_lexing
+        self.token_stream: TokenStream = None
+        self.record: TokenRecord = None  # the current token together with its value and position
         self.token: int = 0
-        self.symbolTable = {}  # id token -> var name
+        # The token array of a BulkTokenizer, which the parser walks directly instead of reading records from a
+        # token stream, and the position after the current token in it
+        self.token_ids = None
+        self.token_pos = 0
+        self.symbolTable = self.tokenizer.identifiers  # id token -> var name (shared with the tokenizer)
         self.arrayTable = {}  # designator -> (length of dim 1, length of dim 2...)
         self.base_ssa = BaseSSA()
-        self.blocks = Blocks(self.base_ssa, None)
-        self.setup_blocks()
+        self.blocks = Blocks(self.base_ssa, None, fold_constants=fold_constants)
         self.utils = Utils(self.blocks, self.base_ssa)
-        self.next_token()
+        # Run the sparse conditional constant propagation when the blocks are finished (see sccp.ConstantPropagation)
+        self.propagate_constants = propagate_constants
+        # Remove the instructions whose values are never used when the blocks are finished (see dce)
+        self.eliminate_dead_code = eliminate_dead_code
+        self.removed_dead_instructions = 0  # the number of instructions the dead code elimination removed
+        # Move the loop invariant instructions to preheaders when the blocks are finished (see licm). The strength
+        # reduction works on the loops and preheaders of the loop invariant code motion, so it turns it on as well.
+        self.hoist_loop_invariants = hoist_loop_invariants or reduce_induction_variables
+        self.hoisted_instructions = 0
+        # Replace the multiplications of induction variables in loops by additions after moving the loop invariant
+        # instructions (see induction)
+        self.reduce_induction_variables = reduce_induction_variables
+        self.reduced_multiplications = 0
         self.while_stack = []
         self.outer_while_blocks = []
         self.if_branch_blocks = []
         self.base_instruction = Instruction(op=Operations.BASE)
+        self.start()
+
+    def start(self):
+        if isinstance(self.tokenizer, BulkTokenizer) and not self.threaded_lexing:
+            self.token_stream = None
+            self.token_ids = self.tokenizer.token_ids
+            self.token_pos = 0
+        else:
+            self.token_stream = TokenStream(self.tokenizer.records(), lookahead=self.lookahead,
+                                            threaded=self.threaded_lexing)
+            self.token_ids = None
+        self.setup_blocks()
+        self.next_token()
+
+    def reset(self, file_name=None, reader: StringReader = None):
+        """
+        Prepares the parser for compiling a new source while reusing the tokenizer, the identifier table and the
+        containers of the previous compilation. The blocks, instructions and diagnostics of the previous compilation
+        are cleared, so they have to be used before calling this.
+        """
+        # The lexer thread of a parse that stopped early could still be using the tokenizer
+        self.close_token_stream()
+        self.tokenizer.reset(file_name, reader)
+        self.arrayTable.clear()
+        self.base_ssa.reset()
+        self.blocks.reset()
+        self.while_stack.clear()
+        self.outer_while_blocks.clear()
+        self.if_branch_blocks.clear()
+        self.removed_dead_instructions = 0
+        self.hoisted_instructions = 0
+        self.reduced_multiplications = 0
+        self.start()
+
+    @classmethod
+    def from_string(cls, source, **kwargs) -> 'Parser':
+        """
+        Makes a parser for an in-memory source given as str or bytes (UTF-8).
+        """
+        return cls(reader=StringReader.from_source(source), **kwargs)
+
+    @classmethod
+    def from_stream(cls, stream, **kwargs) -> 'Parser':
+        """
+        Makes a parser for the source read from a text or binary stream, e.g. sys.stdin or a socket file.
+        """
+        return cls(reader=StringReader.from_source(stream), **kwargs)
 
     def in_while(self):
         return len(self.while_stack) > 0
@@ -30,12 +112,51 @@ class Parser:
         initial_block.add_parent(parent_block=self.blocks.get_constant_block(), parent_type=BlockRelation.NORMAL)
         self.blocks.add_block(initial_block)
 
+    def error(self, error_msg: str):
+        """
+        Records an error at the position of the current token.
+        """
+        self.tokenizer.error(error_msg, self.token_offset())
+
     def next_token(self):
-        self.token = self.tokenizer.get_next_token()
+        if self.token_ids is None:
+            self.record = self.token_stream.next()
+            self.token = self.record.token
+        else:
+            # Stays at the EOF token once all tokens are read
+            pos = self.token_pos
+            self.token = self.token_ids[pos] if pos < len(self.token_ids) else Tokens.EOF_TOKEN
+            self.token_pos = pos + 1
+
+    def token_value(self):
+        """
+        :return: the number of a NUMBER token or the name of an identifier, None for other tokens
+        """
+        if self.token_ids is None:
+            return self.record.value
+        elif self.token > self.tokenizer.max_reserved_id:
+            return self.symbolTable.get_name(self.token)
+        elif self.token == Tokens.NUMBER:
+            return self.tokenizer.token_values[self.token_pos - 1]
+        return None
+
+    def token_offset(self) -> int:
+        """
+        :return: the start offset of the current token in the source
+        """
+        if self.token_ids is None:
+            return self.record.offset
+        elif self.token_pos <= len(self.token_ids):
+            return self.tokenizer.token_offsets[self.token_pos - 1]
+        return self.tokenizer.eof_offset
+
+    def close_token_stream(self):
+        if self.token_stream is not None:
+            self.token_stream.close()
 
     def reserved_identifier(self):
         if self.token <= self.tokenizer.max_reserved_id:
-            self.tokenizer.error(
+            self.error(
                 f"SyntaxError: expected ident got {self.tokenizer.get_token_from_index(self.token)}")
             return True
         else:
@@ -52,14 +173,13 @@ class Parser:
                     self.blocks.get_current_block().get_vars()[self.token] is None:
                 if self.token not in self.arrayTable:
                     if self.token not in self.blocks.get_current_block().get_vars():
-                        self.tokenizer.error(
-                            f"SyntaxError: {self.tokenizer.last_id} has not been declared. It is now declared and initialized to 0")
+                        self.error(
+                            f"SyntaxError: {self.token_value()} has not been declared. It is now declared and initialized to 0")
                     else:
-                        self.tokenizer.error(
-                            f"SyntaxError: {self.tokenizer.last_id} has not been initialized. It is now initialized to 0")
-                    self.symbolTable[self.token] = self.tokenizer.last_id
+                        self.error(
+                            f"SyntaxError: {self.token_value()} has not been initialized. It is now initialized to 0")
                     self.blocks.add_constant(0)
-                    self.blocks.add_var_to_current_block(self.token, self.blocks.get_constant_instr(0))
+                    self.blocks.add_var_to_current_block(self.token, self.blocks.get_constant_instr(0), implicit=True)
             self.next_token()
             return True
         else:
@@ -67,7 +187,7 @@ class Parser:
 
     def check_token(self, token_type):
         if self.token != token_type:
-            self.tokenizer.error(
+            self.error(
                 f"SyntaxError: expected {self.tokenizer.get_token_from_index(token_type)} "
                 f"got {self.tokenizer.get_token_from_index(self.token)}")
             self.next_token()
@@ -76,44 +196,66 @@ class Parser:
             self.next_token()
             return True
 
+    def check_number(self):
+        """
+        Checks that the current token is a number and returns its value (None if it is not a number).
+        """
+        number = self.token_value() if self.token == Tokens.NUMBER else None
+        self.check_token(Tokens.NUMBER)
+        return number
+
     def computation(self):
-        if self.check_token(Tokens.MAIN_TOKEN):
+        try:
+            if self.check_token(Tokens.MAIN_TOKEN):
 
-            # { varDecl } which starts with typeDecl starting with either "var" or "array"
-            while self.token == Tokens.VAR_TOKEN or self.token == Tokens.ARR_TOKEN:
-                self.var_declaration()
-                self.check_token(Tokens.SEMI_TOKEN)
+                # { varDecl } which starts with typeDecl starting with either "var" or "array"
+                while self.token == Tokens.VAR_TOKEN or self.token == Tokens.ARR_TOKEN:
+                    self.var_declaration()
+                    self.check_token(Tokens.SEMI_TOKEN)
 
-            # { funcDecl } -> [ "void" ] "function"...
-            while self.token == Tokens.VOID_TOKEN or self.token == Tokens.FUNC_TOKEN:
-                self.next_token()
-                if self.token == Tokens.FUNC_TOKEN:
+                # { funcDecl } -> [ "void" ] "function"...
+                while self.token == Tokens.VOID_TOKEN or self.token == Tokens.FUNC_TOKEN:
                     self.next_token()
-                self.func_declaration()
+                    if self.token == Tokens.FUNC_TOKEN:
+                        self.next_token()
+                    self.func_declaration()
 
-            # "{" statSequence
-            if self.token == Tokens.BEGIN_TOKEN:
-                self.next_token()
-                self.stat_sequence()
-                self.check_token(Tokens.END_TOKEN)
+                # "{" statSequence
+                if self.token == Tokens.BEGIN_TOKEN:
+                    self.next_token()
+                    self.stat_sequence()
+                    self.check_token(Tokens.END_TOKEN)
 
-            # final "."
-            self.check_token(Tokens.PERIOD_TOKEN)
+                # final "."
+                self.check_token(Tokens.PERIOD_TOKEN)
 
-            # Add end instruction
-            instr_id = self.base_ssa.get_new_instr_id()
-            self.blocks.add_new_instr(self.in_while(), block=self.blocks.get_current_block(), instr_id=instr_id,
-                                      op=Operations.END)
+                # Add end instruction
+                instr_id = self.base_ssa.get_new_instr_id()
+                self.blocks.add_new_instr(self.in_while(), block=self.blocks.get_current_block(), instr_id=instr_id,
+                                          op=Operations.END)
 
-            if len(self.outer_while_blocks) > 0:
-                self.utils.fix_branching(self.outer_while_blocks, False)
+                if len(self.outer_while_blocks) > 0:
+                    self.utils.fix_branching(self.outer_while_blocks, False)
 
-            if len(self.if_branch_blocks) > 0:
-                self.utils.fix_branching(self.if_branch_blocks, True)
+                if len(self.if_branch_blocks) > 0:
+                    self.utils.fix_branching(self.if_branch_blocks, True)
 
-            self.utils.fix_id_numbering()
+                if self.propagate_constants:
+                    propagate_constants(self.blocks, self.utils)
 
-        return
+                if self.hoist_loop_invariants:
+                    licm = LoopInvariantCodeMotion(self.blocks)
+                    self.hoisted_instructions = licm.run()
+                    if self.reduce_induction_variables:
+                        self.reduced_multiplications = reduce_induction_variables(licm)
+
+                if self.eliminate_dead_code:
+                    self.removed_dead_instructions = eliminate_dead_code(self.blocks)
+
+                self.utils.fix_id_numbering()
+        finally:
+            # Stops the lexer thread when the parse ends early, e.g. on an exception
+            self.close_token_stream()
 
     def var_declaration(self):
         # Handle arrays
@@ -125,7 +267,6 @@ class Parser:
             # Check if valid ident
             if not self.reserved_identifier():
                 self.blocks.get_current_block().add_var_assignment(self.token, None)
-                self.symbolTable[self.token] = self.tokenizer.last_id
             self.next_token()
 
         # Check for additional idents seperated by ","
@@ -138,23 +279,19 @@ class Parser:
         lengths_of_dimensions = []
         self.next_token()
         self.check_token(Tokens.OPEN_BRACKET_TOKEN)
-        self.check_token(Tokens.NUMBER)
-        lengths_of_dimensions.append(self.tokenizer.last_number)
+        lengths_of_dimensions.append(self.check_number())
         self.check_token(Tokens.CLOSE_BRACKET_TOKEN)
 
         # Get all the dimensions of the current array
         while self.token == Tokens.OPEN_BRACKET_TOKEN:
             self.next_token()
-            self.check_token(Tokens.NUMBER)
-            lengths_of_dimensions.append(self.tokenizer.last_number)
+            lengths_of_dimensions.append(self.check_number())
             self.check_token(Tokens.CLOSE_BRACKET_TOKEN)
 
         # Check if valid ident
         if not self.reserved_identifier():
             self.blocks.get_current_block().add_var_assignment(self.token, None)
-            self.symbolTable[self.token] = self.tokenizer.last_id
 
-        self.symbolTable[self.token] = self.tokenizer.last_id
         self.arrayTable[self.token] = lengths_of_dimensions
         self.blocks.get_current_block().add_array(self.token)
 
@@ -162,7 +299,6 @@ class Parser:
 
         while self.token == Tokens.COMMA_TOKEN:
             self.next_token()
-            self.symbolTable[self.token] = self.tokenizer.last_id
             self.arrayTable[self.token] = lengths_of_dimensions
             self.blocks.get_current_block().add_array(self.token)
             self.next_token()
@@ -240,7 +376,7 @@ class Parser:
             idn, idn_var = self.expression()
 
             if not is_array:
-                self.blocks.add_var_to_current_block(designator, idn)
+                self.blocks.add_var_to_current_block(designator, idn, copied_var=idn_var)
 
                 # Check if phi should be added (given we have a current join block and have not already made a phi ready
                 # for a certain variable + we are not in while)
@@ -257,13 +393,11 @@ class Parser:
                     outer_while: BasicBlock = self.while_stack[0]
                     first_outer_while_instr = outer_while.find_first_instr().get_id()
 
-                    for i in range(len(outer_while.get_array_instructions()[original_designator])):
-                        cur_instr = outer_while.get_array_instructions()[original_designator][i]
-                        if cur_instr.op == Operations.KILL or cur_instr.get_id() <= first_outer_while_instr:
-                            continue
-                        else:
-                            outer_while.add_array_kill_instruction(original_designator, i)
-                            break
+                    # Kill in front of the first access to the array inside the outer while
+                    index = outer_while.get_array_instructions()[original_designator].first_index_after(
+                        first_outer_while_instr)
+                    if index is not None:
+                        outer_while.add_array_kill_instruction(original_designator, index)
 
         return
 
@@ -292,7 +426,7 @@ class Parser:
             dimensions = self.arrayTable[designator]
 
             if len(dimensions) != len(indices):
-                self.tokenizer.error(
+                self.error(
                     f"index error: specified {len(indices)} dimensions but array has {len(dimensions)} dimensions")
 
             to_add = []
@@ -311,19 +445,19 @@ class Parser:
                 mul_by_index = self.blocks.add_new_instr(self.in_while(), self.blocks.get_current_block(),
                                                          self.base_ssa.get_new_instr_id(), Operations.MUL,
                                                          x=indices[i][0],
-                                                         x_var=indices[i][0][1], y=last_multiplier)
-                to_add.append(mul_by_index)
+                                                         x_var=indices[i][1], y=last_multiplier)
+                to_add.append((mul_by_index, None))
 
             to_add.append(indices[-1])
 
             # Add the above
             last_add, last_add_var = to_add[0]
-            for i, i_var in range(1, len(to_add)):
+            for i in range(1, len(to_add)):
                 new_add = self.blocks.add_new_instr(self.in_while(), self.blocks.get_current_block(),
                                                     self.base_ssa.get_new_instr_id(), Operations.ADD, x=last_add,
-                                                    x_var=last_add_var, y=to_add[i], y_var=i_var)
+                                                    x_var=last_add_var, y=to_add[i][0], y_var=to_add[i][1])
                 last_add = new_add
-                last_add_var = new_add.x_var
+                last_add_var = None
 
             # Multiply it all by 4
             multiplied_by_four_instr = self.blocks.add_new_instr(self.in_while(), self.blocks.get_current_block(),
@@ -402,7 +536,7 @@ class Parser:
             else:
                 return self.blocks.find_var_given_id(designator), designator
         elif self.token == Tokens.NUMBER:
-            num = self.tokenizer.last_number
+            num = self.token_value()
             self.blocks.add_constant(num)
             constant_instr = self.blocks.get_constant_instr(num)
             self.next_token()
@@ -419,7 +553,7 @@ class Parser:
         elif self.blocks.get_current_block().is_return_block():
             return None, None
         else:
-            self.tokenizer.error(
+            self.error(
                 f"SyntaxError: expected either {self.tokenizer.get_token_from_index(Tokens.IDENT), self.tokenizer.get_token_from_index(Tokens.NUMBER), self.tokenizer.get_token_from_index(Tokens.OPEN_PAREN_TOKEN), self.tokenizer.get_token_from_index(Tokens.CALL_TOKEN)} "
                 f"got {self.tokenizer.get_token_from_index(self.token)}")
             self.next_token()
@@ -428,7 +562,7 @@ class Parser:
     def relation(self):
         left_side, left_side_var = self.expression()
         if self.token > 25 or self.token < 20:
-            self.tokenizer.error(
+            self.error(
                 f"SyntaxError: expected relOp got {self.tokenizer.get_token_from_index(self.token)}")
             return
         else:
@@ -485,6 +619,9 @@ class Parser:
                                                     right_side_var, self.in_while())
 
         join_block.add_dom_parent(if_block)
+        # The branches share the array accesses of the if block, which keep apart the accesses of the branches
+        for array_accesses in if_block.get_array_instructions().values():
+            array_accesses.enter_branches()
 
         # then part
         self.check_token(Tokens.THEN_TOKEN)
@@ -500,6 +637,8 @@ class Parser:
         self.utils.add_relationship(parent_block=if_block, child_block=else_block, relationship=BlockRelation.BRANCH)
         self.blocks.add_block(else_block)
         else_block.add_dom_parent(if_block)
+        for array_accesses in if_block.get_array_instructions().values():
+            array_accesses.enter_else()
 
         # The join block might have changed if there was a nested join inside, so set it back to the original
         self.blocks.update_current_join_block(join_block)
@@ -511,8 +650,10 @@ class Parser:
             self.blocks.add_new_instr(self.in_while(), else_block, self.base_ssa.get_new_instr_id())
 
         self.check_token(Tokens.FI_TOKEN)
+        for array_accesses in if_block.get_array_instructions().values():
+            array_accesses.join_branches()
         # update the "branch" instruction/arrow for if so that it points to the first instruction in else
-        if_block.update_instruction(branch_instr_idn, y=else_block.find_first_instr())
+        self.blocks.update_instruction(if_block, branch_instr_idn, y=else_block.find_first_instr())
 
         # The join block might have changed if there was a nested join inside else so set it back to original
         self.blocks.update_current_join_block(join_block)
@@ -557,6 +698,9 @@ class Parser:
 
         if not join_block.get_instructions():  # empty join block
             self.blocks.add_new_instr(self.in_while(), join_block, self.base_ssa.get_new_instr_id())
+        fall_through_block = else_block if branch_block is then_block else then_block
+        if not fall_through_block.get_instructions():  # join of a nested if without phis
+            self.blocks.add_new_instr(self.in_while(), fall_through_block, self.base_ssa.get_new_instr_id())
 
         # Fix branching and instructions for return block
         if then_block.is_return_block() and else_block.is_return_block():
@@ -601,6 +745,8 @@ class Parser:
                                  self.in_while())
 
         self.check_token(Tokens.DO_TOKEN)
+        for array_accesses in while_block.get_array_instructions().values():
+            array_accesses.enter_loop()
 
         # Make new then block
         then_block = BasicBlock()
@@ -612,6 +758,8 @@ class Parser:
         self.stat_sequence()
 
         self.check_token(Tokens.OD_TOKEN)
+        for array_accesses in while_block.get_array_instructions().values():
+            array_accesses.exit_loop()
 
         # Handle dangling blocks and potential instructions below od
         if len(self.blocks.get_leaf_joins()) > 0:
@@ -0,0 +1,246 @@
+import operator
+
+from blocks import BasicBlock, BlockRelation, Blocks
+from folding import FOLDABLE_OPERATIONS, constant_value, evaluate
+from instructionmap import InstructionMap
+from operations import Operations
+from ssa import Instruction
+from utils import Utils
+
+# The value of an instruction that is not the same on every execution. An instruction without a value yet has not been
+# reached by the propagation.
+VARYING = 'varying'
+
+# Whether a conditional branch is taken for the result of the comparison it uses
+BRANCH_CONDITIONS = {
+    Operations.BEQ: operator.eq,
+    Operations.BNE: operator.ne,
+    Operations.BLT: operator.lt,
+    Operations.BLE: operator.le,
+    Operations.BGT: operator.gt,
+    Operations.BGE: operator.ge,
+}
+
+
+class ConstantPropagation:
+    """
+    Sparse conditional constant propagation over the finished blocks (Wegman and Zadeck). Starting from the first
+    block, only the edges that can be taken are followed: a conditional branch whose comparison has a known result
+    only makes the edge it takes executable. A phi is the meet of the operands that come in over executable edges
+    (see BasicBlock.phi_y_parent) and an instruction is evaluated again whenever the value of one of its operands
+    changes (see DefUse).
+
+    After solve, rewrite replaces the arithmetic and phis with known values by constants, replaces the phis with a
+    single incoming operand by that operand, removes the branches with a known outcome and the blocks that cannot be
+    reached.
+    """
+
+    def __init__(self, blocks: Blocks):
+        self.blocks = blocks
+        self.block_of = InstructionMap()
+        for block in blocks.get_blocks_list():
+            for instr in block.get_instruction_order_list():
+                self.block_of[instr] = block
+        self.values = InstructionMap()
+        self.executable_blocks: set[BasicBlock] = set()
+        # The executable edges into every block by parent. The first block is entered from None.
+        self.executable_parents: dict[BasicBlock, set] = {}
+        self.edge_worklist: list[(BasicBlock, BasicBlock)] = []
+        self.instruction_worklist: list[Instruction] = []
+
+    def get_value(self, instr: Instruction):
+        """
+        :return: the number or VARYING, or None if the instruction has not been reached yet
+        """
+        if instr in self.values:
+            return self.values[instr]
+        if instr in self.block_of:
+            return None
+        # Constants, the base address and the address constants of the arrays
+        value = constant_value(instr)
+        return VARYING if value is None else value
+
+    def solve(self):
+        entry = self.blocks.get_blocks_list()[0]
+        self.edge_worklist.append((None, entry))
+        while self.edge_worklist or self.instruction_worklist:
+            while self.edge_worklist:
+                parent_block, block = self.edge_worklist.pop()
+                parents = self.executable_parents.setdefault(block, set())
+                if parent_block in parents:
+                    continue
+                parents.add(parent_block)
+                if block in self.executable_blocks:
+                    # Only the phis depend on the new edge
+                    for instr in block.get_instruction_order_list():
+                        if instr.op == Operations.PHI:
+                            self.visit(instr)
+                else:
+                    self.executable_blocks.add(block)
+                    for instr in block.get_instruction_order_list():
+                        self.visit(instr)
+                    self.add_successors(block)
+
+            while self.instruction_worklist:
+                instr = self.instruction_worklist.pop()
+                if self.block_of.get(instr) in self.executable_blocks:
+                    self.visit(instr)
+
+    def visit(self, instr: Instruction):
+        if instr.op is not None and instr.op.is_conditional_branch():
+            self.add_successors(self.block_of[instr])
+            return
+        value = self.evaluate(instr)
+        if value is not None and self.values.get(instr) != value:
+            self.values[instr] = value
+            self.instruction_worklist.extend(self.blocks.def_use.get_users(instr))
+
+    def evaluate(self, instr: Instruction):
+        if instr.op == Operations.PHI:
+            value = None
+            for operand in self.get_incoming_operands(instr):
+                operand_value = self.get_value(operand)
+                if value is None:
+                    value = operand_value
+                elif operand_value is not None and operand_value != value:
+                    return VARYING
+            return value
+        if instr.op in FOLDABLE_OPERATIONS or instr.op == Operations.CMP:
+            x, y = self.get_value(instr.x), self.get_value(instr.y)
+            if x is None or y is None:
+                return None
+            if x == VARYING or y == VARYING:
+                return VARYING
+            result = evaluate(instr.op, x, y)
+            return VARYING if result is None else result
+        return VARYING
+
+    def get_incoming_operands(self, phi: Instruction) -> list[Instruction]:
+        """
+        Returns the operands of the phi that come in over an executable edge. Without a known y parent both operands
+        are taken. An operand defined in a block that is not executable never comes in.
+        """
+        block = self.block_of[phi]
+        y_parent = block.get_phi_y_parent()
+        parents = self.executable_parents.get(block, ())
+        x_incoming = y_parent is None or any(parent_block is not y_parent for parent_block in parents)
+        y_incoming = y_parent is None or y_parent in parents
+        operands = []
+        for operand, incoming in ((phi.x, x_incoming), (phi.y, y_incoming)):
+            if incoming and operand is not None and self.block_of.get(operand, block) in self.executable_blocks:
+                operands.append(operand)
+        return operands
+
+    @staticmethod
+    def get_last_instruction(block: BasicBlock, is_kind) -> Instruction:
+        """
+        :return: the last instruction of the block if its operation is of the kind (e.g. Operations.is_branch), or
+        None
+        """
+        instructions = block.get_instruction_order_list()
+        if instructions and instructions[-1].op is not None and is_kind(instructions[-1].op):
+            return instructions[-1]
+        return None
+
+    def get_branch_outcome(self, block: BasicBlock) -> BlockRelation:
+        """
+        :return: the kind of the edge the conditional branch at the end of the block takes, or None if the branch
+        is not known to go one way (or there is no conditional branch)
+        """
+        branch = self.get_last_instruction(block, Operations.is_conditional_branch)
+        if branch is None:
+            return None
+        comparison = self.get_value(branch.x)
+        if comparison is None or comparison == VARYING:
+            return None
+        taken = BRANCH_CONDITIONS[branch.op](comparison, 0)
+        return BlockRelation.BRANCH if taken else BlockRelation.FALL_THROUGH
+
+    def add_successors(self, block: BasicBlock):
+        branch = self.get_last_instruction(block, Operations.is_conditional_branch)
+        if branch is not None and self.get_value(branch.x) is None:
+            # Nothing is known about the comparison yet
+            return
+        outcome = self.get_branch_outcome(block)
+        children = block.get_children()
+        successors = [child_block for child_block, relationship in children.items() if relationship == outcome]
+        for child_block in successors or children:
+            if block not in self.executable_parents.get(child_block, ()):
+                self.edge_worklist.append((block, child_block))
+
+    def rewrite(self, utils: Utils) -> int:
+        """
+        Changes the blocks according to the solution.
+        :return: the number of removed instructions
+        """
+        blocks_list = self.blocks.get_blocks_list()
+        removed_count = len(self.blocks.removed_instructions)
+        reachable = [block for block in blocks_list if block in self.executable_blocks]
+
+        for block in reachable:
+            for child_block in list(block.get_children()):
+                if block not in self.executable_parents.get(child_block, ()):
+                    block.remove_child(child_block)
+                    child_block.remove_parent(block)
+            self.rewrite_branch(block)
+
+        replacements = InstructionMap()
+        for block in reachable:
+            removed = []
+            for i, instr in enumerate(block.get_instruction_order_list()):
+                replacement = self.get_replacement(instr)
+                while replacement in replacements:
+                    replacement = replacements[replacement]
+                if replacement is not None and replacement is not instr:
+                    self.blocks.replace_all_uses_with(instr, replacement, var_blocks=reachable)
+                    replacements[instr] = replacement
+                    removed.append((instr, i))
+                elif instr.op == Operations.CMP and not self.blocks.def_use.has_users(instr):
+                    removed.append((instr, i))
+            self.blocks.remove_block_instructions(block, removed)
+
+        self.blocks.remove_blocks({block for block in blocks_list if block not in self.executable_blocks})
+
+        utils.fix_branch_targets()
+        return len(self.blocks.removed_instructions) - removed_count
+
+    def rewrite_branch(self, block: BasicBlock):
+        """
+        Removes a conditional branch that is never taken and makes one that is always taken unconditional.
+        """
+        outcome = self.get_branch_outcome(block)
+        if outcome is None or any(relationship != outcome for relationship in block.get_children().values()):
+            return
+        branch = self.get_last_instruction(block, Operations.is_conditional_branch)
+        if outcome == BlockRelation.FALL_THROUGH:
+            self.blocks.remove_block_instructions(block, [(branch, len(block.get_instruction_order_list()) - 1)])
+        else:
+            self.blocks.def_use.remove_uses(branch, branch.x, branch.y)
+            branch.op, branch.x, branch.y = Operations.BRA, branch.y, None
+            self.blocks.def_use.add_uses(branch)
+
+    def get_replacement(self, instr: Instruction) -> Instruction:
+        """
+        :return: the constant or operand that the instruction can be replaced by, or None
+        """
+        if instr.op not in FOLDABLE_OPERATIONS and instr.op != Operations.PHI:
+            return None
+        value = self.values.get(instr)
+        if value is not None and value != VARYING:
+            return self.blocks.add_constant(value)
+        if instr.op == Operations.PHI:
+            operands = self.get_incoming_operands(instr)
+            if len(operands) == 1:
+                return operands[0]
+        return None
+
+
+def propagate_constants(blocks: Blocks, utils: Utils) -> int:
+    """
+    Runs the sparse conditional constant propagation on the finished blocks, before the instructions are numbered
+    again.
+    :return: the number of removed instructions
+    """
+    propagation = ConstantPropagation(blocks)
+    propagation.solve()
+    return propagation.rewrite(utils)
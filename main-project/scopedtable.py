@@ -0,0 +1,118 @@
+MISSING = object()
+
+
+class KeyIndex:
+    """
+    The keys of all tables linked to each other. When a table that already has linked children is linked to a parent,
+    its index is merged into the parent's index and forwards to it.
+    """
+    __slots__ = ('keys', 'merged_into')
+
+    def __init__(self):
+        self.keys = set()
+        self.merged_into: KeyIndex = None
+
+    def merge_into(self, other: 'KeyIndex'):
+        other.keys.update(self.keys)
+        self.keys = None
+        self.merged_into = other
+
+
+class ScopedTable:
+    """
+    A dict-like table that is chained to the table of a parent scope instead of holding a copy of it. Lookups first
+    check the table's own entries and then walk up the parent tables. Found entries are cached, and a set of all keys
+    added to the linked tables lets misses return without walking the chain, so lookups stay O(1) amortized while
+    linking a table to its parent is O(1) and takes no memory.
+    """
+    __slots__ = ('entries', 'parent', 'cache', 'index')
+
+    def __init__(self):
+        self.entries = {}
+        self.parent: ScopedTable = None
+        self.cache = {}
+        self.index = KeyIndex()
+
+    def get_index(self) -> KeyIndex:
+        index = self.index
+        if index.merged_into is not None:
+            while index.merged_into is not None:
+                index = index.merged_into
+            self.index = index
+        return index
+
+    def link(self, parent: 'ScopedTable'):
+        """
+        Makes the entries of the parent table visible in this table. Like dict.update the parent's entries take
+        precedence over entries this table already has.
+        :param parent: the table of the parent scope
+        """
+        if parent is self:
+            return
+        if self.parent is None or self.parent is parent:
+            for key in [key for key in self.entries if key in parent]:
+                del self.entries[key]
+            if self.parent is None:
+                index = self.get_index()
+                parent_index = parent.get_index()
+                if index is not parent_index:
+                    index.merge_into(parent_index)
+                    self.index = parent_index
+                self.parent = parent
+        else:
+            # Only a single parent can be chained so copy the entries of any further parent
+            keys = self.get_index().keys
+            for key, value in parent.items():
+                self.entries[key] = value
+                keys.add(key)
+        self.cache.clear()
+
+    def get(self, key, default=None):
+        entries = self.entries
+        if key in entries:
+            return entries[key]
+        if key not in self.get_index().keys:
+            return default
+
+        cache = self.cache
+        if key in cache:
+            return cache[key]
+        table = self.parent
+        while table is not None:
+            # An ancestor that found the key before has it cached, which saves walking the rest of the chain
+            if key in table.entries:
+                value = table.entries[key]
+            elif key in table.cache:
+                value = table.cache[key]
+            else:
+                table = table.parent
+                continue
+            cache[key] = value
+            return value
+        return default
+
+    def items(self):
+        seen = set()
+        table = self
+        while table is not None:
+            for key, value in table.entries.items():
+                if key not in seen:
+                    seen.add(key)
+                    yield key, value
+            table = table.parent
+
+    def __setitem__(self, key, value):
+        self.entries[key] = value
+        self.get_index().keys.add(key)
+
+    def __getitem__(self, key):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, MISSING) is not MISSING
+
+    def __len__(self):
+        return sum(1 for _ in self.items())
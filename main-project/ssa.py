@@ -14,6 +14,9 @@ class BaseSSA:
             Tokens.GEQ_TOKEN: Operations.BLT,
         }
 
+    def reset(self):
+        self.id_count = 0
+
     def get_new_instr_id(self) -> int:
         self.id_count += 1
         return self.id_count
@@ -29,6 +32,9 @@ class BaseSSA:
 
 
 class Instruction:
+    # Programs can hold hundreds of thousands of instructions so avoid a __dict__ per instruction
+    __slots__ = ('id', 'op', 'x', 'y', 'x_var', 'y_var', 'constant', 'originates_from_read')
+
     def __init__(self, id_count=None, op: Operations = None, x: 'Instruction' = None, y: 'Instruction' = None,
                  x_var=None,
                  y_var=None, constant=None):
@@ -39,7 +45,10 @@ class Instruction:
         self.x_var = x_var
         self.y_var = y_var
         self.constant = constant
-        self.originates_from_read = self.set_originates_from_read()
+        # Whether the value is derived from input. Set from the flags of the operands here, afterwards it is kept up to
+        # date by taint.ReadTaint when operands change
+        self.originates_from_read = op == Operations.READ or bool(x and x.originates_from_read) or bool(
+            y and y.originates_from_read)
 
     def get_id(self):
         return self.id
@@ -47,22 +56,11 @@ class Instruction:
     def set_constant(self, constant: int):
         self.constant = constant
 
-    def set_originates_from_read(self):
-        if self.op == Operations.READ:
-            return True
-        elif self.x and self.x.originates_from_read:
-            return True
-        elif self.y and self.y.originates_from_read:
-            return True
-        else:
-            return False
-
     def update_parameters(self, x, y):
         if x:
             self.x = x
         if y:
             self.y = y
-        self.originates_from_read = self.set_originates_from_read()
 
     def __str__(self):
         if self.constant is not None:
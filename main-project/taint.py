@@ -0,0 +1,97 @@
+from defuse import DefUse
+from instructionmap import InstructionSet
+from operations import Operations
+from ssa import Instruction
+
+
+class ReadTaint:
+    """
+    Dataflow analysis of which instructions are derived from input: a read, or an instruction with an operand that is
+    derived from input. It follows the use lists of a DefUse so that a change of operands only visits the
+    instructions whose value can change, which keeps the result correct when phis are patched after their users
+    were created (see Utils.update_while_phis_and_bra).
+
+    The result is written to Instruction.originates_from_read, which is what the rest of the compiler reads.
+    """
+
+    def __init__(self, def_use: DefUse):
+        self.def_use = def_use
+        self.tainted = InstructionSet()
+
+    @staticmethod
+    def compute(instructions) -> 'ReadTaint':
+        """
+        Computes the analysis from scratch for the instructions.
+        :param instructions: all instructions, in any order
+        :return: the analysis, with the flags of the instructions updated
+        """
+        instructions = list(instructions)
+        def_use = DefUse()
+        for instruction in instructions:
+            def_use.add_instruction(instruction)
+            instruction.originates_from_read = False
+        taint = ReadTaint(def_use)
+        taint.solve([instruction for instruction in instructions if taint.evaluate(instruction)])
+        return taint
+
+    def is_input_derived(self, instruction: Instruction) -> bool:
+        return instruction in self.tainted
+
+    def evaluate(self, instruction: Instruction) -> bool:
+        return instruction.op == Operations.READ or any(
+            operand is not None and operand in self.tainted for operand in (instruction.x, instruction.y))
+
+    def add_instruction(self, instruction: Instruction):
+        """
+        Adds a new instruction. It has no users yet so only its own value is computed.
+        """
+        if self.evaluate(instruction):
+            self.tainted.add(instruction)
+        instruction.originates_from_read = instruction in self.tainted
+
+    def update(self, instruction: Instruction) -> list[Instruction]:
+        """
+        Updates the analysis after the operands of the instruction changed (and its uses were moved in the DefUse).
+        :return: the instructions whose value changed
+        """
+        tainted = self.evaluate(instruction)
+        if tainted == (instruction in self.tainted):
+            return []
+        if tainted:
+            return self.solve([instruction])
+
+        # The value drops, so clear everything that may have been tainted through the instruction and solve that
+        # part again
+        users = self.def_use.users
+        cone = [instruction]
+        self.tainted.discard(instruction)
+        i = 0
+        while i < len(cone):
+            for user in users.get(cone[i], ()):
+                if user in self.tainted:
+                    self.tainted.discard(user)
+                    cone.append(user)
+            i += 1
+        for member in cone:
+            member.originates_from_read = False
+        retainted = InstructionSet(self.solve([member for member in cone if self.evaluate(member)]))
+        return [member for member in cone if member not in retainted]
+
+    def solve(self, worklist: list[Instruction]) -> list[Instruction]:
+        """
+        Taints the instructions of the worklist and everything that uses them.
+        :return: the instructions that became tainted
+        """
+        users = self.def_use.users
+        changed = []
+        while worklist:
+            instruction = worklist.pop()
+            if instruction in self.tainted:
+                continue
+            self.tainted.add(instruction)
+            instruction.originates_from_read = True
+            changed.append(instruction)
+            for user in users.get(instruction, ()):
+                if user not in self.tainted:
+                    worklist.append(user)
+        return changed
@@ -0,0 +1,134 @@
+import glob
+import os
+import tempfile
+import unittest
+
+from batch import compile_batch, find_sources, get_output_names
+from cache import CompileCache, compiler_fingerprint, make_key
+from compiler import Compiler
+from test_parser import read_expected_output
+
+DOT_FILES = sorted(glob.glob('tests/*_tests/*.dot'))
+
+
+class TestCompiler(unittest.TestCase):
+
+    def test_reused_compiler_gives_same_graphs(self):
+        for options in [{}, {'bulk_tokenize': True}]:
+            compiler = Compiler(**options)
+            # Twice and in reverse the second time so that every file is compiled after a different one
+            for dot_file in DOT_FILES + DOT_FILES[::-1]:
+                result = compiler.compile_file(dot_file.replace('.dot', '.txt'))
+                self.assertEqual(result.dot, read_expected_output(dot_file), dot_file)
+
+    def test_reset_clears_state(self):
+        compiler = Compiler()
+        compiler.compile_file('tests/my_tests/uninitialized_var_in_then_else.txt')
+        result = compiler.compile_source('main var x; { let x <- 1; call OutputNum(x) }.')
+
+        parser = compiler.parser
+        self.assertEqual(result.diagnostics, [])
+        self.assertEqual(result.stats, {'blocks': 1, 'instructions': 2, 'constants': 1})
+        self.assertEqual(parser.base_ssa.get_cur_instr_id(), 3)
+        self.assertEqual(parser.blocks.removed_instructions, [])
+        self.assertEqual(parser.blocks.leaf_joins, [])
+        self.assertEqual(parser.while_stack, [])
+        self.assertEqual(parser.if_branch_blocks, [])
+
+    def test_reset_clears_pass_counts(self):
+        compiler = Compiler(reduce_induction_variables=True, eliminate_dead_code=True)
+        compiler.compile_file('tests/class_tests/prefix_sum.txt')
+        parser = compiler.parser
+        self.assertGreater(parser.hoisted_instructions, 0)
+        self.assertGreater(parser.reduced_multiplications, 0)
+
+        # The passes do not run for a source without main, so the counts must not be the ones of the last source
+        compiler.compile_source('var x; { let x <- 1 }.')
+        self.assertEqual((parser.removed_dead_instructions, parser.hoisted_instructions,
+                          parser.reduced_multiplications), (0, 0, 0))
+
+    def test_diagnostics_in_result(self):
+        result = Compiler().compile_file('tests/my_tests/uninitialized_var_in_then_else.txt')
+
+        self.assertEqual([(d['line'], d['col']) for d in result.diagnostics], [(8, 18), (10, 18)])
+
+    def test_batch_compile(self):
+        file_names = [dot_file.replace('.dot', '.txt') for dot_file in DOT_FILES]
+        self.assertEqual(find_sources(['tests/class_tests']), sorted(glob.glob('tests/class_tests/*.txt')))
+
+        results = {result.name: result for result in compile_batch(file_names, workers=2, chunk_size=3)}
+
+        self.assertEqual(sorted(results), file_names)
+        for file_name, result in results.items():
+            self.assertEqual(result.dot, read_expected_output(file_name.replace('.txt', '.dot')), file_name)
+            self.assertGreater(result.stats['instructions'], 0)
+
+    def test_output_names(self):
+        names = get_output_names(['tests/class_tests/if.txt', 'tests/my_tests/if.txt', 'tests/my_tests/a/b.txt'])
+        self.assertEqual(names, {'tests/class_tests/if.txt': os.path.join('class_tests', 'if.dot'),
+                                 'tests/my_tests/if.txt': os.path.join('my_tests', 'if.dot'),
+                                 'tests/my_tests/a/b.txt': os.path.join('my_tests', 'a', 'b.dot')})
+        self.assertEqual(get_output_names(['tests/class_tests/if.txt']), {'tests/class_tests/if.txt': 'if.dot'})
+
+    def test_cache_hits_skip_parsing(self):
+        cache = CompileCache()
+        first = Compiler(cache=cache).compile_file('tests/class_tests/prefix_sum.txt')
+
+        compiler = Compiler(cache=cache)
+        second = compiler.compile_file('tests/class_tests/prefix_sum.txt')
+        self.assertIsNone(compiler.parser)
+        self.assertEqual(second.dot, first.dot)
+        self.assertEqual(second.dot, read_expected_output('tests/class_tests/prefix_sum.dot'))
+
+        # Different options are a different entry
+        Compiler(cache=cache, show_vars=False).compile_file('tests/class_tests/prefix_sum.txt')
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_cache_lru_eviction(self):
+        cache = CompileCache(max_entries=2)
+        compiler = Compiler(cache=cache)
+        for source in ['main {}.', 'main var x; {}.', 'main {}.', 'main var y; {}.', 'main var x; {}.']:
+            compiler.compile_source(source)
+
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+        self.assertEqual(len(cache.entries), 2)
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Compiler(cache=CompileCache(directory=directory)).compile_file('tests/class_tests/fibonacci.txt')
+
+            cache = CompileCache(directory=directory)
+            result = Compiler(cache=cache).compile_file('tests/class_tests/fibonacci.txt')
+            self.assertEqual(result.dot, read_expected_output('tests/class_tests/fibonacci.dot'))
+            self.assertEqual(cache.disk_hits, 1)
+
+            small_cache = CompileCache(directory=directory, max_disk_bytes=cache.disk_bytes + 100)
+            compiler = Compiler(cache=small_cache)
+            for dot_file in DOT_FILES[:5]:
+                compiler.compile_file(dot_file.replace('.dot', '.txt'))
+            self.assertLessEqual(small_cache.disk_bytes, small_cache.max_disk_bytes)
+            self.assertEqual(small_cache.disk_bytes, sum(entry.stat().st_size for entry in os.scandir(directory)))
+
+    def test_cache_key_covers_compiler_sources(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'parser.py'), 'w') as file:
+                file.write('x = 1\n')
+            with open(os.path.join(directory, 'test_parser.py'), 'w') as file:
+                file.write('x = 1\n')
+            fingerprint = compiler_fingerprint(directory)
+
+            with open(os.path.join(directory, 'test_parser.py'), 'w') as file:
+                file.write('x = 2\n')
+            self.assertEqual(compiler_fingerprint.__wrapped__(directory), fingerprint)
+            with open(os.path.join(directory, 'parser.py'), 'w') as file:
+                file.write('x = 2\n')
+            changed_fingerprint = compiler_fingerprint.__wrapped__(directory)
+            self.assertNotEqual(changed_fingerprint, fingerprint)
+
+        source = 'main {}.'
+        self.assertEqual(make_key(source, {}), make_key(source, {}, compiler_fingerprint()))
+        self.assertNotEqual(make_key(source, {}, fingerprint), make_key(source, {}, changed_fingerprint))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,726 @@
+import glob
+import sys
+import unittest
+
+from arrayaccesses import ArrayAccesses
+from benchmark import generate_nested_ifs
+from blocks import BasicBlock, BlockRelation
+from cfg import get_cfg
+from compaction import compact_instruction_ids
+from defuse import DefUse
+from folding import fold
+from dominators import get_dominator_tree
+from filereader import StringReader
+from operations import ARITY, Operations
+from parser import Parser
+from scopedtable import ScopedTable
+from ssa import Instruction
+from taint import ReadTaint
+
+
+class TestIR(unittest.TestCase):
+
+    def test_scoped_table_lookup(self):
+        root, child, grandchild = ScopedTable(), ScopedTable(), ScopedTable()
+        child.link(root)
+        grandchild.link(child)
+        root['a'] = 1
+        child['b'] = 2
+
+        self.assertEqual(grandchild['a'], 1)
+        self.assertEqual(grandchild.get('b'), 2)
+        self.assertNotIn('c', grandchild)
+        self.assertNotIn('b', root)
+        self.assertEqual(dict(grandchild.items()), {'a': 1, 'b': 2})
+
+    def test_scoped_table_link_parent_takes_precedence(self):
+        parent, child = ScopedTable(), ScopedTable()
+        parent['a'] = 1
+        child['a'] = 2
+        child['b'] = 3
+        child.link(parent)
+        self.assertEqual(child['a'], 1)
+        self.assertEqual(child['b'], 3)
+
+    def test_scoped_table_late_link_of_subtree(self):
+        # The child is linked before its parent is linked to the root, the root's keys must still be found
+        root, parent, child = ScopedTable(), ScopedTable(), ScopedTable()
+        child.link(parent)
+        root['a'] = 1
+        parent.link(root)
+        self.assertEqual(child['a'], 1)
+
+    def test_deeply_nested_ifs(self):
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, 10000))
+        try:
+            parser = Parser.from_string(generate_nested_ifs(300), print_errors=False)
+            parser.computation()
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+
+        self.assertFalse(parser.diagnostics.has_errors())
+        # a * 2 is computed once at the top and found again through every level
+        muls = [instruction for block in parser.blocks.get_blocks_list()
+                for instruction in block.get_instruction_order_list() if instruction.op == Operations.MUL]
+        self.assertEqual(len(muls), 1)
+
+    def test_compact_instruction_ids(self):
+        instructions = {i: Instruction(i) for i in range(1, 8)}
+        removed = [instructions[2], instructions[5], instructions[2]]
+        compact_instruction_ids(instructions, removed)
+        # Instructions removed twice count twice
+        self.assertEqual([instruction.id for instruction in instructions.values()], [1, 2, 1, 2, 3, 3, 4])
+
+    def test_dominator_tree_matches_dom_parents(self):
+        for file_name in sorted(glob.glob('tests/**/*.txt', recursive=True)):
+            parser = Parser(file_name, print_errors=False)
+            parser.computation()
+            tree = get_dominator_tree(parser.blocks)
+            for block in parser.blocks.get_blocks_list():
+                self.assertTrue(tree.dominates(tree.entry, block), file_name)
+                self.assertTrue(tree.dominates(block, block), file_name)
+                self.assertFalse(tree.strictly_dominates(block, block), file_name)
+                for dom_parent in block.get_dom_parents():
+                    self.assertIs(tree.get_idom(block), dom_parent, f"{file_name} {block}")
+
+    def test_dominance_frontiers(self):
+        parser = Parser.from_string('main var a, b; { let a <- call InputNum(); '
+                                    'if a > 0 then let b <- 1 else let b <- 2 fi; '
+                                    'while a > 0 do let a <- a - 1 od; call OutputNum(b) }.')
+        parser.computation()
+        tree = get_dominator_tree(parser.blocks)
+        bb1, then_block, else_block, join_block, header_block, body_block, follow_block = \
+            parser.blocks.get_blocks_list()
+
+        self.assertEqual(tree.get_frontier(then_block), {join_block})
+        self.assertEqual(tree.get_frontier(else_block), {join_block})
+        self.assertEqual(tree.get_frontier(bb1), set())
+        # The back edge puts the loop header in the frontier of the loop body and of itself
+        self.assertEqual(tree.get_frontier(body_block), {header_block})
+        self.assertEqual(tree.get_frontier(header_block), {header_block})
+        self.assertIs(tree.get_idom(join_block), bb1)
+        self.assertEqual(set(tree.get_tree_children(header_block)), {body_block, follow_block})
+        self.assertFalse(tree.dominates(then_block, join_block))
+        self.assertTrue(tree.strictly_dominates(join_block, follow_block))
+
+        # The program starts with the while, so the loop header is the entry
+        parser = Parser.from_string('main var i; { while i < 3 do let i <- i + 1 od; call OutputNum(i) }.',
+                                    print_errors=False)
+        parser.computation()
+        tree = get_dominator_tree(parser.blocks)
+        header_block, body_block, follow_block = parser.blocks.get_blocks_list()
+        self.assertIs(tree.entry, header_block)
+        self.assertEqual(tree.get_frontier(body_block), {header_block})
+        self.assertEqual(tree.get_frontier(header_block), {header_block})
+        self.assertEqual(tree.get_frontier(follow_block), set())
+
+    def test_dominator_tree_cache(self):
+        parser = Parser.from_string('main var a; { let a <- call InputNum(); '
+                                    'if a > 0 then let a <- 1 fi; call OutputNum(a) }.')
+        parser.computation()
+        tree = get_dominator_tree(parser.blocks)
+        self.assertIs(get_dominator_tree(parser.blocks), tree)
+
+        # Adding an edge makes the tree outdated
+        last_block = parser.blocks.get_blocks_list()[-1]
+        new_block = BasicBlock()
+        parser.blocks.add_block(new_block)
+        parser.utils.add_relationship(parent_block=last_block, child_block=new_block,
+                                      relationship=BlockRelation.FALL_THROUGH)
+        new_tree = get_dominator_tree(parser.blocks)
+        self.assertIsNot(new_tree, tree)
+        self.assertIs(new_tree.get_idom(new_block), last_block)
+
+    def test_cfg_per_blocks(self):
+        source = 'main var a; { let a <- call InputNum(); if a > 0 then let a <- 1 fi; call OutputNum(a) }.'
+        parser, other = Parser.from_string(source, print_errors=False), Parser.from_string(source, print_errors=False)
+        parser.computation()
+        other.computation()
+        cfg = get_cfg(parser.blocks)
+        version = parser.blocks.edge_version
+
+        # Changing and resetting the blocks of another parser does not make the CFG of this one outdated
+        last_block = other.blocks.get_blocks_list()[-1]
+        other.utils.add_relationship(parent_block=last_block, child_block=other.blocks.get_blocks_list()[0],
+                                     relationship=BlockRelation.BRANCH)
+        other.reset(reader=StringReader.from_source(source))
+        self.assertEqual(parser.blocks.edge_version, version)
+        self.assertFalse(cfg.is_outdated())
+
+    def test_compact_cfg(self):
+        parser = Parser('tests/class_tests/NestedWhileIf.txt')
+        parser.computation()
+        cfg = get_cfg(parser.blocks)
+        blocks_list = parser.blocks.get_blocks_list()
+        self.assertEqual(len(cfg), len(blocks_list))
+
+        for i, block in enumerate(blocks_list):
+            self.assertEqual(cfg.get_index(block), i)
+            self.assertEqual([(blocks_list[j], relation) for j, relation in cfg.get_successor_edges(i)],
+                             list(block.get_children().items()))
+            self.assertEqual([blocks_list[j] for j in cfg.get_predecessors(i)],
+                             [parent for parent in block.get_parents() if parent in cfg.index])
+
+    def test_compact_cfg_edge_editing(self):
+        parser = Parser.from_string('main var a; { let a <- call InputNum(); '
+                                    'if a > 0 then let a <- 1 fi; call OutputNum(a) }.')
+        parser.computation()
+        cfg = get_cfg(parser.blocks)
+        bb1, then_block, else_block, join_block = parser.blocks.get_blocks_list()
+
+        cfg.retarget_edge(bb1, else_block, join_block)
+        self.assertEqual(list(cfg.get_successors(0)), [1, 3])
+        self.assertEqual(cfg.get_successor_edges(0)[1], (3, BlockRelation.BRANCH))
+        self.assertEqual(list(cfg.get_predecessors(3)), [1, 2, 0])
+        self.assertIs(get_dominator_tree(parser.blocks).get_idom(join_block), bb1)
+        self.assertNotIn(else_block, get_dominator_tree(parser.blocks))
+
+        cfg.remove_edge(bb1, then_block)
+        self.assertEqual(list(cfg.get_predecessors(1)), [])
+        self.assertIs(get_cfg(parser.blocks), cfg)
+
+    def test_array_accesses_find_available(self):
+        read = Instruction(1, Operations.READ)
+        address1, address2 = Instruction(2, Operations.ADDA), Instruction(3, Operations.ADDA)
+        read_address = Instruction(4, Operations.ADDA, read)
+        load = Instruction(5, Operations.LOAD, address1)
+        store = Instruction(6, Operations.STORE, read, address2)
+        accesses = ArrayAccesses()
+        accesses.append(load)
+        accesses.append(store)
+
+        self.assertIs(accesses.find_available(address1, None), load)
+        self.assertIs(accesses.find_available(address2, None), store)
+        # A load from an address that originates from a read cannot pass any store
+        self.assertIsNone(accesses.find_available(read_address, None))
+
+        # Neither can a load pass a store to such an address
+        accesses.append(Instruction(7, Operations.STORE, address1, read_address))
+        self.assertIsNone(accesses.find_available(address1, None))
+
+    def test_array_accesses_update_and_kill(self):
+        address1, address2 = Instruction(1, Operations.ADDA), Instruction(2, Operations.ADDA)
+        first_load, second_load = Instruction(3, Operations.LOAD, address1), Instruction(4, Operations.LOAD, address1)
+        third_load = Instruction(5, Operations.LOAD, address1)
+        accesses = ArrayAccesses()
+        for load in (first_load, second_load, third_load):
+            accesses.append(load)
+
+        self.assertEqual(accesses.find_while_cse(third_load), [second_load, first_load])
+        self.assertEqual(accesses.first_index_after(3), 1)
+        accesses.insert_kill(1)
+        self.assertEqual(accesses[1].op, Operations.KILL)
+        self.assertEqual(accesses.first_index_after(3), 2)
+        self.assertEqual(accesses.find_while_cse(third_load), [second_load])
+
+        second_load.update_parameters(address2, None)
+        accesses.update_instruction(second_load)
+        self.assertEqual(accesses.find_while_cse(third_load), [])
+        self.assertIs(accesses.find_available(address2, None), second_load)
+
+    def test_read_taint_incremental(self):
+        read, constant = Instruction(1, Operations.READ), Instruction(2, constant=0)
+        phi = Instruction(3, Operations.PHI, constant, constant)
+        add = Instruction(4, Operations.ADD, phi, constant)
+        mul = Instruction(5, Operations.MUL, add, add)
+        taint = ReadTaint.compute([read, constant, phi, add, mul])
+        self.assertFalse(any(taint.is_input_derived(i) for i in (constant, phi, add, mul)))
+        self.assertTrue(read.originates_from_read)
+
+        # Patching the phi taints its users that were created before. The flag is only changed by the analysis.
+        phi.update_parameters(None, read)
+        self.assertFalse(phi.originates_from_read)
+        taint.def_use.update_uses(phi, constant, constant)
+        self.assertEqual(set(taint.update(phi)), {phi, add, mul})
+        self.assertTrue(mul.originates_from_read)
+
+        phi.update_parameters(None, constant)
+        taint.def_use.update_uses(phi, constant, read)
+        self.assertEqual(set(taint.update(phi)), {phi, add, mul})
+        self.assertFalse(any(i.originates_from_read for i in (phi, add, mul)))
+
+    def test_read_taint_after_while_phi_patching(self):
+        parser = Parser.from_string('main var a, i; array[4] x; { let i <- 0; while i < 3 do let x[i] <- 1; '
+                                    'let a <- x[0]; let i <- call InputNum() od; call OutputNum(a) }.')
+        parser.computation()
+        store = next(instruction for block in parser.blocks.get_blocks_list()
+                     for instruction in block.get_instruction_order_list() if instruction.op == Operations.STORE)
+        # The address of x[i] is computed before the phi of i gets the value that is read in the loop
+        self.assertTrue(parser.blocks.read_taint.is_input_derived(store.y))
+        self.assertTrue(store.y.originates_from_read)
+
+    def test_def_use(self):
+        def_use = DefUse()
+        a, b = Instruction(1, Operations.READ), Instruction(2, Operations.READ)
+        add = Instruction(3, Operations.ADD, a, a)
+        def_use.add_instruction(add)
+        self.assertEqual(def_use.get_users(a), [add])
+        self.assertEqual(def_use.users[a][add], 2)
+
+        add.update_parameters(b, None)
+        def_use.update_uses(add, a, a)
+        self.assertEqual(def_use.get_users(a), [add])
+        self.assertEqual(def_use.get_users(b), [add])
+        def_use.remove_uses(add, add.x, add.y)
+        self.assertFalse(def_use.has_users(a) or def_use.has_users(b))
+
+    def test_def_use_keyed_by_identity(self):
+        def_use = DefUse()
+        # Instructions without an id, like the array bases, compare equal to each other
+        base_x, base_y = Instruction(None, Operations.BASE), Instruction(None, Operations.BASE)
+        read = Instruction(1, Operations.READ)
+        add_x, add_y = Instruction(2, Operations.ADD, base_x, read), Instruction(3, Operations.ADD, base_y, read)
+        for instruction in (add_x, add_y):
+            def_use.add_instruction(instruction)
+        self.assertEqual(def_use.get_users(base_x), [add_x])
+        self.assertEqual(def_use.get_users(base_y), [add_y])
+
+        taint = ReadTaint(def_use)
+        taint.solve([read])
+        # Numbering the instructions again keeps the entries of the maps
+        read.id, add_x.id, add_y.id = 3, 1, 2
+        self.assertEqual(def_use.get_users(read), [add_x, add_y])
+        self.assertTrue(all(taint.is_input_derived(instruction) for instruction in (read, add_x, add_y)))
+        self.assertFalse(taint.is_input_derived(base_x))
+
+    def test_replace_all_uses_with(self):
+        parser = Parser.from_string('main var a, b, c; { let a <- call InputNum(); let b <- a + 1; '
+                                    'if b > 0 then let c <- b * 2 else let c <- b fi; call OutputNum(c) }.')
+        parser.computation()
+        blocks = parser.blocks
+        add = next(instruction for instruction in blocks.instructions.values() if instruction.op == Operations.ADD)
+        users = blocks.def_use.get_users(add)
+        self.assertEqual({user.op for user in users}, {Operations.CMP, Operations.MUL, Operations.PHI})
+
+        bb1 = blocks.get_blocks_list()[0]
+        read = next(instruction for instruction in blocks.instructions.values() if instruction.op == Operations.READ)
+        blocks.replace_all_uses_with(add, read, var_blocks=[bb1])
+        self.assertFalse(blocks.def_use.has_users(add))
+        for user in users:
+            self.assertIn(read, (user.x, user.y))
+            self.assertIn(user, blocks.def_use.get_users(read))
+        # a and b
+        self.assertEqual(len(bb1.get_vars_using(read)), 2)
+        self.assertEqual(bb1.get_vars_using(add), [])
+
+    def test_multi_dimensional_array_designator(self):
+        parser = Parser.from_string('main var i, j; array[3][4] m; { let i <- call InputNum(); '
+                                    'let j <- call InputNum(); call OutputNum(m[i][j]) }.', print_errors=False)
+        parser.computation()
+        read_i, read_j, mul_i, add_j, mul_4, add_base, adda, load = \
+            parser.blocks.get_blocks_list()[0].get_instruction_order_list()[:8]
+        # ((i * 4) + j) * 4
+        self.assertEqual((mul_i.op, mul_i.x, mul_i.y.constant), (Operations.MUL, read_i, 4))
+        self.assertEqual((add_j.op, add_j.x, add_j.y), (Operations.ADD, mul_i, read_j))
+        self.assertEqual((mul_4.op, mul_4.x, mul_4.y.constant), (Operations.MUL, add_j, 4))
+        self.assertEqual((adda.op, adda.x, adda.y), (Operations.ADDA, mul_4, add_base))
+        self.assertIs(load.x, adda)
+
+    def test_operation_properties(self):
+        self.assertIs(Operations.get_no_cse_instructions(), Operations.get_no_cse_instructions())
+        self.assertTrue(Operations.BGE.is_branch() and Operations.BGE.is_conditional_branch())
+        self.assertFalse(Operations.BRA.is_conditional_branch())
+        self.assertTrue(Operations.RET.is_terminator() and Operations.STORE.is_side_effecting())
+        self.assertFalse(Operations.LOAD.is_cse_eligible() or Operations.SUB.is_commutative())
+        self.assertTrue(Operations.MUL.is_commutative() and Operations.ADD.is_cse_eligible())
+        self.assertEqual(Operations.WRITE.arity(), 1)
+        with self.assertRaises(TypeError):
+            ARITY[Operations.WRITE] = 2
+
+    def test_commutative_cse(self):
+        parser = Parser.from_string('main var a, b, c, d; { let a <- call InputNum(); let b <- call InputNum(); '
+                                    'let c <- a * b + 1; let d <- 1 + b * a; call OutputNum(c + d) }.')
+        parser.computation()
+        ops = [instruction.op for instruction in parser.blocks.get_blocks_list()[0].get_instruction_order_list()]
+        self.assertEqual(ops.count(Operations.MUL), 1)
+        self.assertEqual(ops.count(Operations.ADD), 2)
+
+    def test_commutative_cse_key(self):
+        # The operands are ordered the same way whether or not they have ids and after they are numbered again
+        a, b = Instruction(None, Operations.BASE), Instruction(None, Operations.BASE)
+        key = BasicBlock.cse_key(Operations.ADD, a, b)
+        self.assertEqual([id(operand) for operand in BasicBlock.cse_key(Operations.ADD, b, a)],
+                         [id(operand) for operand in key])
+        a.id, b.id = (1, 2) if key[1] is b else (2, 1)
+        self.assertIs(BasicBlock.cse_key(Operations.MUL, a, b)[1], key[1])
+        self.assertIs(BasicBlock.cse_key(Operations.SUB, b, a)[1], b)
+
+    def test_fold(self):
+        a = Instruction(1, Operations.READ)
+        six, three, zero, one = (Instruction(i, constant=c) for i, c in ((2, 6), (3, 3), (4, 0), (5, 1)))
+        self.assertEqual(fold(Operations.ADD, six, three), 9)
+        self.assertEqual(fold(Operations.DIV, Instruction(6, constant=-7), Instruction(7, constant=2)), -3)
+        self.assertIsNone(fold(Operations.DIV, six, zero))
+        self.assertIsNone(fold(Operations.ADD, Instruction(8, constant='x_addr'), three))
+        self.assertEqual(fold(Operations.MUL, a, zero), 0)
+        self.assertEqual(fold(Operations.SUB, a, a), 0)
+        self.assertIs(fold(Operations.MUL, one, a), a)
+        self.assertIs(fold(Operations.SUB, a, zero), a)
+        self.assertIsNone(fold(Operations.SUB, zero, a))
+        self.assertIsNone(fold(Operations.ADD, a, zero, allow_operands=False))
+
+    def test_fold_constants(self):
+        source = 'main var a, b, i; { let a <- call InputNum(); let b <- 2 * 3 + a * 1 - 0; let i <- 0; ' \
+                 'while i < b do let i <- i + 1 * 1; let a <- a + 0 od; call OutputNum(a / 1 + b / 0) }.'
+        parser = Parser.from_string(source, print_errors=False, fold_constants=True)
+        parser.computation()
+        instructions = [instruction for block in parser.blocks.get_blocks_list()
+                        for instruction in block.get_instruction_order_list()]
+        ops = [instruction.op for instruction in instructions]
+        self.assertNotIn(Operations.MUL, ops)
+        # a + 6, i + 1 and b / 0. In the while a + 0 is kept because a becomes a phi
+        self.assertEqual(ops.count(Operations.ADD), 4)
+        self.assertEqual(ops.count(Operations.DIV), 1)
+        constants = list(parser.blocks.get_constant_block().constants.values())
+        ids = [instruction.get_id() for instruction in instructions + constants]
+        self.assertEqual(len(set(ids)), len(ids))
+
+        default = Parser.from_string(source, print_errors=False)
+        default.computation()
+        self.assertIn(Operations.MUL, [instruction.op for block in default.blocks.get_blocks_list()
+                                       for instruction in block.get_instruction_order_list()])
+
+    def test_fold_constants_if_phis(self):
+        # From a fuzzed program: c * b folds to the constant 0 that is also the value of b in the else branch
+        source = 'main var a, b, c; array[4] x; { let a <- 2; let b <- 0; let c <- call InputNum(); ' \
+                 'if c > 1 then let a <- c * b; let b <- x[c] fi; call OutputNum(a); call OutputNum(b) }.'
+        parser = Parser.from_string(source, print_errors=False, fold_constants=True)
+        parser.computation()
+        phi_a, phi_b = [instruction for instruction in parser.blocks.get_blocks_list()[-1].get_instruction_order_list()
+                        if instruction.op == Operations.PHI]
+        self.assertEqual((phi_a.x.constant, phi_a.y.constant), (0, 2))
+        self.assertEqual(phi_b.x.op, Operations.LOAD)
+        self.assertEqual(phi_b.y.constant, 0)
+
+    def test_vars_with_same_phi(self):
+        # e and b are both assigned 8 in the then branch and have the implicit 0 otherwise, so they get the same phi
+        source = 'main var a, b, e; { if a >= 0 then let e <- 8; let b <- 8 fi; call OutputNum(b); call OutputNum(e) }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        join_block = parser.blocks.get_blocks_list()[-1]
+        phi, write_b, write_e = join_block.get_instruction_order_list()[:3]
+        self.assertEqual((phi.op, phi.x.constant, phi.y.constant), (Operations.PHI, 8, 0))
+        self.assertIs(write_b.x, phi)
+        self.assertIs(write_e.x, phi)
+
+        # A while has a phi for each var, b is read before it is assigned in the body
+        source = 'main var a, b, k; { let a <- 0; let b <- 0; let k <- 0; while k < 2 do call OutputNum(b); ' \
+                 'let a <- 5; let b <- 5; let k <- k + 1 od }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        header, body = parser.blocks.get_blocks_list()[:2]
+        phi_a, phi_b = header.get_instruction_order_list()[:2]
+        self.assertIsNot(phi_a, phi_b)
+        self.assertIs(body.get_instruction_order_list()[0].x, phi_b)
+
+    def test_sibling_array_accesses(self):
+        # x[c] has the same address instruction in all blocks, the store of the then branch must not be reused in the
+        # else branch or after the join
+        source = 'main var a, b, c; array[4] x; { let a <- call InputNum(); let b <- 0; let c <- 1; ' \
+                 'if x[c] < a then let x[c] <- 5 else let b <- x[c] fi; call OutputNum(b + x[c]) }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        if_block, then_block, _, join_block = parser.blocks.get_blocks_list()
+        load = if_block.get_instruction_order_list()[4]
+        self.assertEqual(load.op, Operations.LOAD)
+        self.assertEqual(then_block.get_instruction_order_list()[0].op, Operations.STORE)
+        phi, join_load = join_block.get_instruction_order_list()[:2]
+        self.assertIs(phi.y, load)
+        self.assertEqual(join_load.op, Operations.LOAD)
+        self.assertIs(join_load.x, load.x)
+
+    def test_fold_constants_array_accesses_after_while(self):
+        # From a fuzzed program: a[i + 1] before the while and a[1] after it fold to the same address, the store to
+        # a[j] in the while has a different address instruction but the same address
+        source = 'main var i, j, x; array[4] a; { let i <- 0; let j <- 1; let x <- a[i + 1]; ' \
+                 'while i < 3 do let a[j] <- 7; let i <- i + 1 od; call OutputNum(a[1] + x) }.'
+        parser = Parser.from_string(source, print_errors=False, fold_constants=True)
+        parser.computation()
+        first_block, _, _, exit_block = parser.blocks.get_blocks_list()
+        load = first_block.get_instruction_order_list()[-1]
+        exit_load = exit_block.get_instruction_order_list()[0]
+        self.assertEqual(exit_load.op, Operations.LOAD)
+        self.assertIs(exit_load.x, load.x)
+        self.assertIsNot(exit_load, load)
+
+    def test_store_not_reused_after_other_store(self):
+        # arr[0] <- 7 comes between the two stores of a, so the second one is needed for the load after the while
+        source = 'main var a, k; array[4] arr; { let a <- call InputNum(); let arr[0] <- a; let arr[0] <- 7; ' \
+                 'let arr[0] <- a; let k <- 0; while k < 1 do let arr[1] <- 5; let k <- k + 1 od; ' \
+                 'call OutputNum(arr[0]) }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        first_block = parser.blocks.get_blocks_list()[0]
+        stores = [instruction for instruction in first_block.get_instruction_order_list()
+                  if instruction.op == Operations.STORE]
+        self.assertEqual([store.x.op for store in stores], [Operations.READ, None, Operations.READ])
+        self.assertIsNot(stores[2], stores[0])
+
+        # The same in a while body, where the stores are checked again by the while pass
+        source = 'main var a, k; array[4] arr; { let a <- call InputNum(); let k <- 0; while k < 1 do ' \
+                 'let arr[0] <- a; let arr[0] <- 7; let arr[0] <- a; let k <- k + 1 od; call OutputNum(arr[0]) }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        body = parser.blocks.get_blocks_list()[2]
+        self.assertEqual([instruction.op for instruction in body.get_instruction_order_list()].count(
+            Operations.STORE), 3)
+
+    def test_while_keeps_reassigned_value(self):
+        # a is assigned the constant it had before the while again, which is not a read of the value before the while
+        source = 'main var a, i; { let a <- 2; let i <- 0; while i < 3 do if i > 0 then let a <- 2 else ' \
+                 'let a <- a + 1 fi; call OutputNum(a); let i <- i + 1 od; call OutputNum(a) }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        blocks_list = parser.blocks.get_blocks_list()
+        phi_a = blocks_list[0].get_instruction_order_list()[0]
+        join_phi = blocks_list[4].get_instruction_order_list()[0]
+        self.assertEqual(join_phi.op, Operations.PHI)
+        self.assertEqual(join_phi.x.constant, 2)
+        self.assertIs(join_phi.y.x, phi_a)
+
+    def test_assignment_stamps_per_blocks(self):
+        source = 'main var a, i; { let a <- 2; let i <- 0; while i < 3 do let a <- a + 1; let i <- i + 1 od }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        stamps = dict(parser.blocks.get_blocks_list()[0].get_var_stamps())
+
+        # Another parser does not take stamps from this one, and a reset parser starts again
+        other = Parser.from_string(source, print_errors=False)
+        other.computation()
+        parser.reset(reader=StringReader.from_source(source))
+        parser.computation()
+        self.assertEqual(other.blocks.get_blocks_list()[0].get_var_stamps(), stamps)
+        self.assertEqual(parser.blocks.get_blocks_list()[0].get_var_stamps(), stamps)
+
+    def test_while_reads_implicitly_initialized_var(self):
+        # b is read before it is assigned in the while, its implicit 0 is the value from before the while
+        source = 'main var a, b, k; { let k <- 0; while k < 2 do call OutputNum(b); let a <- 5 * b; ' \
+                 'call OutputNum(a); let b <- k - 40; let k <- k + 1 od }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        header, body = parser.blocks.get_blocks_list()[:2]
+        phi_b = header.get_instruction_order_list()[1]
+        self.assertEqual((phi_b.op, phi_b.x.constant, phi_b.y.op), (Operations.PHI, 0, Operations.SUB))
+        write, mul = body.get_instruction_order_list()[:2]
+        self.assertIs(write.x, phi_b)
+        self.assertIs(mul.y, phi_b)
+
+    def test_empty_nested_join_is_branch_target(self):
+        # The nested if in the else branch assigns j the value it already had, so its join has no phis
+        source = 'main var a, j; { let j <- 2; let a <- call InputNum(); if a > 0 then let a <- 1 else ' \
+                 'if a < 5 then call OutputNum(10) else let j <- 2 fi fi; call OutputNum(a + j) }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        blocks_list = parser.blocks.get_blocks_list()
+        nested_then_block, nested_join_block = blocks_list[3], blocks_list[5]
+        branch = nested_then_block.get_instruction_order_list()[-1]
+        self.assertEqual(branch.op, Operations.BRA)
+        self.assertIsNotNone(branch.x)
+        self.assertIs(branch.x, nested_join_block.find_first_instr())
+
+    def test_while_cse_of_first_instruction_of_branch_target(self):
+        # The while CSE removes the address of x[j] at the start of the else block, which the ble branches to
+        source = 'main var j; array[4] x; { let j <- 0; while j < 3 do if x[j] > 0 then call OutputNum(1) else ' \
+                 'call OutputNum(x[j]) fi; let j <- j + 1 od }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        blocks_list = parser.blocks.get_blocks_list()
+        branch = blocks_list[1].get_instruction_order_list()[-1]
+        else_block = blocks_list[3]
+        self.assertEqual(branch.op, Operations.BLE)
+        self.assertEqual([instruction.op for instruction in else_block.get_instruction_order_list()],
+                         [Operations.WRITE])
+        self.assertIs(branch.y, else_block.find_first_instr())
+
+    def test_while_phis_of_copied_vars(self):
+        # t and b are copies of the value a has at the start of the iteration, c is only assigned the same constant
+        source = 'main var a, b, c, t, i; { let a <- 1; let b <- 2; let c <- 3; let i <- 0; while i < 3 do ' \
+                 'let t <- a; let a <- b; let b <- t; let c <- 1; let i <- i + 1 od; call OutputNum(a + b + c + t) }.'
+        parser = Parser.from_string(source, print_errors=False)
+        parser.computation()
+        phi_a, phi_b, phi_c, phi_t = parser.blocks.get_blocks_list()[0].get_instruction_order_list()[:4]
+        self.assertIs(phi_a.y, phi_b)
+        self.assertIs(phi_b.y, phi_a)
+        self.assertEqual(phi_c.y.constant, 1)
+        self.assertIs(phi_t.y, phi_a)
+
+    def test_fold_constants_keeps_class_tests_valid(self):
+        for file_name in sorted(glob.glob('tests/class_tests/*.txt')):
+            default = Parser(file_name, print_errors=False)
+            default.computation()
+            folded = Parser(file_name, print_errors=False, fold_constants=True)
+            folded.computation()
+            self.assertFalse(folded.diagnostics.has_errors(), file_name)
+            self.assertLessEqual(len(folded.blocks.instructions), len(default.blocks.instructions), file_name)
+
+    def test_propagate_constants(self):
+        # The branches are nested in both then and else, so the then side is the higher block of the join
+        source = 'main var a, b; { let a <- call InputNum(); if 1 < 2 then if a < 0 then let b <- 1 else ' \
+                 'let b <- 1 fi else if a < 0 then let b <- 2 else let b <- 2 fi fi; call OutputNum(b + 1) }.'
+        parser = Parser.from_string(source, print_errors=False, propagate_constants=True)
+        parser.computation()
+        blocks_list = parser.blocks.get_blocks_list()
+        self.assertEqual([block.get_id() for block in blocks_list], list(range(1, len(blocks_list) + 1)))
+        instructions = [instruction for block in blocks_list for instruction in block.get_instruction_order_list()]
+        ops = [instruction.op for instruction in instructions]
+        self.assertNotIn(Operations.PHI, ops)
+        self.assertNotIn(Operations.ADD, ops)
+        self.assertEqual(ops.count(Operations.CMP), 1)
+        write = next(instruction for instruction in instructions if instruction.op == Operations.WRITE)
+        self.assertEqual(write.x.constant, 2)
+
+        default = Parser.from_string(source, print_errors=False)
+        default.computation()
+        self.assertLess(len(blocks_list), len(default.blocks.get_blocks_list()))
+
+    def test_propagate_constants_loops(self):
+        parser = Parser.from_string('main var a, i; { let i <- 0; let a <- call InputNum(); while 1 > 2 do '
+                                    'let i <- i + a od; while i < 10 do let i <- i + 1 od; call OutputNum(i) }.',
+                                    print_errors=False, propagate_constants=True)
+        parser.computation()
+        blocks_list = parser.blocks.get_blocks_list()
+        first_loop = blocks_list[1].get_instruction_order_list()
+        # The first loop is never entered, so its header only branches to the second loop
+        self.assertEqual([instruction.op for instruction in first_loop], [Operations.BRA])
+        self.assertIs(first_loop[0].x, blocks_list[2].find_first_instr())
+        second_loop = blocks_list[2].get_instruction_order_list()
+        self.assertEqual([instruction.op for instruction in second_loop],
+                         [Operations.PHI, Operations.CMP, Operations.BGE])
+        self.assertEqual(second_loop[0].x.constant, 0)
+
+    def test_eliminate_dead_code(self):
+        # b is overwritten before it is used and its loop phi is only used by the add that comes back to it
+        source = 'main var a, b, i; array[4] x; { let a <- call InputNum(); let b <- a * 2; let b <- x[a]; ' \
+                 'let i <- 0; while i < 10 do let b <- b + 1; let i <- i + 1 od; call OutputNum(i) }.'
+        default = Parser.from_string(source, print_errors=False)
+        default.computation()
+        parser = Parser.from_string(source, print_errors=False, eliminate_dead_code=True)
+        parser.computation()
+        blocks_list = parser.blocks.get_blocks_list()
+        instructions = [instruction for block in blocks_list for instruction in block.get_instruction_order_list()]
+        default_count = sum(len(block.get_instruction_order_list()) for block in default.blocks.get_blocks_list())
+        self.assertEqual(parser.removed_dead_instructions, default_count - len(instructions))
+        self.assertEqual([instruction.op for instruction in blocks_list[0].get_instruction_order_list()],
+                         [Operations.READ])
+        ops = [instruction.op for instruction in instructions]
+        self.assertNotIn(Operations.LOAD, ops)
+        self.assertEqual(ops.count(Operations.PHI), 1)
+        self.assertEqual(ops.count(Operations.ADD), 1)
+        # The branch back to the header went to the removed phi
+        loop_branch = blocks_list[2].get_instruction_order_list()[-1]
+        self.assertIs(loop_branch.x, blocks_list[1].find_first_instr())
+
+    def test_hoist_loop_invariants(self):
+        # The load of the condition runs whenever the loop is entered, the body uses its value
+        parser = Parser.from_string('main var a, i; array[4] x; { let a <- call InputNum(); let i <- 0; '
+                                    'while i < x[a] do call OutputNum(x[a] + a); let i <- i + 1 od }.',
+                                    print_errors=False, hoist_loop_invariants=True)
+        parser.computation()
+        bb1, preheader, header, body, follow = parser.blocks.get_blocks_list()
+        self.assertEqual(preheader.get_parents(), {bb1: BlockRelation.NORMAL})
+        self.assertEqual(preheader.get_children(), {header: BlockRelation.NORMAL})
+        self.assertEqual(set(header.get_parents()), {preheader, body})
+        hoisted = preheader.get_instruction_order_list()
+        self.assertEqual(parser.hoisted_instructions, len(hoisted))
+        self.assertEqual([instruction.op for instruction in hoisted],
+                         [Operations.MUL, Operations.ADD, Operations.ADDA, Operations.LOAD, Operations.ADD])
+        self.assertEqual([instruction.op for instruction in body.get_instruction_order_list()],
+                         [Operations.WRITE, Operations.ADD, Operations.BRA])
+
+    def test_hoist_loop_invariants_nested(self):
+        # x and y are stored to in the inner loop, so only the addresses can be moved out
+        parser = Parser.from_string('main var a, i, j; array[4] x, y; { let a <- call InputNum(); let i <- 0; '
+                                    'while i < 4 do let j <- 0; while j < 4 do let y[j] <- x[a] * a; '
+                                    'let x[i] <- y[a]; let j <- j + 1 od; let i <- i + 1 od }.',
+                                    print_errors=False, hoist_loop_invariants=True)
+        parser.computation()
+        blocks_list = parser.blocks.get_blocks_list()
+        outer_preheader, inner_preheader, inner_body = blocks_list[1], blocks_list[3], blocks_list[5]
+        # a * 4 is invariant in both loops and x[i] only in the inner one
+        self.assertIn(Operations.MUL, [instruction.op for instruction in outer_preheader.get_instruction_order_list()])
+        self.assertEqual([instruction.op for instruction in inner_preheader.get_instruction_order_list()],
+                         [Operations.MUL, Operations.ADDA])
+        self.assertIs(inner_preheader.get_instruction_order_list()[0].x, blocks_list[2].find_first_instr())
+        self.assertEqual([instruction.op for instruction in inner_body.get_instruction_order_list()].count(
+            Operations.LOAD), 2)
+
+    def test_hoist_loop_invariants_speculative_load(self):
+        # x[a] is only loaded if the loop runs and a > 5, so it stays in the loop and only its address is moved
+        parser = Parser.from_string('main var a, i; array[4] x; { let a <- call InputNum(); let i <- 0; '
+                                    'while i < a do if a > 5 then call OutputNum(x[a]) fi; let i <- i + 1 od }.',
+                                    print_errors=False, hoist_loop_invariants=True)
+        parser.computation()
+        blocks_list = parser.blocks.get_blocks_list()
+        preheader, then_block = blocks_list[1], blocks_list[4]
+        self.assertEqual([instruction.op for instruction in preheader.get_instruction_order_list()],
+                         [Operations.CMP, Operations.MUL, Operations.ADD, Operations.ADDA])
+        self.assertEqual([instruction.op for instruction in then_block.get_instruction_order_list()],
+                         [Operations.LOAD, Operations.WRITE, Operations.BRA])
+
+        # The body does not run if the loop runs zero times
+        parser = Parser.from_string('main var a, i; array[4] x; { let a <- call InputNum(); let i <- 0; '
+                                    'while i < 4 do call OutputNum(x[a] + a); let i <- i + 1 od }.',
+                                    print_errors=False, hoist_loop_invariants=True)
+        parser.computation()
+        preheader, body = parser.blocks.get_blocks_list()[1], parser.blocks.get_blocks_list()[3]
+        self.assertEqual([instruction.op for instruction in preheader.get_instruction_order_list()],
+                         [Operations.MUL, Operations.ADD, Operations.ADDA])
+        self.assertEqual([instruction.op for instruction in body.get_instruction_order_list()],
+                         [Operations.LOAD, Operations.ADD, Operations.WRITE, Operations.ADD, Operations.BRA])
+
+    def test_reduce_induction_variables(self):
+        parser = Parser.from_string('main var i, s; array[10] a; { let i <- 0; let s <- 0; while i < 10 do '
+                                    'let s <- s + a[i]; let i <- i + 1 od; call OutputNum(s) }.',
+                                    print_errors=False, reduce_induction_variables=True)
+        # The loop invariant code motion runs first
+        self.assertTrue(parser.hoist_loop_invariants)
+        parser.computation()
+        self.assertEqual(parser.reduced_multiplications, 1)
+        preheader, header, body, follow = parser.blocks.get_blocks_list()
+        # BASE + a_addr is moved out of the loop
+        self.assertEqual([instruction.op for instruction in preheader.get_instruction_order_list()], [Operations.ADD])
+        self.assertEqual(parser.hoisted_instructions, 1)
+        self.assertNotIn(Operations.MUL, [instruction.op for instruction in body.get_instruction_order_list()])
+        # i * 4 starts at 0 and goes up by 4 at the end of every iteration
+        offset = header.get_instruction_order_list()[2]
+        self.assertEqual((offset.op, offset.x.constant), (Operations.PHI, 0))
+        self.assertEqual((offset.y.op, offset.y.x, offset.y.y.constant), (Operations.ADD, offset, 4))
+        self.assertIs(body.get_instruction_order_list()[-2], offset.y)
+        address = body.get_instruction_order_list()[0]
+        self.assertEqual((address.op, address.x, address.y), (Operations.ADDA, offset, preheader.find_first_instr()))
+
+    def test_reduce_induction_variables_nested(self):
+        source = 'main var i, j; array[4][5] m; { let i <- 0; while i < 4 do let j <- 0; while j < 5 do ' \
+                 'call OutputNum(m[i][j]); let j <- j + 1 od; let i <- i + 1 od }.'
+        default = Parser.from_string(source, print_errors=False)
+        default.computation()
+        self.assertEqual([instruction.op for instruction in default.blocks.get_blocks_list()[2]
+                         .get_instruction_order_list()].count(Operations.MUL), 2)
+
+        parser = Parser.from_string(source, print_errors=False, reduce_induction_variables=True)
+        parser.computation()
+        # i * 5 is reduced in the outer loop and (i * 5 + j) * 4 in the inner loop, which starts at i * 5 * 4 since j
+        # starts at 0, and that start is reduced in the outer loop as well
+        self.assertEqual(parser.reduced_multiplications, 3)
+        inner_body = parser.blocks.get_blocks_list()[4]
+        self.assertNotIn(Operations.MUL, [instruction.op for instruction in inner_body.get_instruction_order_list()])
+
+    def test_reduce_induction_variables_latch_in_inner_loop(self):
+        # The inner loop ends the outer body, so the outer latch is the inner header. i * 7 stays in the inner
+        # preheader instead of an update in the inner header that runs in every inner iteration.
+        parser = Parser.from_string('main var i, j, s; { let i <- 0; let s <- 0; while i < 10 do let i <- i + 1; '
+                                    'let j <- 0; while j < 3 do let s <- s + i * 7; let j <- j + 1 od od; '
+                                    'call OutputNum(s) }.', print_errors=False, reduce_induction_variables=True)
+        parser.computation()
+        self.assertEqual(parser.reduced_multiplications, 0)
+        blocks_list = parser.blocks.get_blocks_list()
+        inner_preheader, inner_header = blocks_list[2], blocks_list[3]
+        self.assertEqual([instruction.op for instruction in inner_preheader.get_instruction_order_list()],
+                         [Operations.MUL])
+        self.assertEqual([instruction.op for instruction in inner_header.get_instruction_order_list()],
+                         [Operations.PHI, Operations.PHI, Operations.CMP, Operations.BGE])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,9 @@
+import glob
+import io
 import unittest
 
+from filereader import StringReader
+from identifiers import IdentifierTable
 from parser import Parser
 from visualizer import Visualizer
 
@@ -345,6 +349,87 @@ class TestInterpreter(unittest.TestCase):
 
         self.assertEqual(output_text, expected_output)
 
+    def assert_fixture_graphs(self, **options):
+        """
+        Checks that parsers made with the given options give the expected graphs of all the test programs.
+        """
+        for dot_file in sorted(glob.glob('tests/*_tests/*.dot')):
+            parser = Parser(dot_file.replace('.dot', '.txt'), **options)
+            parser.computation()
+
+            visualizer = Visualizer(parser.blocks, parser.symbolTable, show_vars=True, show_instr_vars=False)
+            self.assertEqual(visualizer.make_graph(), read_expected_output(dot_file), dot_file)
+
+    def test_bulk_tokenizer_gives_same_graphs(self):
+        self.assert_fixture_graphs(bulk_tokenize=True)
+
+    def test_shared_identifier_table_gives_same_graphs(self):
+        self.assert_fixture_graphs(identifiers=IdentifierTable(256))
+
+    def test_threaded_lexing_gives_same_graphs(self):
+        self.assert_fixture_graphs(bulk_tokenize=True, threaded_lexing=True)
+
+    def test_reset_during_threaded_lexing(self):
+        # Long enough for the lexer thread to still be running, waiting for room in the full chunk queue
+        source = 'main var x; { ' + '; '.join(['let x <- x + 1'] * 20000) + ' }.'
+        parser = Parser.from_string(source, bulk_tokenize=True, threaded_lexing=True)
+        for _ in range(10):
+            parser.next_token()
+        token_stream = parser.token_stream
+        self.assertTrue(token_stream.producer.is_alive())
+
+        with open('tests/class_tests/prefix_sum.txt') as file:
+            parser.reset(reader=StringReader.from_source(file.read()))
+        self.assertIsNone(token_stream.producer)
+        parser.computation()
+
+        visualizer = Visualizer(parser.blocks, parser.symbolTable, show_vars=True, show_instr_vars=False)
+        self.assertEqual(visualizer.make_graph(), read_expected_output('tests/class_tests/prefix_sum.dot'))
+
+    def test_failed_parse_stops_threaded_lexing(self):
+        source = 'main var x; { ' + '; '.join(['let x <- x + 1'] * 20000) + ' }.'
+        parser = Parser.from_string(source, bulk_tokenize=True, threaded_lexing=True)
+        token_stream = parser.token_stream
+
+        def fail():
+            raise RuntimeError('parse failed')
+
+        parser.stat_sequence = fail
+        with self.assertRaises(RuntimeError):
+            parser.computation()
+        self.assertIsNone(token_stream.producer)
+
+    def test_diagnostics_have_positions(self):
+        for bulk_tokenize in (False, True):
+            parser = Parser('tests/my_tests/uninitialized_var_in_then_else.txt', print_errors=False,
+                            bulk_tokenize=bulk_tokenize)
+            parser.computation()
+
+            self.assertEqual([(diagnostic.line, diagnostic.col) for diagnostic in parser.diagnostics],
+                             [(8, 18), (10, 18)])
+            self.assertEqual(parser.diagnostics[0].message,
+                             'SyntaxError: a has not been initialized. It is now initialized to 0')
+
+    def test_no_diagnostics_for_valid_program(self):
+        parser = Parser('tests/class_tests/prefix_sum.txt', print_errors=False)
+        parser.computation()
+
+        self.assertFalse(parser.diagnostics.has_errors())
+
+    def test_compile_from_memory(self):
+        with open('tests/class_tests/prefix_sum.txt') as file:
+            source = file.read()
+        expected_output = read_expected_output('tests/class_tests/prefix_sum.dot')
+
+        parsers = [Parser.from_string(source), Parser.from_string(source.encode()),
+                   Parser.from_stream(io.StringIO(source)), Parser.from_stream(io.BytesIO(source.encode())),
+                   Parser.from_string(source, bulk_tokenize=True)]
+        for parser in parsers:
+            parser.computation()
+
+            visualizer = Visualizer(parser.blocks, parser.symbolTable, show_vars=True, show_instr_vars=False)
+            self.assertEqual(visualizer.make_graph(), expected_output)
+
 
 if __name__ == '__main__':
     unittest.main()
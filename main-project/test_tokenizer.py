@@ -0,0 +1,125 @@
+import glob
+import os
+import tempfile
+import unittest
+
+from filereader import FileReader, BufferedFileReader
+from identifiers import IdentifierTable
+from tokenizer import Tokenizer, BulkTokenizer
+from tokens import Tokens, Strings
+from tokenstream import TokenStream
+
+TEST_FILES = sorted(glob.glob('tests/**/*.txt', recursive=True))
+
+
+def write_source(contents):
+    file = tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False)
+    with file:
+        file.write(contents)
+    return file.name
+
+
+def read_tokens(tokenizer):
+    tokens = []
+    token = tokenizer.get_next_token()
+    while token != Tokens.EOF_TOKEN:
+        tokens.append((token, tokenizer.last_number, tokenizer.last_id))
+        token = tokenizer.get_next_token()
+    return tokens
+
+
+class TestTokenizer(unittest.TestCase):
+
+    def test_buffered_reader_returns_same_characters(self):
+        for file_name in TEST_FILES:
+            reader = FileReader(file_name)
+            buffered_reader = BufferedFileReader(file_name)
+            char = reader.get_next()
+            while char:
+                self.assertEqual(buffered_reader.get_next(), char)
+                char = reader.get_next()
+            self.assertEqual(buffered_reader.get_next(), '')
+
+            # The line index is only built for the first position lookup
+            self.assertIsNone(reader.line_starts)
+            self.assertEqual(reader.position(reader.pos - 1), buffered_reader.position(buffered_reader.pos - 1))
+
+    def test_buffered_tokenizer_matches_unbuffered(self):
+        for file_name in TEST_FILES:
+            self.assertEqual(read_tokens(Tokenizer(file_name)), read_tokens(Tokenizer(file_name, buffered=False)),
+                             file_name)
+
+    def test_bulk_tokenizer_matches_character_tokenizer(self):
+        for file_name in TEST_FILES:
+            self.assertEqual(read_tokens(BulkTokenizer(file_name)), read_tokens(Tokenizer(file_name)), file_name)
+
+    def test_bulk_tokenizer_edge_cases(self):
+        sources = ['let x1 <- 007+y;  a[2]<=b!=c==d>=e<-f', 'x = ! _ # 12abc', 'caf\u00e9 <- 1', '\u00b2x', 'main.']
+        for source in sources:
+            file_name = write_source(source)
+            try:
+                self.assertEqual(read_tokens(BulkTokenizer(file_name)), read_tokens(Tokenizer(file_name)), source)
+            finally:
+                os.remove(file_name)
+
+    def test_shared_identifier_table(self):
+        identifiers = IdentifierTable(256)
+        first_tokens = read_tokens(Tokenizer(TEST_FILES[0], identifiers=identifiers))
+        second_tokens = read_tokens(BulkTokenizer(TEST_FILES[0], identifiers=identifiers))
+
+        self.assertEqual(first_tokens, second_tokens)
+        self.assertEqual(identifiers.get_name(identifiers.get_id('i')), 'i')
+        self.assertEqual(identifiers.intern('i'), identifiers.get_id('i'))
+        self.assertEqual(list(identifiers.ids.values()), list(range(256, 256 + len(identifiers))))
+
+    def test_records_match_between_tokenizers(self):
+        for file_name in TEST_FILES:
+            records = [tuple(record) for record in Tokenizer(file_name).records()]
+            self.assertEqual([tuple(record) for record in BulkTokenizer(file_name).records()], records, file_name)
+            self.assertEqual([tuple(record) for record in Tokenizer(file_name, buffered=False).records()], records,
+                             file_name)
+
+    def test_record_positions(self):
+        file_name = write_source('main\n  var  x;\n{ let x <- 12 }.')
+        try:
+            records = [tuple(record) for record in BulkTokenizer(file_name).records()]
+        finally:
+            os.remove(file_name)
+
+        self.assertEqual(records[0], (Tokens.MAIN_TOKEN, None, 1, 1))
+        self.assertEqual(records[1], (Tokens.VAR_TOKEN, None, 2, 3))
+        self.assertEqual(records[2][1:], ('x', 2, 8))
+        self.assertEqual(records[8], (Tokens.NUMBER, 12, 3, 12))
+        self.assertEqual(records[-1][0], Tokens.EOF_TOKEN)
+
+    def test_token_stream_lookahead(self):
+        stream = TokenStream(Tokenizer(TEST_FILES[0]).records(), lookahead=3)
+        expected = [record.token for record in Tokenizer(TEST_FILES[0]).records()]
+
+        self.assertEqual([stream.peek(k).token for k in range(3)], expected[:3])
+        with self.assertRaises(ValueError):
+            stream.peek(3)
+        self.assertEqual([record.token for record in stream], expected)
+        self.assertEqual(stream.next().token, Tokens.EOF_TOKEN)
+
+    def test_threaded_token_stream(self):
+        for file_name in TEST_FILES:
+            expected = [tuple(record) for record in Tokenizer(file_name).records()]
+            stream = TokenStream(Tokenizer(file_name).records(), threaded=True, chunk_size=7)
+            self.assertEqual([tuple(record) for record in stream], expected, file_name)
+
+    def test_symbols(self):
+        symbols = list(Strings.SYMBOLS) + ['=', '!']
+        file_name = write_source(' '.join(symbols) + ' <--')
+        try:
+            tokens = [token for token, _, _ in read_tokens(Tokenizer(file_name))]
+        finally:
+            os.remove(file_name)
+
+        expected = list(Strings.SYMBOLS.values()) + [Tokens.ERROR_TOKEN, Tokens.ERROR_TOKEN, Tokens.BECOMES_TOKEN,
+                                                     Tokens.MINUS_TOKEN]
+        self.assertEqual(tokens, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,82 +1,252 @@
-from filereader import FileReader
-from tokens import Tokens, Strings
+import re
+from array import array
+
+from diagnostics import Diagnostics
+from filereader import FileReader, BufferedFileReader, StringReader
+from identifiers import IdentifierTable
+from tokens import Tokens, Strings, INDEX_TO_NAME, MAX_RESERVED_ID, SYMBOL_DISPATCH, NO_SYMBOL
+from tokenstream import TokenRecord
+
+# Character runs read in bulk from the reader. \s matches exactly what str.isspace accepts and [^\W_] exactly what
+# str.isalnum accepts, so the tokens are the same as when checking one character at a time.
+WHITESPACE_RUN = re.compile(r'\s+')
+DIGIT_RUN = re.compile(r'[0-9]+')
+ALNUM_RUN = re.compile(r'[^\W_]+')
+
+# Master pattern for the bulk tokenizer. Captures the leading whitespace and either a number, an identifier or
+# keyword, a symbol or any other single character which becomes an error token. Only used for ASCII sources, where
+# [A-Za-z] is exactly what str.isalpha accepts.
+SYMBOL_ALTERNATIVES = '|'.join(re.escape(symbol) for symbol in sorted(Strings.SYMBOLS, key=len, reverse=True))
+MASTER_PATTERN = re.compile(rf'(\s*)(?:([0-9]+)|([A-Za-z][A-Za-z0-9]*)|({SYMBOL_ALTERNATIVES})|(\S))')
 
 
 class Tokenizer:
-    def __init__(self, filename):
-        self.my_file_reader = FileReader(filename)
+    def __init__(self, filename=None, buffered: bool = True, identifiers: IdentifierTable = None,
+                 print_errors: bool = True, reader=None):
+        """
+        Tokenizes the given file, or the source of the given reader (e.g. a StringReader) when one is passed.
+        """
+        self.buffered = buffered
+        self.diagnostics = Diagnostics()
+        self.print_errors = print_errors
+        self.index_to_token_table = INDEX_TO_NAME
+        self.max_reserved_id = MAX_RESERVED_ID
+        self.identifiers = identifiers if identifiers is not None else IdentifierTable(self.max_reserved_id + 1)
+        self.DIGITS = '0123456789'
+        self.reset(filename, reader)
+
+    def reset(self, filename=None, reader=None):
+        """
+        Starts tokenizing a new source. The identifier table is kept and the diagnostics are cleared.
+        """
+        if reader is None:
+            reader = BufferedFileReader(filename) if self.buffered else FileReader(filename)
+        self.my_file_reader = reader
+        self.diagnostics.clear()
         self.inp = self.my_file_reader.get_next()
-        self.index_to_token_table = Tokens.get_index_to_id_dict()
-        self.token_to_index_table = {}
-        self.max_reserved_id = max(value for name, value in vars(Tokens).items() if isinstance(value, int))
-        self.id_count = self.max_reserved_id + 1
         self.last_number = None
         self.last_id = ''
-        self.DIGITS = '0123456789'
+        self.token_offset = 0  # start offset of the last token
 
     def next_input(self) -> str:
         self.inp = self.my_file_reader.get_next()
         return self.inp
 
-    def error(self, error_msg: str):
-        self.my_file_reader.error(error_msg)
+    def error(self, error_msg: str, offset: int = None):
+        """
+        Records an error at the given source offset (the start of the last read token by default).
+        """
+        diagnostic = self.diagnostics.add(error_msg, self.token_offset if offset is None else offset,
+                                          self.my_file_reader)
+        if self.print_errors:
+            self.my_file_reader.error(str(diagnostic))
 
-    def add_identifier(self, identifier: int) -> int:
-        self.index_to_token_table[self.id_count] = identifier
-        self.token_to_index_table[identifier] = self.id_count
-        self.id_count += 1
-        return self.id_count - 1
+    def add_identifier(self, identifier: str) -> int:
+        return self.identifiers.intern(identifier)
 
-    def get_token_from_index(self, index: int) -> int:
+    def get_token_from_index(self, index: int) -> str:
+        if index > self.max_reserved_id:
+            return self.identifiers.get_name(index)
         return self.index_to_token_table[index]
 
+    def records(self):
+        """
+        Generator over the remaining tokens as TokenRecords, ending with the EOF record.
+        """
+        reader = self.my_file_reader
+        max_reserved_id = self.max_reserved_id
+        while True:
+            token = self.get_next_token()
+            if token == Tokens.NUMBER:
+                value = self.last_number
+            elif token > max_reserved_id:
+                value = self.last_id
+            else:
+                value = None
+            yield TokenRecord(token, value, self.token_offset, reader)
+            if token == Tokens.EOF_TOKEN:
+                return
+
     def get_next_token(self):
         if not self.inp:
+            self.token_offset = self.my_file_reader.pos
             return Tokens.EOF_TOKEN
 
-        while self.inp.isspace():
+        if self.inp.isspace():
+            self.my_file_reader.read_run(WHITESPACE_RUN)
             self.next_input()
 
+        # The current input character has already been read from the reader
+        self.token_offset = self.my_file_reader.pos - 1 if self.inp else self.my_file_reader.pos
+
         # Handle numbers
         if self.inp != '' and self.inp in self.DIGITS:
-            res = int(self.inp)
+            res = self.inp + self.my_file_reader.read_run(DIGIT_RUN)
             self.next_input()
-            while self.inp != '' and self.inp in self.DIGITS:
-                res = 10 * res + int(self.inp)
-                self.next_input()
             self.last_number = int(res)
             return Tokens.NUMBER
 
         # Handle identifiers and reserved keywords
         elif self.inp.isalpha():
-            res = self.inp
+            res = self.inp + self.my_file_reader.read_run(ALNUM_RUN)
             self.next_input()
-            while self.inp.isalnum():
-                res += self.inp
-                self.next_input()
 
             if res in Strings.KEYWORDS:  # Reserved keywords
                 return Strings.KEYWORDS[res]
-            elif res in self.token_to_index_table:  # Already seen id
+            elif res in self.identifiers.ids:  # Already seen id
                 self.last_id = res
-                return self.token_to_index_table[res]
+                return self.identifiers.ids[res]
             else:  # New id
                 self.last_id = res
                 return self.add_identifier(res)
 
         # Handle symbols
         elif self.inp != '':
-            cur_inp = self.inp
+            single_token, second_chars = SYMBOL_DISPATCH.get(self.inp, NO_SYMBOL)
             self.next_input()
-            combined_inp = cur_inp + self.inp
 
-            if combined_inp in Strings.SYMBOLS:
+            if self.inp in second_chars:  # Two character symbol
+                token = second_chars[self.inp]
                 self.next_input()
-                return Strings.SYMBOLS[combined_inp]
-            elif cur_inp in Strings.SYMBOLS:
-                return Strings.SYMBOLS[cur_inp]
+                return token
             else:
-                return Tokens.ERROR_TOKEN
+                return single_token
+
+        else:
+            return Tokens.EOF_TOKEN
+
 
+class BulkTokenizer(Tokenizer):
+    """
+    Tokenizes the whole source in one pass when constructed and afterwards hands out the tokens by walking the
+    resulting arrays. token_ids holds the token of every position, which for identifiers is also the identifier
+    index, token_values holds the number for NUMBER tokens (None otherwise) and token_offsets the start offset of
+    every token. last_number and last_id are updated exactly as the character based tokenizer does.
+    """
+
+    def __init__(self, filename=None, identifiers: IdentifierTable = None, print_errors: bool = True,
+                 reader: StringReader = None):
+        self.token_ids = array('i')
+        self.token_values = []
+        self.token_offsets = array('i')
+        self.token_pos = 0
+        self.eof_offset = 0
+        super().__init__(filename, identifiers=identifiers, print_errors=print_errors, reader=reader)
+
+    def reset(self, filename=None, reader: StringReader = None):
+        super().reset(filename, reader)
+        del self.token_ids[:]
+        self.token_values.clear()
+        del self.token_offsets[:]
+        self.token_pos = 0
+
+        if self.my_file_reader.text.isascii():
+            self.scan_all()
         else:
+            # The master pattern only covers ASCII letters, so use the character based scanner to keep the tokens
+            # identical for other sources
+            self.scan_all_by_character()
+            self.last_number = None
+            self.last_id = ''
+
+    def scan_all(self):
+        token_ids = self.token_ids
+        token_values = self.token_values
+        token_offsets = self.token_offsets
+        keywords = Strings.KEYWORDS
+        symbols = Strings.SYMBOLS
+        identifiers = self.identifiers.ids
+        offset = 0
+
+        # The matches follow each other without gaps, so the offsets are the running sum of the matched lengths
+        for whitespace, number, ident, symbol, error in MASTER_PATTERN.findall(self.my_file_reader.text):
+            offset += len(whitespace)
+            token_offsets.append(offset)
+            if number:
+                token_ids.append(Tokens.NUMBER)
+                token_values.append(int(number))
+                offset += len(number)
+                continue
+            elif ident:
+                if ident in keywords:
+                    token = keywords[ident]
+                elif ident in identifiers:
+                    token = identifiers[ident]
+                else:
+                    token = self.add_identifier(ident)
+                offset += len(ident)
+            elif symbol:
+                token = symbols[symbol]
+                offset += len(symbol)
+            else:
+                token = Tokens.ERROR_TOKEN
+                offset += len(error)
+
+            token_ids.append(token)
+            token_values.append(None)
+
+        self.eof_offset = len(self.my_file_reader.text)
+
+    def scan_all_by_character(self):
+        token = super().get_next_token()
+        while token != Tokens.EOF_TOKEN:
+            self.token_ids.append(token)
+            self.token_values.append(self.last_number if token == Tokens.NUMBER else None)
+            self.token_offsets.append(self.token_offset)
+            token = super().get_next_token()
+        self.eof_offset = self.token_offset
+
+    def records(self):
+        reader = self.my_file_reader
+        max_reserved_id = self.max_reserved_id
+        get_name = self.identifiers.get_name
+        token_ids = self.token_ids
+        token_values = self.token_values
+        token_offsets = self.token_offsets
+
+        for pos in range(self.token_pos, len(token_ids)):
+            token = token_ids[pos]
+            if token > max_reserved_id:
+                self.last_id = get_name(token)
+                yield TokenRecord(token, self.last_id, token_offsets[pos], reader)
+            else:
+                if token == Tokens.NUMBER:
+                    self.last_number = token_values[pos]
+                yield TokenRecord(token, token_values[pos], token_offsets[pos], reader)
+            self.token_pos = pos + 1
+        yield TokenRecord(Tokens.EOF_TOKEN, None, self.eof_offset, reader)
+
+    def get_next_token(self):
+        pos = self.token_pos
+        if pos >= len(self.token_ids):
+            self.token_offset = self.eof_offset
             return Tokens.EOF_TOKEN
+
+        self.token_pos = pos + 1
+        self.token_offset = self.token_offsets[pos]
+        token = self.token_ids[pos]
+        if token == Tokens.NUMBER:
+            self.last_number = self.token_values[pos]
+        elif token > self.max_reserved_id:
+            self.last_id = self.identifiers.get_name(token)
+        return token
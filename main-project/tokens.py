@@ -1,3 +1,6 @@
+from types import MappingProxyType
+
+
 class Tokens:
     ERROR_TOKEN = 0
 
@@ -92,7 +95,7 @@ class Strings:
         '<-': Tokens.BECOMES_TOKEN,
     }
 
-    KEYWORDS = {
+    KEYWORDS = MappingProxyType({
         'let': Tokens.LET_TOKEN,
         'call': Tokens.CALL_TOKEN,
 
@@ -117,4 +120,28 @@ class Strings:
         'InputNum': Tokens.INPUT_NUM_TOKEN,
         'OutputNum': Tokens.OUTPUT_NUM_TOKEN,
         'OutputNewLine': Tokens.OUTPUT_NEW_LINE_TOKEN
-    }
+    })
+
+
+def build_symbol_dispatch(symbols) -> dict:
+    """
+    Builds a table from the first character of a symbol to a pair of the token for the symbol consisting of only that
+    character (an error token if there is none, e.g. for = and !) and a table from a possible second character to
+    the token of the two character symbol.
+    """
+    dispatch = {}
+    for symbol, token in symbols.items():
+        single, pairs = dispatch.setdefault(symbol[0], (Tokens.ERROR_TOKEN, {}))
+        if len(symbol) == 1:
+            dispatch[symbol[0]] = (token, pairs)
+        else:
+            pairs[symbol[1]] = token
+    return MappingProxyType({first: (single, MappingProxyType(pairs)) for first, (single, pairs) in dispatch.items()})
+
+
+# Computed once at import so that creating a tokenizer does not need to scan the Tokens class and reading a symbol
+# does not need to concatenate strings
+INDEX_TO_NAME = MappingProxyType(Tokens.get_index_to_id_dict())
+MAX_RESERVED_ID = max(INDEX_TO_NAME)
+SYMBOL_DISPATCH = build_symbol_dispatch(Strings.SYMBOLS)
+NO_SYMBOL = (Tokens.ERROR_TOKEN, MappingProxyType({}))
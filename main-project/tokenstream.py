@@ -0,0 +1,141 @@
+import queue
+import threading
+from collections import deque
+
+from tokens import Tokens
+
+
+class TokenRecord:
+    """
+    A single token handed out by a token stream: the token, its value (the number for NUMBER tokens, the name for
+    identifiers and None otherwise) and its start offset in the source. The line and column are looked up from the
+    reader only when asked for.
+    """
+    __slots__ = ('token', 'value', 'offset', 'reader')
+
+    def __init__(self, token: int, value, offset: int, reader):
+        self.token = token
+        self.value = value
+        self.offset = offset
+        self.reader = reader
+
+    @property
+    def line(self) -> int:
+        return self.reader.position(self.offset)[0]
+
+    @property
+    def col(self) -> int:
+        return self.reader.position(self.offset)[1]
+
+    def __iter__(self):
+        line, col = self.reader.position(self.offset)
+        return iter((self.token, self.value, line, col))
+
+    def __repr__(self):
+        return f"TokenRecord({self.token}, {self.value!r}, offset={self.offset})"
+
+
+class TokenStream:
+    """
+    Ring buffer over the token records of a tokenizer that allows looking up to lookahead tokens ahead of the current
+    one without consuming them. Once the end of the input is reached the EOF record is returned for every further
+    token.
+
+    With threaded=True the tokenizer runs on a worker thread and hands over the records in chunks of chunk_size, so
+    lexing can run ahead of parsing on large inputs.
+    """
+
+    def __init__(self, records, lookahead: int = 2, threaded: bool = False, chunk_size: int = 1024):
+        self.lookahead = lookahead
+        self.buffer = deque()
+        self.eof_record = None
+        self.producer: threading.Thread = None
+        self.stopped = threading.Event()
+        if threaded:
+            self.chunks = queue.Queue(maxsize=16)
+            self.producer = threading.Thread(target=self.produce, args=(records, chunk_size), daemon=True)
+            self.producer.start()
+            self.source = self.receive_chunks()
+        else:
+            self.source = iter(records)
+
+    def fill(self, count: int):
+        while len(self.buffer) < count:
+            if self.eof_record:
+                self.buffer.append(self.eof_record)
+                continue
+
+            record = next(self.source)
+            if record.token == Tokens.EOF_TOKEN:
+                self.eof_record = record
+            self.buffer.append(record)
+
+    def peek(self, k: int = 0) -> TokenRecord:
+        """
+        Returns the k-th upcoming record without consuming it, where 0 is the record next() would return.
+        """
+        if k >= self.lookahead:
+            raise ValueError(f"Can only look {self.lookahead} tokens ahead")
+        self.fill(k + 1)
+        return self.buffer[k]
+
+    def next(self) -> TokenRecord:
+        if not self.buffer:
+            self.fill(1)
+        return self.buffer.popleft()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> TokenRecord:
+        if self.eof_record and not self.buffer:
+            raise StopIteration
+        return self.next()
+
+    def produce(self, records, chunk_size: int):
+        """
+        Runs the record generator on the worker thread and sends the records back in chunks until the end of the
+        input or until the stream is closed.
+        """
+        try:
+            chunk = []
+            for record in records:
+                if self.stopped.is_set():
+                    return
+                chunk.append(record)
+                if len(chunk) == chunk_size:
+                    self.chunks.put(chunk)
+                    chunk = []
+            self.chunks.put(chunk)
+        except Exception as e:
+            self.chunks.put(e)
+
+    def receive_chunks(self):
+        """
+        Yields the records the worker thread sends back in chunks.
+        """
+        while True:
+            chunk = self.chunks.get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield from chunk
+            if not chunk or chunk[-1].token == Tokens.EOF_TOKEN:
+                return
+
+    def close(self):
+        """
+        Stops the worker thread of a threaded stream and waits for it to finish, so the tokenizer it reads from can
+        be reused. Has to be called when the parsing stops before the end of the input.
+        """
+        if self.producer is None:
+            return
+        self.stopped.set()
+        while self.producer.is_alive():
+            # A producer waiting for room in the full queue only sees the stop after its chunk was taken
+            try:
+                while True:
+                    self.chunks.get_nowait()
+            except queue.Empty:
+                pass
+            self.producer.join(0.01)
+        self.producer = None
@@ -1,4 +1,5 @@
-from blocks import BasicBlock, BlockRelation
+from blocks import BasicBlock, BlockRelation, BlockWorklist
+from compaction import compact_instruction_ids
 from operations import Operations
 from ssa import Instruction
 
@@ -16,7 +17,8 @@ class Utils:
             self.copy_vars(parent_block, child_block)
 
     def copy_vars(self, parent_block: BasicBlock, child_block: BasicBlock):
-        child_block.copy_vars(parent_block.get_vars())
+        child_block.copy_vars(parent_block.get_vars(), parent_block.get_var_copies(),
+                              parent_block.get_var_stamps())
 
     def create_phi_instruction(self, in_while, current_join_block, designator, x: Instruction = None,
                                y: Instruction = None):
@@ -25,16 +27,21 @@ class Utils:
             instr_id = self.baseSSA.get_new_instr_id()
             instr = self.blocks.add_new_instr(in_while, current_join_block, instr_id=instr_id, op=Operations.PHI, x=x,
                                               y=y, x_var=designator, y_var=designator)
-            current_join_block.add_var_assignment(var=designator, instruction=instr)
+            self.blocks.add_var_assignment(current_join_block, var=designator, instruction=instr)
             return instr
 
-    def add_phi_instructions(self, in_while, block1: BasicBlock, block2: BasicBlock, var_set: set,
+    def add_phi_instructions(self, in_while, block1: BasicBlock, block2: BasicBlock, var_set: list,
                              already_added_vars: set,
                              join_block: BasicBlock):
         var_to_new_phi_idn = {}
         phis = []
+        # The phis by their x and y. In an if join a var with the same values as an earlier var gets the phi of that
+        # var. A while gets a phi for every var, since the while pass replaces the reads of a var by the phi of the var.
+        pair_phis = {}
+        # The phis of a while by their var and the value of the var before the while, and the phis of the vars that
+        # were copied from another var in the while with the copied var and value
         phis_lhs = {}
-        phis_rhs = {}
+        phis_rhs = []
 
         for var_token in var_set:
             block1_var_val = block1.get_vars()[var_token]
@@ -45,30 +52,42 @@ class Utils:
             if not block2_var_val:
                 self.blocks.add_constant(0)
                 block2_var_val = self.blocks.get_constant_instr(0)
-            if (block1_var_val, block2_var_val) not in already_added_vars:
-
-                if block1_var_val != block2_var_val:
-                    if join_block.available_exiting_phi_instruction(var_token):
-                        phi_instruction = join_block.get_existing_phi_instruction(var_token)
-                        join_block.update_instruction(instr=phi_instruction, x=block1_var_val, y=block2_var_val)
-                        join_block.add_var_assignment(var=var_token, instruction=phi_instruction)
-                    else:
-                        phi_instruction = self.create_phi_instruction(in_while, join_block, var_token, x=block1_var_val,
-                                                                      y=block2_var_val)
-
-                    var_to_new_phi_idn[var_token] = phi_instruction
-                    phis.append((phi_instruction, var_token, block2_var_val))
-
-                    phis_lhs[block1_var_val.get_id()] = phi_instruction
-                    phis_rhs[block2_var_val.get_id()] = phi_instruction
-
-                    join_block.add_var_assignment(var=var_token, instruction=phi_instruction)
-                    already_added_vars.add((block1_var_val, block2_var_val))
-
-        # Check if one of the new phis use another phi
-        for rhs_instr_idn, phi_idn in phis_rhs.items():
-            if rhs_instr_idn in phis_lhs:
-                join_block.update_instruction(phi_idn, y=phis_lhs[rhs_instr_idn])
+            if (block1_var_val, block2_var_val) in pair_phis and not join_block.is_while():
+                self.blocks.add_var_assignment(join_block, var=var_token,
+                                               instruction=pair_phis[(block1_var_val, block2_var_val)])
+            elif block1_var_val != block2_var_val:
+                # Before the phi is assigned to the var in the join block, which can be block1
+                stamps = (block1.get_var_stamp(var_token, block1_var_val),
+                          block2.get_var_stamp(var_token, block2_var_val))
+                if join_block.available_exiting_phi_instruction(var_token):
+                    phi_instruction = join_block.get_existing_phi_instruction(var_token)
+                    self.blocks.update_instruction(join_block, instr=phi_instruction, x=block1_var_val,
+                                                   y=block2_var_val)
+                    self.blocks.add_var_assignment(join_block, var=var_token, instruction=phi_instruction)
+                else:
+                    phi_instruction = self.create_phi_instruction(in_while, join_block, var_token, x=block1_var_val,
+                                                                  y=block2_var_val)
+
+                self.blocks.set_operand_stamps(phi_instruction, *stamps)
+                var_to_new_phi_idn[var_token] = phi_instruction
+                phis.append((phi_instruction, var_token, block2_var_val))
+
+                if join_block.is_while():
+                    phis_lhs[(var_token, block1_var_val)] = phi_instruction
+                    copied_var = block2.get_copied_var(var_token)
+                    if copied_var is not None:
+                        phis_rhs.append(((copied_var, block2_var_val), phi_instruction))
+
+                self.blocks.add_var_assignment(join_block, var=var_token, instruction=phi_instruction)
+                already_added_vars.add((block1_var_val, block2_var_val))
+                pair_phis[(block1_var_val, block2_var_val)] = phi_instruction
+
+        # A var that is a copy of the value another var had before the while gets the phi of that var in the while
+        # (the value of the other var at the start of the iteration). Values that are only equal, e.g. the same
+        # constant, are not copies.
+        for copied_var_value, phi_instruction in phis_rhs:
+            if copied_var_value in phis_lhs:
+                self.blocks.update_instruction(join_block, phi_instruction, y=phis_lhs[copied_var_value])
 
     def add_phis_if(self, in_while, if_block: BasicBlock, then_block: BasicBlock, else_block: BasicBlock):
         already_added_vars = set()
@@ -78,11 +97,12 @@ class Utils:
             then_block = if_block
         if else_block.is_return_block():
             else_block = if_block
+        join_block.set_phi_y_parent(else_block)
 
-        # Joining var that has been updated both in then and else (or carried down from dominating blocks)
-        then_vars = set(then_block.get_vars().keys())
-        else_vars = set(else_block.get_vars().keys())
-        intersection_then_else = then_vars.intersection(else_vars)
+        # Joining var that has been updated both in then and else (or carried down from dominating blocks).
+        # Keep the declaration order of the vars so that the phi order does not depend on the identifier ids.
+        else_vars = else_block.get_vars()
+        intersection_then_else = [var for var in then_block.get_vars() if var in else_vars]
         self.add_phi_instructions(in_while, then_block, else_block, intersection_then_else, already_added_vars,
                                   join_block=join_block)
 
@@ -101,7 +121,7 @@ class Utils:
             if instruction.op == Operations.PHI and not instruction.x:
                 unused_phis.append((instruction, i))
         for instruction, i in reversed(unused_phis):
-            join_block.remove_instruction(instruction, i)
+            self.blocks.remove_block_instruction(join_block, instruction, i)
             self.blocks.add_removed_instruction(instruction)
 
     def add_phis_while(self, in_while, while_block: BasicBlock, then_block: BasicBlock):
@@ -114,11 +134,11 @@ class Utils:
         for block in branch_parent_blocks:
             if block.get_id() > then_block.get_id():
                 then_block = block
+        while_block.set_phi_y_parent(then_block)
 
         if not then_block.is_return_block():
-            while_vars = set(while_block.get_vars().keys())
-            then_vars = set(then_block.get_vars().keys())
-            intersection_while_then = while_vars.intersection(then_vars)
+            then_vars = then_block.get_vars()
+            intersection_while_then = [var for var in while_block.get_vars() if var in then_vars]
 
             self.add_phi_instructions(in_while, block1=while_block, block2=then_block, var_set=intersection_while_then,
                                       already_added_vars=already_added_vars, join_block=while_block)
@@ -152,41 +172,35 @@ class Utils:
 
     def update_while_phis_and_bra(self, start_while_block: BasicBlock):
         visited = {start_while_block}
-        stack = []
+        stack = BlockWorklist()
 
         for child, relationship in start_while_block.get_children().items():
             if relationship == BlockRelation.FALL_THROUGH:
-                stack.append(child)
+                stack.push(child)
 
-        # Gather the instructions to update
+        # Gather the instructions to update. An operand is only replaced if it read its var from the same assignment,
+        # not if the var was assigned the same instruction again inside the while.
         old_to_new_instr_ids = {}
         for i in start_while_block.get_instruction_order_list():
             if i.op == Operations.PHI:
-                old_to_new_instr_ids[(i.x, i.x_var)] = i
+                old_to_new_instr_ids[(i.x, i.x_var, self.blocks.get_operand_stamps(i)[0])] = i
 
         # Check instructions in the starting while block (except for the phi instructions where the updated variables
         # are coming from)
         for i in start_while_block.get_instructions().values():
             if i.op != Operations.PHI:
-                if (i.x, i.x_var) in old_to_new_instr_ids:
-                    start_while_block.update_instruction(i, x=old_to_new_instr_ids[(i.x, i.x_var)])
-                if (i.y, i.y_var) in old_to_new_instr_ids:
-                    start_while_block.update_instruction(i, y=old_to_new_instr_ids[(i.y, i.y_var)])
+                self.update_while_operands(start_while_block, i, old_to_new_instr_ids)
 
         # Keep going until we are back at the starting while block
         while stack:
-            stack = sorted(stack, key=lambda b: b.id)
-            current_block = stack.pop(0)
+            current_block = stack.pop()
 
             # Check if the instruction should be updated to match new phi value
             for i in current_block.get_instruction_order_list():
                 original_i_x = i.x
-                if (i.x, i.x_var) in old_to_new_instr_ids:
-                    current_block.update_instruction(i, x=old_to_new_instr_ids[(i.x, i.x_var)])
-                if (i.y, i.y_var) in old_to_new_instr_ids:
-                    current_block.update_instruction(i, y=old_to_new_instr_ids[(i.y, i.y_var)])
+                self.update_while_operands(current_block, i, old_to_new_instr_ids)
                 if i.op == Operations.PHI:
-                    old_to_new_instr_ids[(original_i_x, i.x_var)] = i
+                    old_to_new_instr_ids[(original_i_x, i.x_var, self.blocks.get_operand_stamps(i)[0])] = i
 
             visited.add(current_block)
 
@@ -197,23 +211,29 @@ class Utils:
                     if branch_instr.op == Operations.BRA:
                         branch_instr = branch_instr
                         child_first_instr = child_block.find_first_instr()
-                        current_block.update_instruction(branch_instr, x=child_first_instr)
+                        self.blocks.update_instruction(current_block, branch_instr, x=child_first_instr)
 
                 if child_block not in visited and child_block not in stack:
-                    stack.append(child_block)
+                    stack.push(child_block)
+
+    def update_while_operands(self, block: BasicBlock, instr: Instruction, old_to_new_instr_ids: dict):
+        x_stamp, y_stamp = self.blocks.get_operand_stamps(instr)
+        if (instr.x, instr.x_var, x_stamp) in old_to_new_instr_ids:
+            self.blocks.update_instruction(block, instr, x=old_to_new_instr_ids[(instr.x, instr.x_var, x_stamp)])
+        if (instr.y, instr.y_var, y_stamp) in old_to_new_instr_ids:
+            self.blocks.update_instruction(block, instr, y=old_to_new_instr_ids[(instr.y, instr.y_var, y_stamp)])
 
     def update_while_cse(self, start_while_block):
         visited = set()
-        stack = [start_while_block]
+        stack = BlockWorklist([start_while_block])
         all_removed_instructions = []
-        phis = []
+        phis = {}
         removed_instr_to_cse_idn = {}
         removed_ids = set()
 
         # Keep going until we are back at the starting while block
         while stack:
-            stack = sorted(stack, key=lambda b: b.id)
-            current_block: BasicBlock = stack.pop(0)
+            current_block: BasicBlock = stack.pop()
 
             # Copy instructions down if dominated
             for dom_parent in current_block.get_dom_parents():
@@ -223,14 +243,16 @@ class Utils:
             current_block_removed_instructions = []
             for i, instruction in enumerate(current_block.get_instruction_order_list()):
                 if instruction.x and instruction.x.get_id() in removed_instr_to_cse_idn and instruction.op != Operations.PHI:
-                    current_block.update_instruction(instruction, x=removed_instr_to_cse_idn[instruction.x.get_id()])
+                    self.blocks.update_instruction(current_block, instruction,
+                                                   x=removed_instr_to_cse_idn[instruction.x.get_id()])
                 if instruction.y and instruction.y.get_id() in removed_instr_to_cse_idn and instruction.op != Operations.PHI:
-                    current_block.update_instruction(instruction, y=removed_instr_to_cse_idn[instruction.y.get_id()])
+                    self.blocks.update_instruction(current_block, instruction,
+                                                   y=removed_instr_to_cse_idn[instruction.y.get_id()])
 
                 # Normal CSE
-                if instruction.op not in Operations.get_no_cse_instructions():
-                    if (instruction.op, instruction.x, instruction.y) in current_block.get_dom_instruction():
-                        cse_instr = current_block.get_dom_instruction()[(instruction.op, instruction.x, instruction.y)]
+                if instruction.op is None or instruction.op.is_cse_eligible():
+                    cse_instr = current_block.get_dom_cse(instruction.op, instruction.x, instruction.y)
+                    if cse_instr is not None:
                         all_removed_instructions.append(instruction)
                         if instruction.get_id() not in removed_ids:
                             current_block_removed_instructions.append((instruction, i, cse_instr))
@@ -240,65 +262,68 @@ class Utils:
                     else:
                         current_block.add_dom_instruction(instruction, instruction.op, instruction.x, instruction.y)
                 elif instruction.op == Operations.PHI:
-                    phis.append(instruction)
+                    phis[instruction] = current_block
 
                 # Load CSE
                 if instruction.op == Operations.LOAD:
-                    for array_i in reversed(current_block.get_array_instructions()[instruction.x_var]):
-                        if array_i.op == Operations.KILL:
-                            break
-                        elif array_i.get_id() < instruction.get_id():
-                            if array_i.op == Operations.STORE and array_i.y.originates_from_read:
-                                break
-                            elif array_i.op == Operations.STORE and (
-                                    instruction.x and instruction.x.originates_from_read):
-                                break
-                            elif array_i.op == Operations.STORE and (
-                                    instruction.y and instruction.y.originates_from_read):
-                                break
-                            elif array_i.op == Operations.LOAD:
-                                if array_i.x == instruction.x and array_i.y == instruction.y:
-                                    if instruction.get_id() not in removed_ids:
-                                        current_block_removed_instructions.append((instruction, i, array_i))
-                                        removed_ids.add(instruction.get_id())
-                                    all_removed_instructions.append(instruction)
-                                    if instruction.id != array_i.id:
-                                        removed_instr_to_cse_idn[instruction.id] = array_i
-                            elif array_i.op == Operations.STORE and array_i.y == instruction.x:
-                                if instruction.get_id() not in removed_ids:
-                                    current_block_removed_instructions.append((instruction, i, array_i))
-                                    removed_ids.add(instruction.get_id())
-                                all_removed_instructions.append(instruction)
-                                if instruction.id != array_i.id:
-                                    removed_instr_to_cse_idn[instruction.id] = array_i.x  # store instruction x address
+                    array_accesses = current_block.get_array_instructions()[instruction.x_var]
+                    found = array_accesses.find_while_cse(instruction)
+                    if found:
+                        if instruction.get_id() not in removed_ids:
+                            current_block_removed_instructions.append((instruction, i, found[0]))
+                            removed_ids.add(instruction.get_id())
+                        # Removed once for every found load and store
+                        all_removed_instructions.extend([instruction] * len(found))
+                        # The earliest one is used, for a store the stored value
+                        cse_instr = found[-1]
+                        removed_instr_to_cse_idn[instruction.id] = cse_instr.x if cse_instr.op == Operations.STORE \
+                            else cse_instr
 
             # Remove cse instructions
+            first_instr = current_block.find_first_instr()
             for (instr, i, cse_instr) in reversed(current_block_removed_instructions):  # to not mess with indices
-                current_block.remove_instruction(instr, i)
+                self.blocks.remove_block_instruction(current_block, instr, i)
                 # Update the table that keeps track of the var assignments so that the var points to the cse instruction
-                for var, instr_idn in current_block.get_vars().items():
-                    if instr_idn == instr:
-                        # Even though the block might be a return block we still have to update the var assignments in case we do cse
-                        current_block.add_var_assignment(var, cse_instr, skip_return_check=True)
+                for var in current_block.get_vars_using(instr):
+                    # Even though the block might be a return block we still have to update the var assignments in case we do cse
+                    self.blocks.add_var_assignment(current_block, var, cse_instr, skip_return_check=True)
 
                 # Check if phis need to be updated
-                for phi in phis:
-                    if instr == phi.y:
+                for phi in self.blocks.def_use.get_users(instr):
+                    if phi in phis and instr == phi.y:
                         # For Store we want to do the phi with the stored value and not the store instruction number
                         if cse_instr.op == Operations.STORE:
-                            phi.y = cse_instr.x
+                            self.blocks.update_instruction(phis[phi], phi, y=cse_instr.x)
                         else:
-                            phi.y = cse_instr
+                            self.blocks.update_instruction(phis[phi], phi, y=cse_instr)
+
+            if current_block_removed_instructions and current_block.find_first_instr() != first_instr:
+                self.update_branch_targets(first_instr, current_block)
 
             visited.add(current_block.get_id())
             for child_block, relationship in current_block.get_children().items():
                 if child_block.get_id() not in visited and child_block not in stack:
-                    stack.append(child_block)
+                    stack.push(child_block)
 
         # Used for fixing instruction numbers at the end
         for instr in all_removed_instructions:
             self.blocks.add_removed_instruction(instr)
 
+    def update_branch_targets(self, old_first_instr: Instruction, block: BasicBlock):
+        """
+        Makes the branches to the removed first instruction of the block go to its new first instruction. A block
+        that became empty is skipped over to the block it falls through to.
+        """
+        while block.find_first_instr() is None:
+            block = next(child for child, relationship in block.get_children().items()
+                         if relationship != BlockRelation.BRANCH)
+        target = block.find_first_instr()
+        for user in self.blocks.def_use.get_users(old_first_instr):
+            if user.op == Operations.BRA and user.x == old_first_instr:
+                self.blocks.update_instruction(self.blocks.def_use.get_block(user), user, x=target)
+            elif user.op is not None and user.op.is_conditional_branch() and user.y == old_first_instr:
+                self.blocks.update_instruction(self.blocks.def_use.get_block(user), user, y=target)
+
     def fix_branching(self, branch_blocks: list[BasicBlock], if_blocks):
         for block in branch_blocks:
             for child_block, relationship in block.get_children().items():
@@ -308,19 +333,25 @@ class Utils:
                     child_first_instr = child_block.find_first_instr()
                     if if_blocks:
                         if branch_instr.op == Operations.BRA:
-                            block.update_instruction(branch_instr, x=child_first_instr)
+                            self.blocks.update_instruction(block, branch_instr, x=child_first_instr)
                     else:
-                        block.update_instruction(branch_instr, y=child_first_instr)
+                        self.blocks.update_instruction(block, branch_instr, y=child_first_instr)
+
+    def fix_branch_targets(self):
+        """
+        Makes every branch go to the first instruction of its branch block again, e.g. after instructions were removed
+        by a pass over the finished blocks.
+        """
+        bra_blocks, conditional_branch_blocks = [], []
+        for block in self.blocks.get_blocks_list():
+            instructions = block.get_instruction_order_list()
+            op = instructions[-1].op if instructions else None
+            if op == Operations.BRA:
+                bra_blocks.append(block)
+            elif op is not None and op.is_conditional_branch():
+                conditional_branch_blocks.append(block)
+        self.fix_branching(bra_blocks, True)
+        self.fix_branching(conditional_branch_blocks, False)
 
     def fix_id_numbering(self):
-        # Sort the list of removed instructions in descending order
-        self.blocks.removed_instructions.sort(reverse=True)
-
-        # Update the instruction IDs in the dictionary
-        for old_id, instruction in self.blocks.instructions.items():
-            new_id = old_id
-            for removed_instr in self.blocks.removed_instructions:
-                if old_id > removed_instr.get_id():
-                    new_id -= 1
-
-            instruction.id = new_id
+        compact_instruction_ids(self.blocks.instructions, self.blocks.removed_instructions)